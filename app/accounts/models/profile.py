@@ -10,6 +10,8 @@ class Profile(models.Model):
     last_name = models.CharField(max_length=250)
     image = models.ImageField(upload_to="accounts/", null=True, blank=True)
     bio = models.TextField(blank=True, null=True)
+    # Total size of the owned files, maintained by the file manager signals
+    storage_used = models.BigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.user.email
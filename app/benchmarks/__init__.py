@@ -0,0 +1,12 @@
+"""
+Benchmarks of the file manager, run as modules from the app directory
+
+Django is set up here, before any benchmark imports the models.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
@@ -0,0 +1,107 @@
+"""
+Video poster frame benchmark
+
+Compares the legacy poster extraction (moviepy VideoFileClip.get_frame(1))
+with the keyframe seeking ffmpeg extractor, and reports the cost of the hover
+sprite strip, for clips of several lengths and codecs.
+
+Usage (from the app directory):
+    python -m benchmarks.posters [--repeat 3]
+"""
+
+import os
+import argparse
+import subprocess
+import tempfile
+import time
+from django.conf import settings
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.VideoFileClip import VideoFileClip
+
+# Django was set up by the benchmarks package first
+from filemanager.thumbnails import (
+    extract_poster,
+    extract_sprite,
+    video_duration,
+)
+
+# (file name, duration in seconds, ffmpeg encoder arguments)
+VIDEO_SAMPLES = [
+    ("short.mp4", 0.5, ["-c:v", "libx264", "-pix_fmt", "yuv420p"]),
+    ("medium.mp4", 10, ["-c:v", "libx264", "-pix_fmt", "yuv420p"]),
+    ("long.mp4", 60, ["-c:v", "libx264", "-pix_fmt", "yuv420p"]),
+    ("long.mkv", 60, ["-c:v", "libx264", "-pix_fmt", "yuv420p"]),
+    ("medium.avi", 10, ["-c:v", "mpeg4"]),
+    ("long.mpeg", 60, ["-c:v", "mpeg2video"]),
+]
+
+
+def create_samples(directory):
+    samples = []
+    for name, duration, encoder in VIDEO_SAMPLES:
+        path = os.path.join(directory, name)
+        source = f"testsrc=duration={duration}:size=1280x720:rate=25"
+        command = [FFMPEG_BINARY, "-loglevel", "error", "-f", "lavfi", "-i", source]
+        subprocess.run(command + encoder + ["-b:v", "2M", path], check=True)
+        samples.append(path)
+    return samples
+
+
+def legacy_poster(path, duration):
+    clip = VideoFileClip(path)
+    try:
+        clip.get_frame(1)
+    finally:
+        clip.close()
+
+
+def keyframe_poster(path, duration):
+    extract_poster(path, duration)
+
+
+def sprite_strip(path, duration):
+    extract_sprite(path, duration, settings.FILEMANAGER_VIDEO_SPRITE_FRAMES)
+
+
+def measure(function, path, duration, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            function(path, duration)
+        except Exception:
+            return None
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def format_timing(timing):
+    return "failed" if timing is None else f"{timing * 1000:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        samples = create_samples(directory)
+        print(
+            f"{'sample':<14}{'duration':>10}{'moviepy ms':>14}"
+            f"{'keyframe ms':>14}{'sprite ms':>12}"
+        )
+        for path in samples:
+            duration = video_duration(path)
+            timings = [
+                measure(function, path, duration, args.repeat)
+                for function in (legacy_poster, keyframe_poster, sprite_strip)
+            ]
+            print(
+                f"{os.path.basename(path):<14}{duration:>9.1f}s"
+                f"{format_timing(timings[0]):>14}{format_timing(timings[1]):>14}"
+                f"{format_timing(timings[2]):>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Upload validation benchmark
+
+Compares the legacy validation (full PIL verify / moviepy VideoFileClip) with
+the signature sniffing + bounded probe engine, reporting cost per MB for every
+supported mime type.
+
+Usage (from the app directory):
+    python -m benchmarks.validation [--repeat 5]
+"""
+
+import os
+import argparse
+import subprocess
+import tempfile
+import time
+from PIL import Image
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.VideoFileClip import VideoFileClip
+
+# Django was set up by the benchmarks package first
+from filemanager.probe import probe_media, read_header, sniff_mime_type
+
+IMAGE_SAMPLES = [
+    ("image/jpeg", "sample.jpg", "JPEG"),
+    ("image/png", "sample.png", "PNG"),
+    ("image/gif", "sample.gif", "GIF"),
+    ("image/bmp", "sample.bmp", "BMP"),
+    ("image/tiff", "sample.tiff", "TIFF"),
+]
+
+# (mime type, file name, ffmpeg encoder arguments)
+VIDEO_SAMPLES = [
+    ("video/mp4", "sample.mp4", ["-c:v", "libx264", "-pix_fmt", "yuv420p"]),
+    ("video/quicktime", "sample.mov", ["-c:v", "libx264", "-pix_fmt", "yuv420p"]),
+    ("video/x-msvideo", "sample.avi", ["-c:v", "mpeg4"]),
+    ("video/x-matroska", "sample.mkv", ["-c:v", "libx264", "-pix_fmt", "yuv420p"]),
+    ("video/x-ms-wmv", "sample.wmv", ["-c:v", "wmv2"]),
+    ("video/mpeg", "sample.mpeg", ["-c:v", "mpeg2video"]),
+]
+
+
+def create_samples(directory):
+    samples = []
+    noise = Image.effect_noise((2000, 1500), 64).convert("RGB")
+    for mime_type, name, image_format in IMAGE_SAMPLES:
+        path = os.path.join(directory, name)
+        noise.save(path, format=image_format)
+        samples.append((mime_type, path))
+    for mime_type, name, encoder in VIDEO_SAMPLES:
+        path = os.path.join(directory, name)
+        source = "testsrc=duration=10:size=1280x720:rate=25"
+        command = [FFMPEG_BINARY, "-loglevel", "error", "-f", "lavfi", "-i", source]
+        subprocess.run(command + encoder + ["-b:v", "2M", path], check=True)
+        samples.append((mime_type, path))
+    return samples
+
+
+def legacy_validation(mime_type, path):
+    if mime_type.startswith("image"):
+        with open(path, "rb") as file:
+            Image.open(file).verify()
+    else:
+        clip = VideoFileClip(path)
+        clip.reader.close()
+
+
+def probe_validation(mime_type, path):
+    with open(path, "rb") as file:
+        sniffed = sniff_mime_type(read_header(file))
+        probe_media(file, sniffed)
+
+
+def measure(function, mime_type, path, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(mime_type, path)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        samples = create_samples(directory)
+        print(f"{'mime type':<18}{'size':>10}{'legacy ms/MB':>15}{'probe ms/MB':>15}")
+        for mime_type, path in samples:
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            legacy = measure(legacy_validation, mime_type, path, args.repeat)
+            probe = measure(probe_validation, mime_type, path, args.repeat)
+            print(
+                f"{mime_type:<18}{size_mb:>8.2f}MB"
+                f"{legacy * 1000 / size_mb:>15.2f}{probe * 1000 / size_mb:>15.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
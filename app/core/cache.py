@@ -0,0 +1,339 @@
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.client import DefaultClient
+from django_redis.client.default import _main_exceptions
+from django_redis.exceptions import ConnectionInterrupted
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+
+# Bytes accounted to an entry on top of its key and value (tuple, dict slot...)
+ENTRY_OVERHEAD = 128
+
+# Seconds the invalidation listener waits before subscribing again after an error
+RECONNECT_DELAY = 1
+
+# Returned by the Redis tier for missing keys, None may be a cached value
+MISSING = object()
+
+# logger object
+logger = logging.getLogger(__name__)
+
+
+class LocalTier:
+    """
+    Bounded in-process LRU of encoded cache values, shared by the threads of
+    a process and kept coherent with the other processes through Redis pub/sub
+    (see listen)
+    """
+
+    def __init__(self, max_bytes, timeout):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.origin = uuid.uuid4().hex
+        self.entries = OrderedDict()  # key -> (value, expiry, size)
+        self.size = 0
+        # Bumped by every invalidation, a value fetched meanwhile is not kept
+        self.sequence = 0
+        # Values are only served while the invalidations are being received
+        self.listening = False
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(
+            ["local_hits", "local_misses", "redis_hits", "redis_misses"], 0
+        )
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self.evict(key)
+                entry = None
+            self.counts["local_misses" if entry is None else "local_hits"] += 1
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, ttl, sequence):
+        """
+        Keeps a value fetched from Redis for at most `ttl` seconds (and the tier
+        timeout), unless it was invalidated since `sequence` was read
+        """
+        size = len(key) + len(value) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if sequence != self.sequence:
+                return
+            self.evict(key)
+            self.entries[key] = (value, time.monotonic() + min(ttl, self.timeout), size)
+            self.size += size
+            # Least recently used entries go first
+            while self.size > self.max_bytes:
+                self.evict(next(iter(self.entries)))
+
+    def evict(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def invalidate(self, keys):
+        with self.lock:
+            self.sequence += 1
+            for key in keys:
+                self.evict(key)
+
+    def clear(self):
+        with self.lock:
+            self.sequence += 1
+            self.entries.clear()
+            self.size = 0
+
+    def receive(self, data):
+        """
+        Applies an invalidation message published by another process
+        """
+        message = json.loads(data)
+        if message["origin"] == self.origin:
+            return
+        if message.get("clear"):
+            self.clear()
+        else:
+            self.invalidate(message["keys"])
+
+    def listen(self, client, channel):
+        """
+        Receives the invalidations published on `channel` (run in a daemon thread)
+
+        Messages published while the subscription is down are lost, so the tier
+        is emptied and bypassed until it is back.
+        """
+        while True:
+            pubsub = client.pubsub()
+            try:
+                pubsub.subscribe(channel)
+                for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        self.clear()
+                        self.listening = True
+                    elif message["type"] == "message":
+                        self.receive(message["data"])
+            except Exception as error:
+                logger.warning(f"Cache invalidation listener failed: {error}")
+            finally:
+                self.listening = False
+                self.clear()
+                pubsub.close()
+            time.sleep(RECONNECT_DELAY)
+
+    def stats(self):
+        """
+        Returns the hits, misses and hit rate of both tiers, with the local usage
+        """
+        with self.lock:
+            counts = dict(self.counts)
+            entries, size = len(self.entries), self.size
+        stats = {"entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+        for tier in ("local", "redis"):
+            hits, misses = counts[f"{tier}_hits"], counts[f"{tier}_misses"]
+            stats[tier] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else None,
+            }
+        return stats
+
+
+# Local tiers of the current process, by Redis location and channel
+tiers = {}
+tiers_lock = threading.Lock()
+
+
+class TwoTierClient(DefaultClient):
+    """
+    django_redis client reading through a process-wide LocalTier, which
+    saves the Redis round trip on repeated reads of the same keys
+
+    Writes go to Redis first, then invalidate the key in every process: locally
+    right away, elsewhere with a message on INVALIDATION_CHANNEL. Values are
+    kept encoded, so every read still returns a fresh copy.
+
+    Options:
+        LOCAL_MAX_BYTES: memory cap of the local tier (default 64 MiB)
+        LOCAL_TIMEOUT: seconds a value is kept locally at most (default 60)
+        LOCAL_EXCLUDED_PREFIXES: keys never kept locally, e.g. counters
+            written on every request, which then publish no invalidation
+        INVALIDATION_CHANNEL: Redis pub/sub channel of the invalidations
+    """
+
+    def __init__(self, server, params, backend):
+        super().__init__(server, params, backend)
+        self._local_max_bytes = self._options.get("LOCAL_MAX_BYTES", 64 * 1024 * 1024)
+        self._local_timeout = self._options.get("LOCAL_TIMEOUT", 60)
+        self._local_excluded = tuple(self._options.get("LOCAL_EXCLUDED_PREFIXES", ()))
+        self._channel = self._options.get("INVALIDATION_CHANNEL", "cache-invalidation")
+
+    @property
+    def tier(self):
+        # Forked workers get their own tier (and listener)
+        key = (os.getpid(), tuple(self._server), self._channel)
+        with tiers_lock:
+            if key not in tiers:
+                tiers[key] = LocalTier(self._local_max_bytes, self._local_timeout)
+                threading.Thread(
+                    target=tiers[key].listen,
+                    args=(self.get_client(write=True), self._channel),
+                    name="cache-invalidation",
+                    daemon=True,
+                ).start()
+            return tiers[key]
+
+    def is_local(self, key):
+        return not str(key).startswith(self._local_excluded)
+
+    def get(self, key, default=None, version=None, client=None):
+        tier = self.tier
+        if client is not None or not tier.listening or not self.is_local(key):
+            value = super().get(key, MISSING, version=version, client=client)
+            tier.count("redis_misses" if value is MISSING else "redis_hits")
+            return default if value is MISSING else value
+        nkey = str(self.make_key(key, version=version))
+        value = tier.get(nkey)
+        if value is not None:
+            return self.decode(value)
+        sequence = tier.sequence
+        redis = self.get_client(write=False)
+        try:
+            # The expiry is read along, in the same round trip
+            value, pttl = (
+                redis.pipeline(transaction=False).get(nkey).pttl(nkey).execute()
+            )
+        except _main_exceptions as e:
+            raise ConnectionInterrupted(connection=redis) from e
+        if value is None:
+            tier.count("redis_misses")
+            return default
+        tier.count("redis_hits")
+        tier.put(
+            nkey, value, self._local_timeout if pttl < 0 else pttl / 1000, sequence
+        )
+        return self.decode(value)
+
+    def invalidate(self, keys, version=None):
+        keys = [
+            str(self.make_key(key, version=version))
+            for key in keys
+            if self.is_local(key)
+        ]
+        if keys:
+            self.tier.invalidate(keys)
+            self.publish({"keys": keys})
+
+    def publish(self, message):
+        client = self.get_client(write=True)
+        try:
+            client.publish(
+                self._channel, json.dumps({**message, "origin": self.tier.origin})
+            )
+        except _main_exceptions as e:
+            raise ConnectionInterrupted(connection=client) from e
+
+    def set(
+        self,
+        key,
+        value,
+        timeout=DEFAULT_TIMEOUT,
+        version=None,
+        client=None,
+        nx=False,
+        xx=False,
+    ):
+        result = super().set(
+            key, value, timeout, version=version, client=client, nx=nx, xx=xx
+        )
+        self.invalidate([key], version)
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        super().set_many(data, timeout, version=version, client=client)
+        # Published again once the pipeline ran, set() published before it did
+        self.invalidate(data, version)
+
+    def delete(self, key, version=None, prefix=None, client=None):
+        result = super().delete(key, version=version, prefix=prefix, client=client)
+        self.invalidate([key], version)
+        return result
+
+    def delete_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        result = super().delete_many(keys, version=version, client=client)
+        self.invalidate(keys, version)
+        return result
+
+    def delete_pattern(
+        self, pattern, version=None, prefix=None, client=None, itersize=None
+    ):
+        result = super().delete_pattern(
+            pattern, version=version, prefix=prefix, client=client, itersize=itersize
+        )
+        self.tier.clear()
+        self.publish({"clear": True})
+        return result
+
+    def clear(self, client=None):
+        super().clear(client=client)
+        self.tier.clear()
+        self.publish({"clear": True})
+
+    def incr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        result = super().incr(
+            key,
+            delta,
+            version=version,
+            client=client,
+            ignore_key_check=ignore_key_check,
+        )
+        self.invalidate([key], version)
+        return result
+
+    def decr(self, key, delta=1, version=None, client=None):
+        result = super().decr(key, delta, version=version, client=client)
+        self.invalidate([key], version)
+        return result
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        # A shorter expiry must not be outlived locally
+        result = super().touch(key, timeout, version=version, client=client)
+        self.invalidate([key], version)
+        return result
+
+    def expire(self, key, timeout, version=None, client=None):
+        result = super().expire(key, timeout, version=version, client=client)
+        self.invalidate([key], version)
+        return result
+
+    def pexpire(self, key, timeout, version=None, client=None):
+        result = super().pexpire(key, timeout, version=version, client=client)
+        self.invalidate([key], version)
+        return result
+
+    def expire_at(self, key, when, version=None, client=None):
+        result = super().expire_at(key, when, version=version, client=client)
+        self.invalidate([key], version)
+        return result
+
+    def pexpire_at(self, key, when, version=None, client=None):
+        result = super().pexpire_at(key, when, version=version, client=client)
+        self.invalidate([key], version)
+        return result
+
+    def tier_stats(self):
+        return self.tier.stats()
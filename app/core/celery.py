@@ -2,7 +2,7 @@ import os
 
 from celery import Celery
 
-# from celery.schedules import crontab
+from celery.schedules import crontab
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
@@ -20,9 +20,13 @@ app.autodiscover_tasks()
 
 
 # Celery Beat Configuration
-# app.conf.beat_schedule = {
-#     "beat_name": {
-#         "task": "app_name.tasks.task_name",
-#         "schedule": crontab(minute="*/10"),
-#     },
-# }
+app.conf.beat_schedule = {
+    "purge_stale_upload_sessions": {
+        "task": "filemanager.tasks.purge_stale_upload_sessions",
+        "schedule": crontab(minute=0),
+    },
+    "purge_trash": {
+        "task": "filemanager.tasks.purge_trash",
+        "schedule": crontab(minute=30, hour=3),
+    },
+}
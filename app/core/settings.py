@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 from datetime import timedelta
 
 from django.urls import reverse_lazy
@@ -24,6 +24,9 @@ ALLOWED_HOSTS = config(
 
 # Redis
 REDIS_CACHE_URL = config("REDIS_CACHE_URL", default="redis://redis:6379/2")
+# In-process cache tier in front of Redis: memory cap (per process) and max age
+CACHE_LOCAL_MAX_MB = config("CACHE_LOCAL_MAX_MB", cast=int, default=64)
+CACHE_LOCAL_TIMEOUT = config("CACHE_LOCAL_TIMEOUT", cast=int, default=60)
 
 
 # Application definition
@@ -133,6 +136,12 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 STATICFILES_DIRS = [BASE_DIR / "statics"]
 
+# Stored files get signed, expiring URLs (see filemanager.signing)
+STORAGES = {
+    "default": {"BACKEND": "filemanager.signing.SignedFileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -176,13 +185,86 @@ CORS_ALLOW_ALL_ORIGINS = True
 # Celery Configuration
 CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="redis://redis:6379/1")
 
+# File manager configuration
+FILEMANAGER_MAX_UPLOAD_SIZE_MB = config(
+    "FILEMANAGER_MAX_UPLOAD_SIZE_MB", cast=int, default=7
+)
+# Hours an idle resumable upload session is kept before being purged
+FILEMANAGER_UPLOAD_SESSION_TTL_HOURS = config(
+    "FILEMANAGER_UPLOAD_SESSION_TTL_HOURS", cast=int, default=24
+)
+# Items of a folder listed per page (the next ones are loaded on demand)
+FILEMANAGER_LISTING_PAGE_SIZE = config(
+    "FILEMANAGER_LISTING_PAGE_SIZE", cast=int, default=100
+)
+# Files and folders (each) shown for a search, best matches first
+FILEMANAGER_SEARCH_RESULTS = config("FILEMANAGER_SEARCH_RESULTS", cast=int, default=100)
+# Seconds listings and search results stay cached (changes invalidate them sooner)
+FILEMANAGER_CACHE_TIMEOUT = config("FILEMANAGER_CACHE_TIMEOUT", cast=int, default=300)
+# Front proxy sending downloaded files ("nginx" for X-Accel-Redirect, "apache" for
+# X-Sendfile, empty to stream them from Django) and the nginx internal location
+# mapped to MEDIA_ROOT
+FILEMANAGER_SENDFILE = config("FILEMANAGER_SENDFILE", default="")
+FILEMANAGER_PROTECTED_MEDIA_URL = config(
+    "FILEMANAGER_PROTECTED_MEDIA_URL", default="/protected-media/"
+)
+# Media URLs are signed (HMAC-SHA256) and valid for FILEMANAGER_MEDIA_URL_TTL
+# seconds at least, they are rounded to FILEMANAGER_MEDIA_URL_BUCKET seconds so
+# they stay the same (and cacheable) meanwhile. A proxy or CDN checking them
+# shares FILEMANAGER_MEDIA_SIGNING_KEY (derived from SECRET_KEY when empty)
+FILEMANAGER_MEDIA_SIGNING_KEY = config("FILEMANAGER_MEDIA_SIGNING_KEY", default="")
+FILEMANAGER_MEDIA_URL_TTL = config(
+    "FILEMANAGER_MEDIA_URL_TTL", cast=int, default=6 * 60 * 60
+)
+FILEMANAGER_MEDIA_URL_BUCKET = config(
+    "FILEMANAGER_MEDIA_URL_BUCKET", cast=int, default=60 * 60
+)
+# Days deleted files and folders stay in the trash, and the rows purged per batch
+FILEMANAGER_TRASH_RETENTION_DAYS = config(
+    "FILEMANAGER_TRASH_RETENTION_DAYS", cast=int, default=30
+)
+FILEMANAGER_PURGE_BATCH_SIZE = config(
+    "FILEMANAGER_PURGE_BATCH_SIZE", cast=int, default=500
+)
+# Upper bound (seconds) for the ffmpeg metadata probe of uploaded videos
+FILEMANAGER_PROBE_TIMEOUT = config("FILEMANAGER_PROBE_TIMEOUT", cast=float, default=5)
+# Thumbnail renditions (bounding box sizes in px) and their encoding (WEBP or JPEG)
+FILEMANAGER_THUMBNAIL_SIZES = config(
+    "FILEMANAGER_THUMBNAIL_SIZES", cast=Csv(int), default="64,128,256,512"
+)
+FILEMANAGER_THUMBNAIL_FORMAT = config("FILEMANAGER_THUMBNAIL_FORMAT", default="WEBP")
+FILEMANAGER_THUMBNAIL_QUALITY = config(
+    "FILEMANAGER_THUMBNAIL_QUALITY", cast=int, default=80
+)
+# Largest accepted image (in pixels, decompression bomb guard) and the memory
+# (MB) decoded images may use at once in a worker process
+FILEMANAGER_MAX_IMAGE_PIXELS = config(
+    "FILEMANAGER_MAX_IMAGE_PIXELS", cast=int, default=100_000_000
+)
+FILEMANAGER_DECODE_MEMORY_MB = config(
+    "FILEMANAGER_DECODE_MEMORY_MB", cast=int, default=512
+)
+# Frames of the video hover preview strip (less than 2 disables it) and the
+# upper bound (seconds) of the ffmpeg poster/strip extraction
+FILEMANAGER_VIDEO_SPRITE_FRAMES = config(
+    "FILEMANAGER_VIDEO_SPRITE_FRAMES", cast=int, default=8
+)
+FILEMANAGER_VIDEO_FRAME_TIMEOUT = config(
+    "FILEMANAGER_VIDEO_FRAME_TIMEOUT", cast=float, default=30
+)
+
 # Caching configuration
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
         "LOCATION": REDIS_CACHE_URL,
         "OPTIONS": {
-            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            # Reads go through an in-process LRU first (see core.cache)
+            "CLIENT_CLASS": "core.cache.TwoTierClient",
+            "LOCAL_MAX_BYTES": CACHE_LOCAL_MAX_MB * 1024 * 1024,
+            "LOCAL_TIMEOUT": CACHE_LOCAL_TIMEOUT,
+            # Counters written on every request are not worth keeping locally
+            "LOCAL_EXCLUDED_PREFIXES": ["filemanager:stats:"],
         },
     }
 }
@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import File, Folder
+from .models import Blob, File, Folder
+
+
+@admin.action(description="Restore selected items from the trash")
+def restore_from_trash(modeladmin, request, queryset):
+    for item in queryset.filter(deleted_at__isnull=False):
+        item.restore()
 
 
 @admin.register(File)
@@ -12,10 +18,13 @@ class FileAdmin(admin.ModelAdmin):
         "owner",
         "folder",
         "formatted_size",
+        "processing_status",
         "created_at",
         "updated_at",
+        "deleted_at",
     )
-    list_filter = ("created_at", "updated_at")
+    list_filter = ("processing_status", "created_at", "updated_at", "deleted_at")
+    actions = [restore_from_trash]
     search_fields = ["name"]
 
 
@@ -27,8 +36,19 @@ class CommentAdmin(admin.ModelAdmin):
         "name",
         "owner",
         "parent_folder",
+        "total_size",
+        "file_count",
         "created_at",
         "updated_at",
+        "deleted_at",
     )
-    list_filter = ("parent_folder", "created_at", "updated_at")
+    list_filter = ("parent_folder", "created_at", "updated_at", "deleted_at")
+    actions = [restore_from_trash]
     search_fields = ["name", "parent_folder"]
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    date_hierarchy = "created_at"
+    list_display = ("sha256", "size", "ref_count", "created_at")
+    search_fields = ["sha256"]
@@ -0,0 +1,113 @@
+from django.utils import timezone
+
+import io
+import logging
+import mimetypes
+import zipfile
+
+from .models import File, Folder
+
+# Bytes read from a stored file at once while it is added to an archive
+ZIP_CHUNK_SIZE = 64 * 1024
+
+# Uncompressed formats, other supported media are stored as they are
+DEFLATED_MIME_TYPES = {"image/bmp", "image/tiff"}
+
+# Fields needed to add a file to an archive, the rest of the row is never loaded
+ARCHIVED_FIELDS = ["id", "name", "file", "size", "mime_type", "folder_id", "updated_at"]
+
+# logger object
+logger = logging.getLogger(__name__)
+
+
+class ZipStream(io.RawIOBase):
+    """
+    Unseekable write-only buffer, drained by the generator streaming the archive
+    (zipfile then writes data descriptors instead of seeking back to the headers)
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def archive_entries(folder):
+    """
+    Yields (archive path, file or None for directories) for the subtree of
+    `folder`, with one query for the folders and one streamed query for the files
+    """
+    names = {}
+    for pk, name, path in (
+        Folder.objects.subtree(folder)
+        .alive()
+        .order_by("path")
+        .values_list("pk", "name", "path")
+    ):
+        # Paths are ordered, so the parent is always named before its subfolders
+        parent_path = "" if pk == folder.pk else names[Folder(path=path).path_ids[-2]]
+        names[pk] = f"{parent_path}{name}/"
+        yield names[pk], None
+    files = (
+        File.objects.filter(folder_id__in=Folder.objects.subtree(folder))
+        .filter(deleted_at__isnull=True)
+        .only(*ARCHIVED_FIELDS)
+        .order_by("folder_id", "name")
+    )
+    for file in files.iterator(chunk_size=500):
+        # Files of trashed subfolders have no entry
+        if file.folder_id in names:
+            yield f"{names[file.folder_id]}{file.name}", file
+
+
+def stream_zip(folder, chunk_size=ZIP_CHUNK_SIZE):
+    """
+    Yields a ZIP archive of the subtree of `folder` chunk by chunk
+
+    Nothing is written to disk and at most one chunk of a file is held in memory,
+    whatever the size of the subtree. ZIP64 extensions are used for entries and
+    archives going past the classic 4 GiB/65535 entries limits.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, "w", allowZip64=True) as archive:
+        for path, file in archive_entries(folder):
+            if file is None:
+                archive.mkdir(path)
+            else:
+                yield from write_entry(archive, stream, path, file, chunk_size)
+            yield from stream.drain()
+    yield from stream.drain()
+
+
+def write_entry(archive, stream, path, file, chunk_size):
+    """
+    Adds a file to the archive, yielding the archive bytes after each chunk
+    """
+    info = zipfile.ZipInfo(
+        path, date_time=timezone.localtime(file.updated_at).timetuple()[:6]
+    )
+    # Rows saved before media probing have no mime type recorded
+    mime_type = file.mime_type or mimetypes.guess_type(file.name)[0]
+    info.compress_type = (
+        zipfile.ZIP_DEFLATED if mime_type in DEFLATED_MIME_TYPES else zipfile.ZIP_STORED
+    )
+    # The expected size decides upfront whether the entry needs ZIP64 headers
+    info.file_size = file.size
+    try:
+        content = file.file.storage.open(file.file.name, "rb")
+    except FileNotFoundError:
+        logger.warning(f"Skipping missing content of file {file.pk} in archive")
+        return
+    with content, archive.open(info, "w") as entry:
+        for chunk in content.chunks(chunk_size):
+            entry.write(chunk)
+            yield from stream.drain()
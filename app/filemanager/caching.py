@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+import time
+import hashlib
+
+from accounts.models import Profile
+
+# Cached results, each kind has its own hit/miss counters (see cache_stats)
+CACHED_KINDS = ("listing", "search", "destinations")
+
+
+def generation_key(user_id):
+    return f"filemanager:generation:{user_id}"
+
+
+def generation(user_id):
+    """
+    Returns the current generation of a user's cached content, every key of
+    the user embeds it so bumping it invalidates them all at once
+    """
+    key = generation_key(user_id)
+    value = cache.get(key)
+    if value is None:
+        # An evicted counter restarts past every generation handed out before
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key)
+    return value
+
+
+def bump_generation(user_id):
+    try:
+        cache.incr(generation_key(user_id))
+    except ValueError:
+        cache.add(generation_key(user_id), time.time_ns(), None)
+
+
+def invalidate_owner(owner_id):
+    """
+    Invalidates the cached content of the user owning the profile `owner_id`
+
+    The generation is bumped right away, for the reads of the same transaction,
+    and again on commit: a read between both bumps may have cached the
+    uncommitted state under the new generation.
+    """
+    user_id = Profile.objects.filter(pk=owner_id).values_list("user_id", flat=True)
+    user_id = user_id.first()
+    if user_id is None:
+        return
+    bump_generation(user_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump_generation(user_id), robust=True)
+
+
+def count(kind, outcome):
+    key = f"filemanager:stats:{kind}:{outcome}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def cached(kind, user_id, parts, compute):
+    """
+    Returns the cached result of `compute()` for a user, computing (and caching)
+    it on a miss
+
+    Args:
+        kind (str): one of CACHED_KINDS
+        user_id (int): user the result belongs to
+        parts (tuple): what else the result depends on (folder, cursor, query...)
+        compute: callable returning the result, exceptions are not cached
+    """
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    key = f"filemanager:{kind}:{user_id}:{generation(user_id)}:{digest}"
+    result = cache.get(key)
+    if result is not None:
+        count(kind, "hits")
+        return result
+    count(kind, "misses")
+    result = compute()
+    cache.set(key, result, settings.FILEMANAGER_CACHE_TIMEOUT)
+    return result
+
+
+def etag(user_id, parts):
+    """
+    Returns a strong ETag of a user's cached content, from its generation and
+    what else the response depends on (`parts`), so it is known before rendering
+    """
+    parts = (generation(user_id), parts)
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+def cache_stats():
+    """
+    Returns the hit/miss counters of every kind of cached result
+    """
+    keys = {
+        f"filemanager:stats:{kind}:{outcome}": (kind, outcome)
+        for kind in CACHED_KINDS
+        for outcome in ("hits", "misses")
+    }
+    values = cache.get_many(keys)
+    stats = {kind: {"hits": 0, "misses": 0} for kind in CACHED_KINDS}
+    for key, (kind, outcome) in keys.items():
+        stats[kind][outcome] = values.get(key, 0)
+    # Hit rates of the in-process and Redis tiers, in this process (see core.cache)
+    client = getattr(cache, "client", None)
+    if hasattr(client, "tier_stats"):
+        stats["tiers"] = client.tier_stats()
+    return stats
@@ -0,0 +1,181 @@
+from django.db import transaction
+from django.core.files.storage import default_storage
+from django.utils.text import slugify
+
+import os
+import uuid
+import shutil
+from itertools import batched, groupby
+from collections import Counter
+
+from .models import Blob, File, Folder
+from .models.folder import PATH_SEPARATOR
+from .models.file import PROCESSING_READY, update_storage_used
+from . import search
+
+# Rows inserted per INSERT when copying a subtree
+COPY_BATCH_SIZE = 1000
+
+# Columns of a file shared by its copies, the content is never processed again
+COPIED_FILE_FIELDS = [
+    "name",
+    "file",
+    "blob_id",
+    "sha256",
+    "size",
+    "type",
+    "mime_type",
+    "width",
+    "height",
+    "duration",
+    "thumbnail",
+    "sprite",
+    "renditions",
+    "processing_status",
+]
+
+
+def link_content(name):
+    """
+    Returns a new storage name for the content stored under `name` (files
+    stored before blobs), hardlinked so no byte is copied
+    """
+    new_name = default_storage.get_available_name(name)
+    try:
+        os.link(default_storage.path(name), default_storage.path(new_name))
+    except OSError:
+        # Hardlinks are not supported across file systems
+        shutil.copyfile(default_storage.path(name), default_storage.path(new_name))
+    return new_name
+
+
+def share_content(rows):
+    """
+    Points the copied rows to the content of their originals: one more
+    reference per copy for blobs, a hardlink for files stored before blobs
+    """
+    Blob.objects.retain_many(Counter(row["blob_id"] for row in rows if row["blob_id"]))
+    for row in rows:
+        if not row["blob_id"] and row["file"]:
+            row["file"] = link_content(row["file"])
+
+
+def copy_file(file, folder):
+    """
+    Copies a file into `folder` (None for the root), sharing its content
+
+    Returns:
+        File: the copy, under a free name in `folder`
+    """
+    row = File.objects.filter(pk=file.pk).values(*COPIED_FILE_FIELDS)[0]
+    with transaction.atomic():
+        share_content([row])
+        copy = File(owner_id=file.owner_id, folder=folder, **row)
+        copy.save()
+    return copy
+
+
+def copy_folder(folder, parent):
+    """
+    Copies a folder with its whole subtree into `parent` (None for the root)
+
+    Folders are inserted with bulk_create level by level, files in batches of
+    COPY_BATCH_SIZE rows, and the content is shared instead of copied (see
+    share_content). Trashed items of the subtree are left out.
+
+    Returns:
+        Folder: the copy of `folder`, under a free name in `parent`
+    """
+    with transaction.atomic():
+        folders = list(Folder.objects.subtree(folder).alive().order_by("depth", "pk"))
+        root = Folder(
+            name=folder.name,
+            owner_id=folder.owner_id,
+            parent_folder=parent,
+            total_size=folder.total_size,
+            file_count=folder.file_count,
+            subfolder_count=folder.subfolder_count,
+        )
+        root.save()
+        # The new ancestors already counted the root folder itself on save
+        Folder.objects.filter(pk__in=root.ancestor_ids).add_to_totals(
+            size=folder.total_size,
+            files=folder.file_count,
+            subfolders=folder.subfolder_count,
+        )
+        update_storage_used(folder.owner_id, folder.total_size)
+
+        copies = {folder.pk: root}
+        for _, level in groupby(folders[1:], key=lambda source: source.depth):
+            copies.update(copy_level(list(level), copies))
+        files = File.objects.filter(
+            folder__in=Folder.objects.subtree(folder), deleted_at__isnull=True
+        )
+        copy_files(files.order_by("pk"), copies)
+    return root
+
+
+def copy_level(sources, copies):
+    """
+    Inserts copies of folders sharing the same depth
+
+    Returns:
+        dict: {source folder id: copy}
+    """
+    created = Folder.objects.bulk_create(
+        [
+            Folder(
+                name=source.name,
+                # Slugs are made unique without a lookup per folder
+                slug=f"{slugify(source.name)}-{uuid.uuid4().hex[:8]}",
+                owner_id=source.owner_id,
+                parent_folder=copies[source.parent_folder_id],
+                total_size=source.total_size,
+                file_count=source.file_count,
+                subfolder_count=source.subfolder_count,
+            )
+            for source in sources
+        ],
+        batch_size=COPY_BATCH_SIZE,
+    )
+    for copy in created:
+        copy.path = copy.build_path()
+        copy.depth = copy.path.count(PATH_SEPARATOR) - 2
+    Folder.objects.bulk_update(created, ["path", "depth"], batch_size=COPY_BATCH_SIZE)
+    # bulk_create sends no post_save, the names are indexed here
+    search.index_items(created)
+    return {source.pk: copy for source, copy in zip(sources, created)}
+
+
+def copy_files(files, copies):
+    """
+    Inserts copies of `files` into the copies of their folders, in batches
+    (files of folders left out of the copy, i.e. trashed ones, are skipped)
+    """
+    rows = files.values("folder_id", "owner_id", *COPIED_FILE_FIELDS)
+    copied = (
+        row for row in rows.iterator(COPY_BATCH_SIZE) if row["folder_id"] in copies
+    )
+    for batch in batched(copied, COPY_BATCH_SIZE):
+        share_content(batch)
+        for row in batch:
+            row["folder"] = copies[row.pop("folder_id")]
+        created = File.objects.bulk_create([File(**row) for row in batch])
+        search.index_items(created)
+        # bulk_create sends no post_save either, unprocessed copies (pending
+        # sources, legacy files) are scheduled here
+        schedule_thumbnails(
+            [file.pk for file in created if file.processing_status != PROCESSING_READY]
+        )
+
+
+def schedule_thumbnails(ids):
+    """
+    Generates the thumbnails of the given files in celery, once committed
+    """
+    from filemanager.tasks import generate_thumbnail
+
+    if ids:
+        transaction.on_commit(
+            lambda: [generate_thumbnail.delay(pk) for pk in ids], robust=True
+        )
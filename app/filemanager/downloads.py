@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+
+import os
+import re
+import mimetypes
+from urllib.parse import quote
+
+# Headers handing the transfer of a checked file over to the front proxy
+SENDFILE_HEADERS = {"nginx": "X-Accel-Redirect", "apache": "X-Sendfile"}
+
+# Single byte ranges only, other requests get the whole content (RFC 9110)
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FileRange:
+    """
+    Part of an open file, read from its current position
+
+    It keeps the file number, so WSGI servers with a `wsgi.file_wrapper`
+    (e.g. gunicorn) still send it with sendfile(2), up to the Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Returns the (start, end) bytes of a Range header, both included
+
+    Returns:
+        tuple: None for a missing or unsupported header (the whole content is
+        sent), an empty tuple when the range can not be satisfied
+    """
+    match = RANGE_PATTERN.match(header or "")
+    if match is None or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if not start:
+        # Suffix range, the last bytes of the content
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end or size - 1), size - 1)
+    if start > end:
+        return ()
+    return start, end
+
+
+def file_response(request, file):
+    """
+    Returns the response sending the content of a File, once its access was
+    checked by the caller (see media_response)
+    """
+    content_type = file.mime_type or mimetypes.guess_type(file.name)[0]
+    # Stored content never changes, its digest is a strong validator
+    etag = f'"{file.sha256}"' if file.sha256 else None
+    response = media_response(request, file.file.name, content_type, etag)
+    response["Content-Disposition"] = content_disposition_header(
+        as_attachment=False, filename=file.name
+    )
+    return response
+
+
+def media_response(request, name, content_type=None, etag=None):
+    """
+    Returns the response sending a stored file (by its name under MEDIA_ROOT),
+    once its access was checked by the caller
+
+    With FILEMANAGER_SENDFILE set, only headers are sent and the front proxy
+    reads the file itself (ranges included). Otherwise the file is streamed
+    from here, a single byte range at a time when one is requested.
+    """
+    content_type = content_type or mimetypes.guess_type(name)[0]
+    content_type = content_type or "application/octet-stream"
+    backend = settings.FILEMANAGER_SENDFILE
+    if backend:
+        if backend not in SENDFILE_HEADERS:
+            raise ImproperlyConfigured(f"Unknown FILEMANAGER_SENDFILE {backend!r}")
+        response = HttpResponse(content_type=content_type)
+        if backend == "nginx":
+            # An internal location of the proxy mapped to MEDIA_ROOT
+            location = settings.FILEMANAGER_PROTECTED_MEDIA_URL + quote(name)
+        else:
+            location = default_storage.path(name)
+        response[SENDFILE_HEADERS[backend]] = location
+    else:
+        response = stream_file(request, default_storage.path(name), content_type, etag)
+    if etag:
+        response["ETag"] = etag
+    return response
+
+
+def stream_file(request, path, content_type, etag=None):
+    """
+    Returns a FileResponse of a file, or of the byte range it was asked for
+    """
+    # Closed by the response once sent (or below for an unsatisfiable range)
+    content = open(path, "rb")  # noqa: SIM115
+    size = os.fstat(content.fileno()).st_size
+    byte_range = parse_range(request.headers.get("Range"), size)
+    # A range of an older version of the content is not resumed
+    if_range = request.headers.get("If-Range")
+    if if_range is not None and if_range != etag:
+        byte_range = None
+    if byte_range == ():
+        content.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range is None:
+        response = FileResponse(content, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(
+            FileRange(content, start, end - start + 1),
+            content_type=content_type,
+            status=206,
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
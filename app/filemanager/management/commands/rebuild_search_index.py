@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from filemanager.models import File, Folder
+from filemanager.search import create_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Indexes the names of every file and folder again for the search"
+
+    def handle(self, *args, **options):
+        create_search_index()
+        indexed = rebuild_search_index(Folder, File)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} names"))
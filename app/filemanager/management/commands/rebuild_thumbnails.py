@@ -0,0 +1,181 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+import os
+import json
+import time
+import multiprocessing
+from itertools import batched
+from concurrent.futures import ProcessPoolExecutor
+
+from filemanager import thumbnails
+from filemanager.caching import invalidate_owner
+from filemanager.models import File
+from filemanager.models.file import PROCESSING_READY, RENDERED_FIELDS
+
+# Fields needed to render a thumbnail, the rest of the row is never loaded
+LOADED_FIELDS = [
+    "id",
+    "name",
+    "file",
+    "mime_type",
+    "blob_id",
+    "owner_id",
+    *RENDERED_FIELDS,
+]
+
+
+def render(file):
+    """
+    Renders the thumbnail of a file inside a worker process
+    """
+    file.render_thumbnail()
+    return file
+
+
+class Command(BaseCommand):
+    help = "Regenerates thumbnails of existing files with a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", help="Only files of this owner (email)")
+        parser.add_argument("--type", choices=["image", "video"])
+        parser.add_argument("--status", choices=["pending", "ready", "failed"])
+        parser.add_argument("--since", help="Only files uploaded on/after YYYY-MM-DD")
+        parser.add_argument("--until", help="Only files uploaded on/before YYYY-MM-DD")
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument(
+            "--checkpoint",
+            default=os.path.join(settings.BASE_DIR, "logs", "rebuild_thumbnails.json"),
+            help="File recording the progress of the run",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue an interrupted run from its checkpoint",
+        )
+
+    def handle(self, *args, **options):
+        filters = {
+            key: options[key]
+            for key in ("owner", "type", "status", "since", "until")
+            if options[key]
+        }
+        last_id = self.read_checkpoint(options, filters)
+        files = (
+            self.get_queryset(filters)
+            .filter(pk__gt=last_id)
+            .only(*LOADED_FIELDS)
+            .order_by("pk")
+        )
+
+        processed = ready = 0
+        start = time.perf_counter()
+        # Workers start from a clean interpreter (no inherited database
+        # connections or threads) and never touch the database
+        with ProcessPoolExecutor(
+            max_workers=options["workers"],
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=thumbnails.setup_worker,
+            initargs=(settings.MEDIA_ROOT,),
+        ) as executor:
+            rows = files.iterator(chunk_size=options["batch_size"])
+            for batch in batched(rows, options["batch_size"]):
+                rendered = self.render_batch(executor, batch)
+                processed += len(rendered)
+                ready += sum(
+                    file.processing_status == PROCESSING_READY for file in rendered
+                )
+                self.write_checkpoint(options, filters, rendered[-1].pk)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{processed} files processed ({processed / elapsed:.1f} files/s)"
+                )
+
+        elapsed = time.perf_counter() - start
+        if os.path.exists(options["checkpoint"]):
+            os.remove(options["checkpoint"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt thumbnails of {processed} files "
+                f"({ready} ready, {processed - ready} failed) in {elapsed:.1f}s, "
+                f"{processed / elapsed if elapsed else 0:.1f} files/s"
+            )
+        )
+
+    def get_queryset(self, filters):
+        files = File.objects.all()
+        if "owner" in filters:
+            files = files.filter(owner__user__email=filters["owner"])
+        if "type" in filters:
+            files = files.filter(type=filters["type"])
+        if "status" in filters:
+            files = files.filter(processing_status=filters["status"])
+        if "since" in filters:
+            files = files.filter(created_at__date__gte=filters["since"])
+        if "until" in filters:
+            files = files.filter(created_at__date__lte=filters["until"])
+        return files
+
+    def render_batch(self, executor, batch):
+        """
+        Renders a batch of files (once per distinct content) and saves the results
+        """
+        previous_names = {file.pk: file.thumbnail_names for file in batch}
+        # Files sharing content share their renditions, those are rendered once
+        distinct = {}
+        for file in batch:
+            distinct.setdefault(file.sha256 or file.pk, []).append(file)
+        rendered = executor.map(render, [files[0] for files in distinct.values()])
+        results = []
+        for source, files in zip(rendered, distinct.values()):
+            for file in files:
+                for field in RENDERED_FIELDS:
+                    setattr(file, field, getattr(source, field))
+                results.append(file)
+        File.objects.bulk_update(results, RENDERED_FIELDS)
+        # Bulk updates send no post_save, cached listings would keep pointing
+        # at the stale renditions deleted below
+        for owner_id in {file.owner_id for file in results}:
+            invalidate_owner(owner_id)
+        for file in results:
+            self.delete_stale_renditions(file, previous_names[file.pk])
+        return sorted(results, key=lambda file: file.pk)
+
+    def delete_stale_renditions(self, file, previous_names):
+        """
+        Removes renditions replaced by the rebuild (e.g. after a settings change),
+        unless files with the same content still use them
+        """
+        stale = previous_names - file.thumbnail_names
+        if not stale or not file.sha256:
+            return
+        # Any rendition, the sprite included, may still be referenced
+        referenced = set()
+        twins = File.objects.filter(sha256=file.sha256)
+        for twin in twins.only("thumbnail", "sprite", "renditions"):
+            referenced |= twin.thumbnail_names
+        if stale - referenced:
+            thumbnails.delete_renditions(stale - referenced)
+
+    def read_checkpoint(self, options, filters):
+        if not options["resume"]:
+            return 0
+        try:
+            with open(options["checkpoint"]) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except FileNotFoundError:
+            raise CommandError(f"No checkpoint found at {options['checkpoint']}")
+        if checkpoint["filters"] != filters:
+            raise CommandError(
+                f"Checkpoint was recorded with other filters: {checkpoint['filters']}"
+            )
+        self.stdout.write(f"Resuming after file {checkpoint['last_id']}")
+        return checkpoint["last_id"]
+
+    def write_checkpoint(self, options, filters, last_id):
+        # Written atomically, so an interrupted write never corrupts it
+        path = options["checkpoint"]
+        with open(f"{path}.tmp", "w") as checkpoint_file:
+            json.dump({"filters": filters, "last_id": last_id}, checkpoint_file)
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Profile
+from filemanager.caching import invalidate_owner
+from filemanager.models import File, Folder
+from filemanager.totals import reconcile_totals
+
+
+class Command(BaseCommand):
+    help = "Recomputes folder size/count totals and profile storage, repairing drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the drifted totals",
+        )
+
+    def handle(self, *args, **options):
+        folders, profiles = reconcile_totals(
+            Folder, File, Profile, dry_run=options["dry_run"]
+        )
+        if not options["dry_run"]:
+            # Bulk updates send no post_save, cached listings still show the drift
+            owners = {folder.owner_id for folder in folders}
+            owners.update(profile.pk for profile in profiles)
+            for owner_id in owners:
+                invalidate_owner(owner_id)
+        action = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{action} {len(folders)} drifted folders "
+                f"and {len(profiles)} drifted profiles"
+            )
+        )
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:52
+
+from django.db import migrations, models
+
+
+def mark_existing_thumbnails_ready(apps, schema_editor):
+    # Files uploaded before the celery pipeline already own their thumbnails
+    File = apps.get_model("filemanager", "File")
+    File.objects.exclude(thumbnail="").exclude(thumbnail__isnull=True).update(
+        processing_status="ready"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0003_alter_folder_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="processing_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=10,
+            ),
+        ),
+        migrations.RunPython(mark_existing_thumbnails_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0004_file_processing_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="duration",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="height",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="mime_type",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="width",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0005_file_media_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="sha256",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0008_blob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="renditions",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0009_file_renditions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="file",
+            name="sha256",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0010_file_sha256_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="sprite",
+            field=models.ImageField(blank=True, null=True, upload_to="thumbnails/"),
+        ),
+    ]
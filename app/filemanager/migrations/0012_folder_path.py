@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:23
+
+from django.db import migrations, models
+
+
+def build_folder_paths(apps, schema_editor):
+    # Filling the materialized paths level by level, each round picks the folders
+    # whose parent already has its path (the roots first)
+    Folder = apps.get_model("filemanager", "Folder")
+    while True:
+        level = list(
+            Folder.objects.filter(path="")
+            .exclude(parent_folder__path="")
+            .select_related("parent_folder")
+        )
+        if not level:
+            break
+        for folder in level:
+            parent = folder.parent_folder
+            folder.path = f"{parent.path if parent else '/'}{folder.pk}/"
+            folder.depth = parent.depth + 1 if parent else 0
+        Folder.objects.bulk_update(level, ["path", "depth"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0011_file_sprite"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="folder",
+            name="depth",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="folder",
+            name="path",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=1024
+            ),
+        ),
+        migrations.RunPython(build_folder_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:26
+
+from django.db import migrations, models
+from django.db.models import Count
+
+from filemanager.naming import unique_name
+
+
+def rename_root_duplicates(apps, schema_editor):
+    # Root entries were never unique in the database, duplicates get "name (n)"
+    for model_name, parent_field, keep_extension in [
+        ("File", "folder", True),
+        ("Folder", "parent_folder", False),
+    ]:
+        model = apps.get_model("filemanager", model_name)
+        roots = model.objects.filter(**{f"{parent_field}__isnull": True})
+        duplicates = (
+            roots.values("name", "owner_id")
+            .annotate(count=Count("id"))
+            .filter(count__gt=1)
+        )
+        for duplicate in duplicates:
+            siblings = roots.filter(owner_id=duplicate["owner_id"])
+            extra = siblings.filter(name=duplicate["name"]).order_by("id")[1:]
+            for instance in extra:
+                instance.name = unique_name(
+                    siblings, instance.name, keep_extension=keep_extension
+                )
+                instance.save(update_fields=["name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("filemanager", "0012_folder_path"),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_root_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="file",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("folder__isnull", True)),
+                fields=("name", "owner"),
+                name="unique_root_file_name",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="folder",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("parent_folder__isnull", True)),
+                fields=("name", "owner"),
+                name="unique_root_folder_name",
+            ),
+        ),
+    ]
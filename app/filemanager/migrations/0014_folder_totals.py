@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:29
+
+from django.db import migrations, models
+
+from filemanager.totals import reconcile_totals
+
+
+def compute_totals(apps, schema_editor):
+    reconcile_totals(
+        apps.get_model("filemanager", "Folder"),
+        apps.get_model("filemanager", "File"),
+        apps.get_model("accounts", "Profile"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_profile_storage_used"),
+        ("filemanager", "0013_unique_root_names"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="folder",
+            name="file_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="folder",
+            name="subfolder_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="folder",
+            name="total_size",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compute_totals, migrations.RunPython.noop),
+    ]
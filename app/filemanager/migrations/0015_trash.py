@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_profile_storage_used"),
+        ("filemanager", "0014_folder_totals"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="file",
+            name="unique_root_file_name",
+        ),
+        migrations.RemoveConstraint(
+            model_name="folder",
+            name="unique_root_folder_name",
+        ),
+        migrations.AlterUniqueTogether(
+            name="file",
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name="folder",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="folder",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="file",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("deleted_at__isnull", True)),
+                fields=("name", "folder", "owner"),
+                name="unique_file_name",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="file",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("deleted_at__isnull", True), ("folder__isnull", True)
+                ),
+                fields=("name", "owner"),
+                name="unique_root_file_name",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="folder",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("deleted_at__isnull", True)),
+                fields=("name", "parent_folder", "owner"),
+                name="unique_folder_name",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="folder",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("deleted_at__isnull", True), ("parent_folder__isnull", True)
+                ),
+                fields=("name", "owner"),
+                name="unique_root_folder_name",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_profile_storage_used"),
+        ("filemanager", "0015_trash"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="file",
+            index=models.Index(
+                fields=["owner", "folder", "name", "id"], name="file_listing_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="folder",
+            index=models.Index(
+                fields=["owner", "parent_folder", "name", "id"],
+                name="folder_listing_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:05
+
+from django.db import migrations
+
+from filemanager.search import (
+    create_search_index,
+    drop_search_index,
+    rebuild_search_index,
+)
+
+
+def index_names(apps, schema_editor):
+    create_search_index()
+    rebuild_search_index(
+        apps.get_model("filemanager", "Folder"),
+        apps.get_model("filemanager", "File"),
+    )
+
+
+def drop_index(apps, schema_editor):
+    drop_search_index()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0017_owner_and_trash_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(index_names, drop_index),
+    ]
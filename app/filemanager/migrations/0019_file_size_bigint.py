@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0018_search_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="file",
+            name="size",
+            field=models.PositiveBigIntegerField(blank=True),
+        ),
+    ]
@@ -1,2 +1,9 @@
-from .file import File, validate_file_size, validate_file_type  # noqa: F401
+from .blob import Blob  # noqa: F401
+from .file import (  # noqa: F401
+    File,
+    check_file_size,
+    validate_file_size,
+    validate_file_type,
+)
 from .folder import Folder, validate_name  # noqa: F401
+from .upload import UploadSession  # noqa: F401
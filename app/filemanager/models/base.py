@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Subquery
+
+from accounts.models import Profile
 
 
 # Abstract Base Model
@@ -8,3 +11,26 @@ class BaseModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class OwnedQuerySet(models.QuerySet):
+    def owned_by(self, user_id):
+        """
+        Filters the rows owned by a user on their owner column (and its indexes),
+        the profile of the user is resolved once by a scalar subquery
+        instead of joining every row to its profile and user
+        """
+        profile_id = Profile.objects.filter(user_id=user_id).values("pk")[:1]
+        return self.filter(owner_id=Subquery(profile_id))
+
+
+def format_size(size):
+    """
+    Returns a size in bytes in human-readable format
+    """
+    if size < 1024:
+        return "%d B" % size
+    elif size < 1024 * 1024:
+        return "%.1f KB" % (size / 1024)
+    else:
+        return "%.1f MB" % (size / (1024 * 1024))
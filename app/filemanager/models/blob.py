@@ -0,0 +1,137 @@
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.dispatch import receiver
+from django.db.models.signals import post_delete
+
+import os
+import hashlib
+
+from .base import BaseModel
+
+
+def blob_upload_to(instance, filename):
+    # Sharding blobs by hash prefix keeps directories small
+    extension = os.path.splitext(filename)[1].lower()
+    sha256 = instance.sha256
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def content_sha256(content):
+    """
+    Returns the SHA-256 hex digest of a file object, read in chunks
+    """
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    content.seek(0)
+    return sha256.hexdigest()
+
+
+class BlobManager(models.Manager):
+    """
+    Reference counted access to content-addressed blobs
+    """
+
+    def acquire(self, content, sha256):
+        """
+        Returns the blob of the given content with one more reference,
+        bytes are only written when the content is not stored yet
+        """
+        for _ in range(3):
+            blob = self.filter(sha256=sha256).first() or self._store(content, sha256)
+            # The blob may have been reclaimed between the lookup and the increment
+            if self.filter(pk=blob.pk).update(ref_count=F("ref_count") + 1):
+                blob.ref_count += 1
+                return blob
+        raise IntegrityError(f"Could not acquire blob {sha256}")
+
+    def release(self, blob_id):
+        """
+        Drops one reference of a blob, the blob is reclaimed with its last reference
+
+        Returns:
+            bool: Whether the blob was reclaimed
+        """
+        self.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F("ref_count") - 1)
+        deleted, _ = self.filter(pk=blob_id, ref_count=0, files__isnull=True).delete()
+        return bool(deleted)
+
+    def retain_many(self, counts):
+        """
+        Adds references to stored blobs with a single update (e.g. for copies)
+
+        Args:
+            counts (dict): {blob id: number of added references}
+        """
+        if not counts:
+            return
+        added = Case(*[When(pk=pk, then=Value(count)) for pk, count in counts.items()])
+        self.filter(pk__in=counts).update(ref_count=F("ref_count") + added)
+
+    def release_many(self, counts):
+        """
+        Drops references of several blobs with a single update,
+        the blobs left without references are reclaimed
+
+        Args:
+            counts (dict): {blob id: number of dropped references}
+
+        Returns:
+            int: Number of reclaimed blobs
+        """
+        if not counts:
+            return 0
+        dropped = Case(
+            *[When(pk=pk, then=Value(count)) for pk, count in counts.items()]
+        )
+        self.filter(pk__in=counts).update(
+            ref_count=Greatest(F("ref_count") - dropped, Value(0))
+        )
+        deleted, _ = self.filter(
+            pk__in=counts, ref_count=0, files__isnull=True
+        ).delete()
+        return deleted
+
+    def _store(self, content, sha256):
+        blob = self.model(sha256=sha256, size=content.size)
+        storage = blob.file.storage
+        name = blob_upload_to(blob, content.name)
+        # Leftover of an interrupted write (content-addressed, so size must match)
+        if storage.exists(name) and storage.size(name) != content.size:
+            storage.delete(name)
+        if not storage.exists(name):
+            name = storage.save(name, content)
+        blob.file.name = name
+        try:
+            with transaction.atomic():
+                blob.save()
+        except IntegrityError:
+            # Stored concurrently by another upload of the same content
+            blob = self.get(sha256=sha256)
+            if blob.file.name != name:
+                storage.delete(name)
+        return blob
+
+
+class Blob(BaseModel):
+    """
+    Content-addressed file content shared by every File with the same SHA-256
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=blob_upload_to, max_length=255)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+
+    objects = BlobManager()
+
+    def __str__(self):
+        return self.sha256
+
+
+@receiver(post_delete, sender=Blob)
+def delete_blob_on_model_delete(sender, instance, **kwargs):
+    if instance.file:
+        if os.path.isfile(instance.file.path):
+            os.remove(instance.file.path)
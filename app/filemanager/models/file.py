@@ -1,22 +1,31 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef
 from django.conf import settings
 from django.forms import ValidationError
 from django.dispatch import receiver
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.db.models.fields.files import FieldFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 import os
 import logging
 import mimetypes
-from PIL import Image
-from moviepy.video.io.VideoFileClip import VideoFileClip
 
-from .base import BaseModel
-from .folder import Folder
-
-# Default Thumbnail for video files
-DEFAULT_THUMBNAIL_PATH = os.path.join(
-    settings.BASE_DIR, "static/img/default-video-thumbnail.png"
+from .base import BaseModel, OwnedQuerySet, format_size
+from .blob import Blob, content_sha256
+from .folder import Folder, trashed_ancestors
+from accounts.models import Profile
+from filemanager import search, thumbnails
+from filemanager.caching import invalidate_owner
+from filemanager.naming import save_with_unique_name
+from filemanager.probe import (
+    SUPPORTED_MIME_TYPES,
+    ImageTooLargeError,
+    MediaProbeError,
+    detect_mime_type,
+    probe_media,
 )
 
 #
@@ -25,64 +34,82 @@ FILE_TYPE_CHOICES = [
     ("image", "Image"),
 ]
 
+# Thumbnail processing states
+PROCESSING_PENDING = "pending"
+PROCESSING_READY = "ready"
+PROCESSING_FAILED = "failed"
+PROCESSING_STATUS_CHOICES = [
+    (PROCESSING_PENDING, "Pending"),
+    (PROCESSING_READY, "Ready"),
+    (PROCESSING_FAILED, "Failed"),
+]
+
+# Fields written by thumbnail generation
+PROCESSED_FIELDS = ["thumbnail", "sprite", "renditions", "processing_status"]
+RENDERED_FIELDS = ["sha256", "duration", *PROCESSED_FIELDS]
+
 # logger object
 logger = logging.getLogger(__name__)
 
 
 # File type custom validator
 def validate_file_type(value):
-    valid_mime_types = [
-        "image/jpeg",
-        "image/jpg",
-        "image/png",
-        "image/gif",
-        "image/bmp",
-        "image/tiff",
-        "video/mp4",
-        "video/mkv",
-        "video/wmv",
-        "video/mov",
-        "video/avi",
-        "video/mpeg",
-        "video/quicktime",
-        "video/x-msvideo",
-        "video/x-ms-wmv",
-    ]
-    mime_type, encoding = mimetypes.guess_type(value.name)
-    if mime_type not in valid_mime_types or mime_type is None:
+    """
+    Checks the container signature of the file and probes its metadata,
+    the probe result is kept on the file to be reused while saving
+    """
+    upload = value.file if isinstance(value, FieldFile) else value
+    # Known content was already validated when its blob was stored
+    sha256 = getattr(upload, "sha256", None)
+    if sha256 and Blob.objects.filter(sha256=sha256).exists():
+        return
+    mime_type = detect_mime_type(upload)
+    if mime_type not in SUPPORTED_MIME_TYPES:
         raise ValidationError(
             _("Unsupported file type. Only videos and images are supported.")
         )
-    if mime_type and mime_type.startswith("image"):
-        try:
-            # Verify uploaded file is an image
-            image = Image.open(value)
-            image.verify()
-        except Exception:
+    try:
+        upload.media_info = probe_media(upload, mime_type)
+    except ImageTooLargeError:
+        raise ValidationError(_("Image dimensions are too large."))
+    except MediaProbeError:
+        if mime_type.startswith("image"):
             raise ValidationError(
                 _("Unsupported file type. Your file is not a valid image.")
             )
-    if mime_type and mime_type.startswith("video"):
-        try:
-            # Verify uploaded file is a video
-            clip = VideoFileClip(value.temporary_file_path())
-            clip.reader.close()  # Close the reader
-        except Exception:
-            raise ValidationError(
-                _("Unsupported file type. Your file is not a valid video.")
-            )
+        raise ValidationError(
+            _("Unsupported file type. Your file is not a valid video.")
+        )
 
 
-# File size custom validator
-def validate_file_size(value):
-    max_size_mb = 7
-    if value.size > max_size_mb * 1024 * 1024:
+def check_file_size(size):
+    max_size_mb = settings.FILEMANAGER_MAX_UPLOAD_SIZE_MB
+    if size > max_size_mb * 1024 * 1024:
         raise ValidationError(
             _("File size exceeds the maximum limit of %(max_size_mb)d MB"),
             params={"max_size_mb": max_size_mb},
         )
 
 
+# File size custom validator
+def validate_file_size(value):
+    check_file_size(value.size)
+
+
+class FileQuerySet(OwnedQuerySet):
+    def alive(self):
+        """
+        Excludes the files in the trash, and the files of trashed folders
+        """
+        return self.filter(deleted_at__isnull=True).exclude(
+            Exists(
+                trashed_ancestors(
+                    Folder, OuterRef("folder__path"), OuterRef("owner_id")
+                )
+            )
+        )
+
+
 # Model
 class File(BaseModel):
     name = models.CharField(max_length=255, blank=True)
@@ -90,107 +117,366 @@ class File(BaseModel):
         upload_to="uploads/", validators=[validate_file_type, validate_file_size]
     )
     type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES)
-    size = models.PositiveIntegerField(blank=True)
+    size = models.PositiveBigIntegerField(blank=True)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    blob = models.ForeignKey(
+        Blob, on_delete=models.PROTECT, related_name="files", null=True, blank=True
+    )
+    mime_type = models.CharField(max_length=100, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
     thumbnail = models.ImageField(upload_to="thumbnails/", null=True, blank=True)
+    sprite = models.ImageField(upload_to="thumbnails/", null=True, blank=True)
+    renditions = models.JSONField(default=dict, blank=True)
+    processing_status = models.CharField(
+        max_length=10, choices=PROCESSING_STATUS_CHOICES, default=PROCESSING_PENDING
+    )
     folder = models.ForeignKey(
         Folder, on_delete=models.CASCADE, related_name="files", null=True, blank=True
     )
+    # Indexed as the first column of file_listing_idx
     owner = models.ForeignKey(
-        "accounts.Profile", on_delete=models.CASCADE, related_name="files"
+        "accounts.Profile",
+        on_delete=models.CASCADE,
+        related_name="files",
+        db_index=False,
     )
+    # Set when the file is moved to the trash, purged later (see tasks.purge_trash)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = FileQuerySet.as_manager()
 
     @property
     def formatted_size(self):
         """
         Returns the file size in human-readable format.
         """
-        size = self.size
-        if size < 1024:
-            return "%d B" % size
-        elif size < 1024 * 1024:
-            return "%.1f KB" % (size / 1024)
-        else:
-            return "%.1f MB" % (size / (1024 * 1024))
+        return format_size(self.size)
 
     def __str__(self):
         return self.name
 
+    @property
+    def is_processed(self):
+        """
+        Returns True when the thumbnail of this file is ready to be displayed.
+        """
+        return self.processing_status == PROCESSING_READY and bool(self.thumbnail)
+
+    @property
+    def srcset(self):
+        """
+        Returns the `srcset` attribute value of the thumbnail renditions.
+        """
+        return ", ".join(
+            f"{default_storage.url(rendition['name'])} {rendition['width']}w"
+            for rendition in sorted(
+                self.renditions.values(), key=lambda rendition: rendition["width"]
+            )
+        )
+
+    @property
+    def thumbnail_names(self):
+        """
+        Returns the storage names of every generated thumbnail of this file.
+        """
+        names = {rendition["name"] for rendition in self.renditions.values()}
+        if self.thumbnail:
+            names.add(self.thumbnail.name)
+        if self.sprite:
+            names.add(self.sprite.name)
+        return names
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembering the loaded folder, so moves can be detected on save
+        instance._loaded_folder_id = instance.__dict__.get("folder_id")
+        return instance
+
     def save(self, *args, **kwargs):
+        upload = self.file.file if self.file and not self.file._committed else None
+        # Reusing the digest computed while streaming (see uploadhandlers)
+        if upload is not None and not self.sha256:
+            self.sha256 = getattr(upload, "sha256", "")
+        # Reusing the metadata probed during validation (see validate_file_type)
+        media_info = getattr(upload, "media_info", None)
+        if media_info is not None and not self.mime_type:
+            self.mime_type = media_info.mime_type
+            self.width = media_info.width
+            self.height = media_info.height
+            self.duration = media_info.duration
+            self.type = self.type or media_info.kind
         if not self.name:
             self.name = os.path.basename(self.file.name)
-        if not self.size:
-            self.size = self.file.size
-        if not self.type:
-            self.type = self.choose_file_type()
-        super().save(*args, **kwargs)
-        if not self.thumbnail:
-            self.create_thumbnail()
+        with transaction.atomic():
+            if upload is not None and self._state.adding:
+                self.store_content(upload)
+            if not self.size:
+                self.size = self.file.size
+            if not self.type:
+                self.type = self.choose_file_type()
+            if self.thumbnail and self.processing_status == PROCESSING_PENDING:
+                self.processing_status = PROCESSING_READY
+            moved = not self._state.adding and (
+                self.folder_id != getattr(self, "_loaded_folder_id", self.folder_id)
+            )
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "name" not in update_fields:
+                super().save(*args, **kwargs)
+            else:
+                # A second "photo.jpg" in the same folder is stored as "photo (1).jpg"
+                siblings = File.objects.filter(
+                    folder_id=self.folder_id,
+                    owner_id=self.owner_id,
+                    deleted_at__isnull=True,
+                )
+                save_with_unique_name(
+                    self,
+                    siblings,
+                    lambda: super(File, self).save(*args, **kwargs),
+                    keep_extension=True,
+                )
+            if moved:
+                update_folder_totals(self._loaded_folder_id, -self.size, -1)
+                update_folder_totals(self.folder_id, self.size, 1)
+        self._loaded_folder_id = self.folder_id
+
+    def trash(self):
+        """
+        Moves this file to the trash, its content is purged later
+        """
+        with transaction.atomic():
+            self.deleted_at = timezone.now()
+            trashed = File.objects.filter(pk=self.pk, deleted_at__isnull=True).update(
+                deleted_at=self.deleted_at
+            )
+            if trashed:
+                update_folder_totals(self.folder_id, -self.size, -1)
+                invalidate_owner(self.owner_id)
+
+    def restore(self):
+        """
+        Brings this file back from the trash, under a free name
+        """
+        with transaction.atomic():
+            self.deleted_at = None
+            self.save(update_fields=["name", "deleted_at"])
+            update_folder_totals(self.folder_id, self.size, 1)
+
+    def store_content(self, upload):
+        """
+        Points this file to the content-addressed blob of the upload,
+        known content is neither written again nor processed again
+        """
+        self.sha256 = self.sha256 or content_sha256(upload)
+        self.blob = Blob.objects.acquire(upload, self.sha256)
+        self.file = self.blob.file.name
+        self.size = self.blob.size
+        self.reuse_processed_content()
+
+    def reuse_processed_content(self):
+        """
+        Copies metadata and thumbnail from another file sharing the same blob
+
+        Returns:
+            bool: Whether a ready thumbnail was reused
+        """
+        twins = File.objects.filter(blob_id=self.blob_id).exclude(pk=self.pk)
+        twin = twins.filter(processing_status=PROCESSING_READY).first() or twins.first()
+        if twin is None:
+            return False
+        if not self.mime_type:
+            self.mime_type = twin.mime_type
+            self.width = twin.width
+            self.height = twin.height
+            self.duration = twin.duration
+        if twin.is_processed:
+            self.thumbnail = twin.thumbnail.name
+            self.sprite = twin.sprite.name
+            self.renditions = twin.renditions
+            self.processing_status = PROCESSING_READY
+            return True
+        return False
 
     def choose_file_type(self):
-        mime_type, _ = mimetypes.guess_type(self.file.name)
-        if mime_type.startswith("image"):
+        mime_type = self.mime_type or mimetypes.guess_type(self.file.name)[0]
+        if mime_type and mime_type.startswith("image"):
             return "image"
-        elif mime_type.startswith("video"):
+        elif mime_type and mime_type.startswith("video"):
             return "video"
 
     def create_thumbnail(self):
-        mime_type, _ = mimetypes.guess_type(self.file.name)
-        if mime_type and mime_type.startswith("image"):
-            self.create_image_thumbnail()
-        elif mime_type and mime_type.startswith("video"):
-            self.create_video_thumbnail()
+        """
+        Generates the thumbnail renditions of this file and records the result.
+        (Runs inside a celery worker, see filemanager.tasks.generate_thumbnail)
+        """
+        self.render_thumbnail()
+        # Only touching processing fields, so concurrent renames are not overwritten
+        self.save(update_fields=RENDERED_FIELDS)
+        if self.blob_id and self.processing_status == PROCESSING_READY:
+            # Sharing the thumbnail with files of the same content waiting for it
+            waiting = File.objects.filter(
+                blob_id=self.blob_id, processing_status=PROCESSING_PENDING
+            )
+            waiting = dict(waiting.values_list("pk", "owner_id"))
+            File.objects.filter(
+                pk__in=waiting, processing_status=PROCESSING_PENDING
+            ).update(
+                thumbnail=self.thumbnail.name,
+                sprite=self.sprite.name,
+                renditions=self.renditions,
+                processing_status=PROCESSING_READY,
+            )
+            # update() sends no post_save, the twins' owners may be other users
+            for owner_id in set(waiting.values()):
+                invalidate_owner(owner_id)
+
+    def render_thumbnail(self):
+        """
+        Renders the thumbnail renditions of this file without saving it.
+        (No database access, so it can run in a worker process)
+        """
+        mime_type = self.mime_type or mimetypes.guess_type(self.file.name)[0]
+        try:
+            # Renditions are named after the content, older files get hashed here
+            if not self.sha256:
+                self.sha256 = content_sha256(self.file)
+            if mime_type and mime_type.startswith("image"):
+                self.renditions = self.create_image_thumbnail()
+            elif mime_type and mime_type.startswith("video"):
+                self.renditions = self.create_video_thumbnail()
+                self.sprite = self.create_video_sprite()
+            else:
+                raise ValueError(f"Unsupported mime type {mime_type}")
+            self.thumbnail = thumbnails.default_rendition(self.renditions)
+            self.processing_status = PROCESSING_READY
+        except Exception as error:
+            logger.error(f"Failed to create thumbnail for {self.file.name}: {error}")
+            self.thumbnail = None
+            self.sprite = None
+            self.renditions = {}
+            self.processing_status = PROCESSING_FAILED
 
     def create_image_thumbnail(self):
-        thumbnail_size = (100, 100)
-        image = Image.open(self.file)
-        image.thumbnail(thumbnail_size, Image.LANCZOS)
-        thumbnail_folder = "media/thumbnails"
-        os.makedirs(thumbnail_folder, exist_ok=True)
-        thumbnail_dir = "thumbnails"
-        thumbnail_filename = os.path.basename(self.file.name)
-        thumbnail_path = os.path.join(thumbnail_dir, thumbnail_filename)
-        thumbnail_full_path = os.path.join("media/", thumbnail_path)
-        image.save(thumbnail_full_path)
-        self.thumbnail = thumbnail_path
-        self.save()
+        return thumbnails.image_renditions(self.file, self.sha256)
 
     def create_video_thumbnail(self):
-        thumbnail_size = (100, 100)
-        thumbnail_folder = "media/thumbnails"
-        os.makedirs(thumbnail_folder, exist_ok=True)
-        thumbnail_dir = "thumbnails"
-        thumbnail_filename = os.path.basename(self.file.name)
-        thumbnail_path = os.path.join(thumbnail_dir, thumbnail_filename + ".jpg")
-        thumbnail_full_path = os.path.join("media/", thumbnail_path)
-        file_path = self.file.path
+        # Older files were not probed on upload
+        if self.duration is None:
+            self.duration = thumbnails.video_duration(self.file.path)
+        return thumbnails.video_renditions(self.file.path, self.sha256, self.duration)
+
+    def create_video_sprite(self):
+        # The hover strip is optional, the poster alone is a usable thumbnail
         try:
-            clip = VideoFileClip(file_path)
-            frame = clip.get_frame(1)  # Capture frame at 1 second
-            clip.close()
+            return thumbnails.video_sprite(self.file.path, self.sha256, self.duration)
+        except Exception as error:
+            logger.warning(f"Failed to create sprite for {self.file.name}: {error}")
+            return None
 
-            thumbnail = Image.fromarray(frame)
-            thumbnail.thumbnail(thumbnail_size)
+    class Meta:
+        indexes = [
+            # Listing a folder page by page (see pagination.paginate_listing)
+            models.Index(
+                fields=["owner", "folder", "name", "id"], name="file_listing_idx"
+            ),
+            # Purging the expired trash (see tasks.purge_trash)
+            models.Index(
+                fields=["deleted_at"],
+                condition=models.Q(deleted_at__isnull=False),
+                name="file_purge_idx",
+            ),
+        ]
+        constraints = [
+            # Trashed files do not hold on to their names
+            models.UniqueConstraint(
+                fields=["name", "folder", "owner"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="unique_file_name",
+            ),
+            # NULL folders are distinct in unique constraints, root files need their own
+            models.UniqueConstraint(
+                fields=["name", "owner"],
+                condition=models.Q(folder__isnull=True, deleted_at__isnull=True),
+                name="unique_root_file_name",
+            ),
+        ]
 
-            thumbnail.save(thumbnail_full_path)
 
-            self.thumbnail = thumbnail_path
-            self.save()
-        except Exception as error:
-            logger.error(
-                f"Failed to create thumbnail for video {self.file.name}: {error}"
-            )
-            self.thumbnail = DEFAULT_THUMBNAIL_PATH
-            self.save()
+def update_folder_totals(folder_id, size, files):
+    """
+    Applies a size/file count delta to a folder and all of its ancestors
+    """
+    if folder_id is None:
+        return
+    path = Folder.objects.filter(pk=folder_id).values_list("path", flat=True).first()
+    if path is not None:
+        folder = Folder(pk=folder_id, path=path)
+        Folder.objects.filter(pk__in=folder.path_ids).add_to_totals(
+            size=size, files=files
+        )
 
-    class Meta:
-        unique_together = ("name", "folder", "owner")
+
+def update_storage_used(owner_id, size):
+    Profile.objects.filter(pk=owner_id).update(storage_used=F("storage_used") + size)
+
+
+@receiver(post_save, sender=File)
+def update_totals_on_create(sender, instance, created, **kwargs):
+    if created:
+        update_folder_totals(instance.folder_id, instance.size, 1)
+        update_storage_used(instance.owner_id, instance.size)
+
+
+@receiver(post_save, sender=File)
+def schedule_thumbnail_on_create(sender, instance, created, **kwargs):
+    # Thumbnails are generated by a celery worker once the row is committed
+    if created and instance.processing_status == PROCESSING_PENDING:
+        from filemanager.tasks import generate_thumbnail
+
+        transaction.on_commit(
+            lambda: generate_thumbnail.delay(instance.pk), robust=True
+        )
+
+
+@receiver(post_save, sender=File)
+def index_name_on_save(sender, instance, update_fields=None, **kwargs):
+    # Processing saves only their own fields, the name index is left alone
+    if update_fields is None or "name" in update_fields:
+        search.index_items([instance])
+
+
+# Sent before any row of a cascade is deleted, the folder paths still exist
+@receiver(pre_delete, sender=File)
+def update_totals_on_delete(sender, instance, **kwargs):
+    # Trashed files were already taken out of the folder totals
+    if instance.deleted_at is None:
+        update_folder_totals(instance.folder_id, -instance.size, -1)
+    update_storage_used(instance.owner_id, -instance.size)
+
+
+@receiver(post_delete, sender=File)
+def unindex_name_on_delete(sender, instance, **kwargs):
+    search.unindex_items(File, [instance.pk])
+
+
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+def invalidate_cache_on_change(sender, instance, **kwargs):
+    # Uploads, renames, moves, processing and deletions change the cached listings
+    invalidate_owner(instance.owner_id)
 
 
 @receiver(post_delete, sender=File)
 def delete_file_on_model_delete(sender, instance, **kwargs):
-    if instance.file:
+    if instance.blob_id:
+        # Shared content is only reclaimed along with its last reference
+        Blob.objects.release(instance.blob_id)
+    elif instance.file:
         if os.path.isfile(instance.file.path):
             os.remove(instance.file.path)
-    if instance.thumbnail:
-        if os.path.isfile(instance.thumbnail.path):
-            os.remove(instance.thumbnail.path)
+    # Thumbnails are named after the content, so files with equal content share them
+    if not instance.sha256 or not File.objects.filter(sha256=instance.sha256).exists():
+        thumbnails.delete_renditions(instance.thumbnail_names)
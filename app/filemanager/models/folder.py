@@ -1,11 +1,19 @@
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_save
+from django.db.models import Exists, ExpressionWrapper, F, OuterRef, Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
 from django.utils.text import slugify
 from django.forms import ValidationError
 
 import uuid
 import re
 
-from .base import BaseModel
+from .base import BaseModel, OwnedQuerySet, format_size
+from filemanager import search
+from filemanager.caching import invalidate_owner
+from filemanager.naming import save_with_unique_name
 
 
 # Custom validator for name field
@@ -16,12 +24,64 @@ def validate_name(value):
         )
 
 
+# Separator of the folder ids in a materialized path ("/1/5/9/")
+PATH_SEPARATOR = "/"
+
+
+def trashed_ancestors(model, path, owner_id):
+    """
+    Returns the trashed folders whose subtree contains `path`
+    (meant for Exists(), with OuterRef arguments)
+    """
+    return (
+        model.objects.filter(deleted_at__isnull=False, owner_id=owner_id)
+        .annotate(descendant_path=ExpressionWrapper(path, models.CharField()))
+        .filter(descendant_path__startswith=F("path"))
+    )
+
+
+class FolderQuerySet(OwnedQuerySet):
+    def alive(self):
+        """
+        Excludes the folders in the trash, and the folders below them
+        """
+        return self.filter(deleted_at__isnull=True).exclude(
+            Exists(
+                trashed_ancestors(self.model, OuterRef("path"), OuterRef("owner_id"))
+            )
+        )
+
+    def subtree(self, folder, include_self=True):
+        """
+        Returns the folders below `folder` with a single indexed range query
+        (every path starting with "/1/5/" sorts between "/1/5/" and "/1/50")
+        """
+        upper_bound = folder.path[:-1] + chr(ord(PATH_SEPARATOR) + 1)
+        lower_bound = {"path__gte" if include_self else "path__gt": folder.path}
+        return self.filter(**lower_bound, path__lt=upper_bound)
+
+    def add_to_totals(self, size=0, files=0, subfolders=0):
+        """
+        Applies signed deltas to the subtree totals of the selected folders
+        (a single UPDATE, meant for the ancestor chain of a change)
+        """
+        return self.update(
+            total_size=F("total_size") + size,
+            file_count=F("file_count") + files,
+            subfolder_count=F("subfolder_count") + subfolders,
+        )
+
+
 # Models
 class Folder(BaseModel):
     name = models.CharField(max_length=255, validators=[validate_name])
     slug = models.SlugField(max_length=255, unique=True, blank=True)
+    # Indexed as the first column of folder_listing_idx
     owner = models.ForeignKey(
-        "accounts.Profile", on_delete=models.CASCADE, related_name="folders"
+        "accounts.Profile",
+        on_delete=models.CASCADE,
+        related_name="folders",
+        db_index=False,
     )
     parent_folder = models.ForeignKey(
         "self",
@@ -30,41 +90,255 @@ class Folder(BaseModel):
         blank=True,
         related_name="subfolders",
     )
+    # Ids of the ancestors and the folder itself, from the root ("/1/5/9/")
+    path = models.CharField(max_length=1024, blank=True, editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Totals of the whole subtree, maintained incrementally (see add_to_totals)
+    total_size = models.BigIntegerField(default=0, editable=False)
+    file_count = models.IntegerField(default=0, editable=False)
+    subfolder_count = models.IntegerField(default=0, editable=False)
+    # Set on the root of a trashed subtree only, purged later (see tasks.purge_trash)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = FolderQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    @property
+    def formatted_size(self):
+        return format_size(self.total_size)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembering the loaded parent, so moves can be detected on save
+        instance._loaded_parent_id = instance.__dict__.get("parent_folder_id")
+        return instance
+
+    def clean(self):
+        # Checked by the move and copy forms, move_subtree enforces it too
+        parent = self.parent_folder
+        if self.path and parent and parent.path.startswith(self.path):
+            raise ValidationError(
+                {"parent_folder": "A folder can not be put into its own subfolder"}
+            )
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-            # Preventing creation of duplicate folders in the same parent
-            count = 0
-            while Folder.objects.filter(
-                name=self.name, parent_folder=self.parent_folder, owner=self.owner
-            ).exists():
-                count += 1
-                if self.name[-1].isdigit():
-                    self.name = self.name[:-1]
-                self.name += str(count)
-            # Ensure the slug is unique for folders with the same name but different parents
-            if Folder.objects.filter(slug=self.slug).exists():
-                self.slug = f"{self.slug}-{uuid.uuid4().hex[:8]}"
-        else:
-            # Preventing renaming of duplicate folders in the same parent
-            count = 0
-            while Folder.objects.filter(
-                name=self.name, parent_folder=self.parent_folder, owner=self.owner
-            ).exists():
-                count += 1
-                if self.name[-1].isdigit():
-                    self.name = self.name[:-1]
-                self.name += str(count)
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" not in update_fields:
+            return self.save_in_tree(*args, **kwargs)
+        generate_slug = not self.slug
+
+        def save_once():
+            if generate_slug:
+                # Ensure the slug is unique for folders with the same name but different parents
+                self.slug = slugify(self.name)
+                if Folder.objects.filter(slug=self.slug).exists():
+                    self.slug = f"{self.slug}-{uuid.uuid4().hex[:8]}"
+            self.save_in_tree(*args, **kwargs)
+
+        # Preventing duplicate folder names in the same parent ("name (1)")
+        siblings = Folder.objects.filter(
+            parent_folder_id=self.parent_folder_id,
+            owner_id=self.owner_id,
+            deleted_at__isnull=True,
+        )
+        save_with_unique_name(self, siblings, save_once)
+
+    def save_in_tree(self, *args, **kwargs):
+        with transaction.atomic():
+            moved = not self._state.adding and (
+                self.parent_folder_id != getattr(self, "_loaded_parent_id", None)
+            )
+            super().save(*args, **kwargs)
+            if not self.path:
+                self.update_path()
+                Folder.objects.filter(pk__in=self.ancestor_ids).add_to_totals(
+                    subfolders=1
+                )
+            elif moved:
+                self.move_subtree()
+        self._loaded_parent_id = self.parent_folder_id
+
+    def build_path(self):
+        parent_path = self.parent_folder.path if self.parent_folder else PATH_SEPARATOR
+        return f"{parent_path}{self.pk}{PATH_SEPARATOR}"
+
+    def update_path(self):
+        self.path = self.build_path()
+        self.depth = self.path.count(PATH_SEPARATOR) - 2
+        Folder.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+
+    def move_subtree(self):
+        """
+        Rewrites the paths of this folder and its descendants after a move,
+        with a single UPDATE whatever the size of the subtree
+        """
+        old_path = self.path
+        if self.parent_folder and self.parent_folder.path.startswith(old_path):
+            raise ValidationError("A folder can not be moved into its own subfolder")
+        old_ancestor_ids = self.ancestor_ids
+        new_path = self.build_path()
+        depth_change = new_path.count(PATH_SEPARATOR) - old_path.count(PATH_SEPARATOR)
+        Folder.objects.subtree(self).update(
+            path=Concat(Value(new_path), Substr("path", len(old_path) + 1)),
+            depth=F("depth") + depth_change,
+        )
+        self.path = new_path
+        self.depth += depth_change
+        # Moving the subtree totals from the old ancestors to the new ones
+        totals = Folder.objects.filter(pk=self.pk).values(
+            "total_size", "file_count", "subfolder_count"
+        )[0]
+        delta = {
+            "size": totals["total_size"],
+            "files": totals["file_count"],
+            "subfolders": totals["subfolder_count"] + 1,
+        }
+        Folder.objects.filter(pk__in=old_ancestor_ids).add_to_totals(
+            **{key: -value for key, value in delta.items()}
+        )
+        Folder.objects.filter(pk__in=self.ancestor_ids).add_to_totals(**delta)
+
+    def trash(self):
+        """
+        Moves this folder and its whole subtree to the trash, in constant queries
+        """
+        with transaction.atomic():
+            self.deleted_at = timezone.now()
+            trashed = Folder.objects.filter(pk=self.pk, deleted_at__isnull=True).update(
+                deleted_at=self.deleted_at
+            )
+            if trashed:
+                self.shift_totals(-1)
+                invalidate_owner(self.owner_id)
+
+    def restore(self):
+        """
+        Brings this folder back from the trash, under a free name
+        """
+        with transaction.atomic():
+            self.deleted_at = None
+            self.save(update_fields=["name", "deleted_at"])
+            self.shift_totals(1)
+
+    def shift_totals(self, sign):
+        # Adding (or removing) the subtree totals to the ancestors
+        totals = Folder.objects.filter(pk=self.pk).values(
+            "total_size", "file_count", "subfolder_count"
+        )[0]
+        Folder.objects.filter(pk__in=self.ancestor_ids).add_to_totals(
+            size=sign * totals["total_size"],
+            files=sign * totals["file_count"],
+            subfolders=sign * (totals["subfolder_count"] + 1),
+        )
+
+    @property
+    def path_ids(self):
+        """
+        Returns the ids of the ancestors of this folder and its own id, from the root
+        """
+        if not self.path:
+            return []
+        return [int(pk) for pk in self.path.strip(PATH_SEPARATOR).split(PATH_SEPARATOR)]
+
+    @property
+    def ancestor_ids(self):
+        return self.path_ids[:-1]
+
+    def get_ancestors(self):
+        """
+        Returns the ancestors of this folder from the root, in a single query
+        """
+        return Folder.objects.filter(pk__in=self.ancestor_ids).order_by("depth")
+
+    def get_breadcrumbs(self):
+        return [*self.get_ancestors(), self]
+
+    def get_descendants(self, include_self=False):
+        return Folder.objects.subtree(self, include_self=include_self)
+
+    def is_descendant_of(self, folder):
+        return self.pk != folder.pk and self.path.startswith(folder.path)
 
     def get_nested_path(self):
-        if self.parent_folder:
-            return f"{self.parent_folder.get_nested_path()} / {self.name}"
-        return self.name
+        # Listings set it for all of their folders at once (see prefetch_nested_paths)
+        if hasattr(self, "_nested_path"):
+            return self._nested_path
+        return " / ".join(folder.name for folder in self.get_breadcrumbs())
 
     class Meta:
-        unique_together = ("name", "parent_folder", "owner")
+        indexes = [
+            # Listing a folder page by page (see pagination.paginate_listing)
+            models.Index(
+                fields=["owner", "parent_folder", "name", "id"],
+                name="folder_listing_idx",
+            ),
+            # Looking for trashed ancestors (see trashed_ancestors), only the
+            # trashed folders are indexed so the check reads a handful of rows
+            models.Index(
+                fields=["owner", "path"],
+                condition=models.Q(deleted_at__isnull=False),
+                name="folder_trash_idx",
+            ),
+            # Purging the expired trash (see tasks.purge_trash)
+            models.Index(
+                fields=["deleted_at"],
+                condition=models.Q(deleted_at__isnull=False),
+                name="folder_purge_idx",
+            ),
+        ]
+        constraints = [
+            # Trashed folders do not hold on to their names
+            models.UniqueConstraint(
+                fields=["name", "parent_folder", "owner"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="unique_folder_name",
+            ),
+            # NULL parents are distinct in unique constraints, root folders need their own
+            models.UniqueConstraint(
+                fields=["name", "owner"],
+                condition=models.Q(parent_folder__isnull=True, deleted_at__isnull=True),
+                name="unique_root_folder_name",
+            ),
+        ]
+
+
+def prefetch_nested_paths(folders):
+    """
+    Sets the nested path of every given folder with a single query
+    for the names of all of their ancestors
+    """
+    folders = [folder for folder in folders if folder is not None]
+    ancestor_ids = {pk for folder in folders for pk in folder.ancestor_ids}
+    names = dict(Folder.objects.filter(pk__in=ancestor_ids).values_list("pk", "name"))
+    for folder in folders:
+        ancestor_names = [names.get(pk, "") for pk in folder.ancestor_ids]
+        folder._nested_path = " / ".join([*ancestor_names, folder.name])
+
+
+@receiver(post_delete, sender=Folder)
+def update_totals_on_folder_delete(sender, instance, **kwargs):
+    # Files of the subtree update the totals themselves (see File receivers),
+    # trashed folders were already taken out of the totals
+    if instance.deleted_at is None:
+        Folder.objects.filter(pk__in=instance.ancestor_ids).add_to_totals(subfolders=-1)
+
+
+@receiver(post_save, sender=Folder)
+def index_name_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "name" in update_fields:
+        search.index_items([instance])
+
+
+@receiver(post_delete, sender=Folder)
+def unindex_name_on_delete(sender, instance, **kwargs):
+    search.unindex_items(Folder, [instance.pk])
+
+
+@receiver(post_save, sender=Folder)
+@receiver(post_delete, sender=Folder)
+def invalidate_cache_on_change(sender, instance, **kwargs):
+    # Renames, moves and deletions change the cached listings of the owner
+    invalidate_owner(instance.owner_id)
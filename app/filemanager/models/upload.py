@@ -0,0 +1,63 @@
+from django.db import models
+from django.conf import settings
+from django.dispatch import receiver
+from django.db.models.signals import post_delete
+
+import os
+import uuid
+
+from .base import BaseModel, OwnedQuerySet
+from .folder import Folder
+from .file import File
+
+# Directory (relative to MEDIA_ROOT) holding partially uploaded files
+RESUMABLE_UPLOAD_DIR = "resumable"
+
+
+class UploadSession(BaseModel):
+    """
+    State of a resumable upload, the File row is only created on completion
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_name = models.CharField(max_length=255)
+    length = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    folder = models.ForeignKey(
+        Folder,
+        on_delete=models.CASCADE,
+        related_name="upload_sessions",
+        null=True,
+        blank=True,
+    )
+    owner = models.ForeignKey(
+        "accounts.Profile", on_delete=models.CASCADE, related_name="upload_sessions"
+    )
+    file = models.OneToOneField(
+        File,
+        on_delete=models.SET_NULL,
+        related_name="upload_session",
+        null=True,
+        blank=True,
+    )
+
+    objects = OwnedQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.file_name} ({self.offset}/{self.length})"
+
+    @property
+    def part_path(self):
+        return os.path.join(
+            settings.MEDIA_ROOT, RESUMABLE_UPLOAD_DIR, f"{self.id}.part"
+        )
+
+    @property
+    def is_complete(self):
+        return self.offset == self.length
+
+
+@receiver(post_delete, sender=UploadSession)
+def delete_part_on_model_delete(sender, instance, **kwargs):
+    if os.path.isfile(instance.part_path):
+        os.remove(instance.part_path)
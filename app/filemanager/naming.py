@@ -0,0 +1,82 @@
+from django.db import IntegrityError, transaction
+
+import os
+import re
+
+# Attempts made to save under a free name when concurrent saves take it first
+SAVE_ATTEMPTS = 5
+
+
+def split_name(name, keep_extension):
+    """
+    Splits a name into the part receiving the " (n)" suffix and the extension
+    """
+    if keep_extension:
+        return os.path.splitext(name)
+    return name, ""
+
+
+def suffixed_name(stem, extension, number, max_length):
+    suffix = f" ({number})" if number else ""
+    # Shortening the stem so suffix and extension always fit
+    stem = stem[: max_length - len(suffix) - len(extension)]
+    return f"{stem}{suffix}{extension}"
+
+
+def unique_name(siblings, name, max_length=255, keep_extension=False):
+    """
+    Returns `name`, or the first free "name (n)" among `siblings`, in a single query
+
+    Args:
+        siblings: queryset of the objects sharing the namespace (excluding self)
+        name (str): requested name
+        max_length (int): max length of the name field
+        keep_extension (bool): suffixing before the extension ("photo (1).jpg")
+
+    Returns:
+        str: free name
+    """
+    stem, extension = split_name(name, keep_extension)
+    pattern = re.compile(rf"{re.escape(stem)} \((\d+)\){re.escape(extension)}")
+    taken = siblings.filter(
+        name__startswith=f"{stem} (", name__endswith=f"){extension}"
+    ) | siblings.filter(name=name)
+    numbers = set()
+    for existing in taken.values_list("name", flat=True):
+        if existing == name:
+            numbers.add(0)
+        elif match := pattern.fullmatch(existing):
+            numbers.add(int(match.group(1)))
+    number = 0
+    while number in numbers:
+        number += 1
+    return suffixed_name(stem, extension, number, max_length)
+
+
+def save_with_unique_name(instance, siblings, save, keep_extension=False):
+    """
+    Saves `instance` under a name free among `siblings`
+
+    The name is allocated optimistically, a concurrent save taking the same
+    name makes the unique constraint fail and the allocation is retried.
+
+    Args:
+        instance: model instance with a `name` field
+        siblings: queryset of the objects sharing the namespace
+        save: callable saving the instance
+        keep_extension (bool): suffixing before the extension ("photo (1).jpg")
+    """
+    requested_name = instance.name
+    max_length = instance._meta.get_field("name").max_length
+    if instance.pk is not None:
+        siblings = siblings.exclude(pk=instance.pk)
+    for attempt in range(SAVE_ATTEMPTS):
+        instance.name = unique_name(
+            siblings, requested_name, max_length, keep_extension
+        )
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError:
+            if attempt == SAVE_ATTEMPTS - 1:
+                raise
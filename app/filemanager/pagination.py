@@ -0,0 +1,93 @@
+from django.core.exceptions import BadRequest
+from django.db.models import Q
+
+import json
+import base64
+import binascii
+
+# Folders are listed before files, each ordered by (name, id)
+FOLDERS = "folder"
+FILES = "file"
+
+
+def encode_cursor(kind, name, pk):
+    """
+    Returns an opaque cursor pointing right after the given item
+    """
+    data = json.dumps([kind, name, pk], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (kind, name, id) a cursor points after
+
+    Raises:
+        BadRequest: malformed cursor (answered with 400)
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        kind, name, pk = json.loads(data)
+    except (binascii.Error, ValueError, TypeError):
+        raise BadRequest("Invalid cursor")
+    if kind not in (FOLDERS, FILES) or not isinstance(name, str):
+        raise BadRequest("Invalid cursor")
+    if not isinstance(pk, int):
+        raise BadRequest("Invalid cursor")
+    return kind, name, pk
+
+
+def after(queryset, name, pk):
+    """
+    Returns the items of `queryset` following (name, pk), in (name, id) order
+
+    The comparison is a range on the (name, id) index, so every page costs
+    the same whatever its depth (unlike OFFSET, which scans skipped rows).
+    """
+    # "name >= x" bounds the index range, the OR only filters rows named x
+    return (
+        queryset.filter(name__gte=name)
+        .filter(Q(name__gt=name) | Q(pk__gt=pk))
+        .order_by("name", "pk")
+    )
+
+
+def paginate_listing(folders, files, cursor, page_size):
+    """
+    Returns a page of a folder listing (folders first, then files)
+
+    Args:
+        folders: queryset of the listed folders
+        files: queryset of the listed files
+        cursor (str): cursor returned with the previous page (None for the first)
+        page_size (int): maximum number of items on the page
+
+    Returns:
+        tuple: (folders of the page, files of the page, cursor of the next page or None)
+    """
+    kind, name, pk = decode_cursor(cursor) if cursor else (FOLDERS, "", 0)
+    page_folders = []
+    if kind == FOLDERS:
+        # One extra row tells whether another page follows
+        page_folders = list(after(folders, name, pk)[: page_size + 1])
+        if len(page_folders) > page_size:
+            last = page_folders[page_size - 1]
+            return (
+                page_folders[:page_size],
+                [],
+                encode_cursor(FOLDERS, last.name, last.pk),
+            )
+        name, pk = "", 0
+    remaining = page_size - len(page_folders)
+    page_files = list(after(files, name, pk)[: remaining + 1])
+    if len(page_files) <= remaining:
+        return page_folders, page_files, None
+    if remaining == 0:
+        # The page ends with the last folder, files start on the next one
+        return page_folders, [], encode_cursor(FILES, "", 0)
+    last = page_files[remaining - 1]
+    return (
+        page_folders,
+        page_files[:remaining],
+        encode_cursor(FILES, last.name, last.pk),
+    )
@@ -0,0 +1,227 @@
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+
+import os
+import re
+import subprocess
+from PIL import Image
+from moviepy.config import FFMPEG_BINARY
+
+# Number of bytes read from the head of a file for signature sniffing
+HEADER_SIZE = 4096
+
+# Container signatures as (offset, magic bytes, mime type)
+SIGNATURES = [
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"BM", "image/bmp"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"\x1a\x45\xdf\xa3", "video/x-matroska"),
+    (0, b"\x30\x26\xb2\x75\x8e\x66\xcf\x11", "video/x-ms-wmv"),
+    (0, b"\x00\x00\x01\xba", "video/mpeg"),
+    (0, b"\x00\x00\x01\xb3", "video/mpeg"),
+]
+
+# QuickTime atoms which may open a .mov file instead of "ftyp"
+QUICKTIME_ATOMS = (b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot")
+
+SUPPORTED_MIME_TYPES = [
+    "image/jpeg",
+    "image/png",
+    "image/gif",
+    "image/bmp",
+    "image/tiff",
+    "video/mp4",
+    "video/quicktime",
+    "video/x-msvideo",
+    "video/x-matroska",
+    "video/x-ms-wmv",
+    "video/mpeg",
+]
+
+DURATION_PATTERN = re.compile(rb"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+VIDEO_STREAM_PATTERN = re.compile(
+    rb"Stream #\d+:\d+.*?: Video: .*?\b(\d{2,5})x(\d{2,5})\b"
+)
+
+
+class MediaProbeError(Exception):
+    """Raised when a file is not a readable image or video"""
+
+
+class ImageTooLargeError(MediaProbeError):
+    """Raised when an image has more pixels than allowed (decompression bomb)"""
+
+
+def check_image_pixels(width, height):
+    # A small compressed file may expand to gigabytes of pixels once decoded
+    if width * height > settings.FILEMANAGER_MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(f"Image of {width}x{height} pixels is too large")
+
+
+class MediaInfo:
+    """
+    Metadata collected while validating an upload, reused by the thumbnail step
+    """
+
+    def __init__(self, mime_type, width=None, height=None, duration=None):
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.duration = duration
+
+    @property
+    def kind(self):
+        return self.mime_type.split("/")[0]
+
+    def __repr__(self):
+        return (
+            f"MediaInfo({self.mime_type!r}, width={self.width}, "
+            f"height={self.height}, duration={self.duration})"
+        )
+
+
+def read_header(file, size=HEADER_SIZE):
+    """
+    Returns the first bytes of a file object without moving its position
+    """
+    position = file.tell()
+    file.seek(0)
+    header = file.read(size)
+    file.seek(position)
+    return header
+
+
+def local_path(file):
+    """
+    Returns the path of a file object if its content is already on the local disk
+    """
+    if hasattr(file, "temporary_file_path"):
+        return file.temporary_file_path()
+    name = getattr(file, "name", None)
+    if name and os.path.isabs(name) and os.path.isfile(name):
+        return name
+    return None
+
+
+def sniff_mime_type(header):
+    """
+    Detects the mime type of a supported container from its leading bytes
+
+    Args:
+        header (bytes): first bytes of the file (see HEADER_SIZE)
+
+    Returns:
+        str or None: detected mime type, None if the signature is unknown
+    """
+    for offset, magic, mime_type in SIGNATURES:
+        end = offset + len(magic)
+        if header[offset:end] == magic:
+            return mime_type
+    if header[:4] == b"RIFF" and header[8:12] == b"AVI ":
+        return "video/x-msvideo"
+    if header[4:8] == b"ftyp":
+        # ISO base media files share the "ftyp" box, the brand tells them apart
+        return "video/quicktime" if header[8:12] == b"qt  " else "video/mp4"
+    if header[4:8] in QUICKTIME_ATOMS:
+        return "video/quicktime"
+    return None
+
+
+def detect_mime_type(file):
+    """
+    Returns the mime type sniffed while streaming the upload, or sniffs the header
+    """
+    upload = file.file if isinstance(file, FieldFile) else file
+    detected = getattr(upload, "detected_mime_type", None)
+    if detected is not None:
+        return detected
+    return sniff_mime_type(read_header(upload))
+
+
+def probe_image(file, mime_type):
+    """
+    Reads image dimensions from the header only, pixel data is never decoded
+    (so oversized images are rejected before anything is allocated)
+    """
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            width, height = image.size
+    except Exception as error:
+        raise MediaProbeError(f"Not a valid image: {error}")
+    finally:
+        file.seek(0)
+    check_image_pixels(width, height)
+    return MediaInfo(mime_type, width=width, height=height)
+
+
+def probe_video(file, mime_type, timeout=None):
+    """
+    Reads video metadata with a single time-bounded ffmpeg invocation
+    (ffmpeg only parses the container headers since no output is requested)
+    """
+    timeout = timeout or settings.FILEMANAGER_PROBE_TIMEOUT
+    source = local_path(file)
+    if source:
+        stdin = {"stdin": subprocess.DEVNULL}
+    else:
+        # In-memory uploads are small enough to be piped to ffmpeg
+        source = "pipe:0"
+        file.seek(0)
+        stdin = {"input": file.read()}
+        file.seek(0)
+    try:
+        result = subprocess.run(
+            [FFMPEG_BINARY, "-hide_banner", "-i", source],
+            capture_output=True,
+            check=False,
+            timeout=timeout,
+            **stdin,
+        )
+    except subprocess.TimeoutExpired:
+        raise MediaProbeError("Video probe timed out")
+    except OSError as error:
+        raise MediaProbeError(f"Video probe could not run: {error}")
+
+    stream = VIDEO_STREAM_PATTERN.search(result.stderr)
+    if stream is None:
+        raise MediaProbeError("No video stream found")
+    duration = None
+    match = DURATION_PATTERN.search(result.stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return MediaInfo(
+        mime_type,
+        width=int(stream.group(1)),
+        height=int(stream.group(2)),
+        duration=duration,
+    )
+
+
+def probe_media(file, mime_type=None):
+    """
+    Inspects an image or video file as cheaply as possible
+
+    Args:
+        file: file object (uploaded file or FieldFile)
+        mime_type (str): already sniffed mime type, sniffed from the header if None
+
+    Returns:
+        MediaInfo: detected metadata of the file
+
+    Raises:
+        MediaProbeError: If the file is not a supported image or video.
+    """
+    upload = file.file if isinstance(file, FieldFile) else file
+    if mime_type is None:
+        mime_type = detect_mime_type(upload)
+    if mime_type not in SUPPORTED_MIME_TYPES:
+        raise MediaProbeError("Unsupported file type")
+    if mime_type.startswith("image"):
+        return probe_image(upload, mime_type)
+    return probe_video(upload, mime_type)
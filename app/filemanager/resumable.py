@@ -0,0 +1,136 @@
+from django.core.files import File as DjangoFile
+from django.http import UnreadablePostError
+from django.utils import timezone
+
+import os
+import fcntl
+import base64
+import binascii
+import hashlib
+
+from .models import File, UploadSession, validate_file_size, validate_file_type
+
+# Version of the tus protocol implemented by the resumable upload views
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,termination"
+
+# Content type of PATCH requests carrying upload chunks
+CHUNK_CONTENT_TYPE = "application/offset+octet-stream"
+
+# Bytes read from the request stream at once
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadConflict(Exception):
+    """Raised when another request appends to the same upload session"""
+
+
+class AssembledUpload(DjangoFile):
+    """
+    Completed resumable upload, exposing its path lets the storage move the
+    file in place instead of copying it
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def parse_upload_metadata(header):
+    """
+    Parses a tus "Upload-Metadata" header ("key base64value,key base64value")
+
+    Returns:
+        dict: decoded metadata values
+    """
+    metadata = {}
+    for pair in header.split(","):
+        key, _, value = pair.strip().partition(" ")
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            raise ValueError(f"Invalid metadata value for {key}")
+    return metadata
+
+
+def append_chunks(session, stream):
+    """
+    Appends the request body to the partial file of an upload session and
+    advances its offset
+
+    Bytes received before a dropped connection are kept, so the client can
+    resume from the new offset. No database lock is held while the body is
+    streamed: the part is locked instead, and the offset is only moved from
+    the value it had when the request read it (compare-and-set).
+
+    Returns:
+        int: number of bytes written
+
+    Raises:
+        UploadConflict: If another request is appending to the session, or
+            moved its offset since it was read.
+    """
+    with open(session.part_path, "r+b") as part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadConflict
+        # A request that read the offset before the last append must not
+        # truncate what it wrote
+        current = UploadSession.objects.filter(pk=session.pk, offset=session.offset)
+        if not current.exists():
+            raise UploadConflict
+        remaining = session.length - session.offset
+        written = 0
+        # Dropping any bytes written after the last acknowledged offset
+        part.truncate(session.offset)
+        part.seek(session.offset)
+        while written < remaining:
+            try:
+                chunk = stream.read(min(CHUNK_SIZE, remaining - written))
+            except (UnreadablePostError, OSError):
+                break
+            if not chunk:
+                break
+            part.write(chunk)
+            written += len(chunk)
+        part.flush()
+        # Still holding the part, no other request can write it meanwhile
+        advanced = current.update(
+            offset=session.offset + written, updated_at=timezone.now()
+        )
+    if not advanced:
+        raise UploadConflict
+    session.offset += written
+    return written
+
+
+def assemble_file(session):
+    """
+    Validates a completed upload session and moves its content into a new File
+    (run with the session locked, see views.ResumableUploadView)
+
+    Raises:
+        ValidationError: If the uploaded content is not a valid file.
+    """
+    with open(session.part_path, "rb") as part:
+        content = AssembledUpload(part, name=session.file_name)
+        content.sha256 = hashlib.file_digest(part, "sha256").hexdigest()
+        validate_file_size(content)
+        validate_file_type(content)
+        file = File(file=content, folder=session.folder, owner=session.owner)
+        file.save()
+    # Known content is not moved into storage, its part is not needed anymore
+    if os.path.exists(session.part_path):
+        os.remove(session.part_path)
+    return file
+
+
+def tus_headers(response, session=None):
+    response["Tus-Resumable"] = TUS_VERSION
+    response["Cache-Control"] = "no-store"
+    if session is not None:
+        response["Upload-Offset"] = session.offset
+        response["Upload-Length"] = session.length
+    return response
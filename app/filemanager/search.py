@@ -0,0 +1,231 @@
+from django.db import connection
+
+# FTS5 table of the file and folder names on SQLite (trigram tokenizer)
+SEARCH_TABLE = "filemanager_search"
+
+# Both models share the table, the kind of an item is the parity of its rowid
+KINDS = {"file": 0, "folder": 1}
+
+# Queries shorter than a trigram can not use the index, names are scanned instead
+TRIGRAM_LENGTH = 3
+
+# Share of the query trigrams a name must contain to match despite typos
+FUZZY_THRESHOLD = 0.3
+
+# Matches read from the index, at most, before being ranked
+CANDIDATE_LIMIT = 1000
+
+# Ranks of the exact, prefix and substring matches (typos rank below 1)
+EXACT, PREFIX, SUBSTRING = 4, 3, 2
+
+
+def create_search_index():
+    """
+    Creates the name index: an FTS5 trigram table on SQLite, GIN trigram
+    indexes on PostgreSQL (other databases fall back to scanning the names)
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+                "USING fts5(name, owner, tokenize='trigram')"
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for table in ("filemanager_file", "filemanager_folder"):
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_name_trgm_idx "
+                    f"ON {table} USING gin (name gin_trgm_ops)"
+                )
+
+
+def drop_search_index():
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+        elif connection.vendor == "postgresql":
+            for table in ("filemanager_file", "filemanager_folder"):
+                cursor.execute(f"DROP INDEX IF EXISTS {table}_name_trgm_idx")
+
+
+def rebuild_search_index(folder_model, file_model):
+    """
+    Indexes the names of every folder and file again, from scratch
+
+    Models are given as arguments so migrations can pass their historical ones.
+
+    Returns:
+        int: Number of indexed names (0 where the database indexes them itself)
+    """
+    if connection.vendor != "sqlite":
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        for model in (folder_model, file_model):
+            kind = KINDS[model._meta.model_name]
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, name, owner) "
+                f"SELECT id * 2 + {kind}, ' ' || name, '#' || owner_id || '#' "
+                f"FROM {model._meta.db_table}"
+            )
+        cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def search_rowid(model, pk):
+    return pk * 2 + KINDS[model._meta.model_name]
+
+
+def index_items(items):
+    """
+    Adds (or updates) the names of saved files or folders to the index
+    """
+    if connection.vendor != "sqlite" or not items:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, name, owner) "
+            "VALUES (%s, %s, %s)",
+            [
+                (
+                    search_rowid(type(item), item.pk),
+                    f" {item.name}",
+                    f"#{item.owner_id}#",
+                )
+                for item in items
+            ],
+        )
+
+
+def unindex_items(model, ids):
+    """
+    Removes the names of deleted files or folders from the index
+    """
+    if connection.vendor != "sqlite" or not ids:
+        return
+    with connection.cursor() as cursor:
+        rowids = [search_rowid(model, pk) for pk in ids]
+        placeholders = ", ".join(["%s"] * len(rowids))
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", rowids
+        )
+
+
+def trigrams(text):
+    # Words are padded like in the index, " ph" only matches names starting with "ph"
+    text = f" {text.casefold()}"
+    return {"".join(trigram) for trigram in zip(text, text[1:], text[2:])}
+
+
+def rank(query, name):
+    """
+    Returns how well `name` matches `query` (0 when it does not match at all)
+    """
+    query, name = query.casefold(), name.casefold()
+    if name == query:
+        return EXACT
+    if name.startswith(query):
+        return PREFIX
+    if query in name:
+        return SUBSTRING
+    # Typos: share of the query trigrams found in the name
+    query_trigrams = trigrams(query)
+    similarity = len(query_trigrams & trigrams(name)) / len(query_trigrams)
+    return similarity if similarity >= FUZZY_THRESHOLD else 0
+
+
+def quote(text):
+    # FTS5 strings are double quoted, with inner quotes doubled
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fragments(query):
+    """
+    Returns the two halves of `query`, a name with a single typo still contains
+    one of them (padded like the index, the first half only matches word starts)
+    """
+    padded = f" {query}"
+    half = max(TRIGRAM_LENGTH, len(padded) // 2)
+    return sorted({padded[:half], padded[-half:]})
+
+
+def fts_matches(model, owner_id, query):
+    """
+    Returns (id, name) of the names containing `query`, or one of its halves,
+    from the FTS5 table (ownership is one more indexed column)
+
+    Both are phrases of consecutive trigrams, which the index answers in a few
+    milliseconds even for millions of names, where matching any trigram of the
+    query would read most of the table.
+    """
+    owner = f"owner : {quote(f'#{owner_id}#')}"
+    similar = " OR ".join(quote(fragment) for fragment in fragments(query))
+    select = (
+        f"SELECT rowid, name FROM {SEARCH_TABLE} "
+        f"WHERE {SEARCH_TABLE} MATCH %s AND rowid %% 2 = %s LIMIT %s"
+    )
+    kind = KINDS[model._meta.model_name]
+    with connection.cursor() as cursor:
+        # Substrings are read on their own, typos can not crowd them out
+        cursor.execute(
+            f"SELECT * FROM ({select}) UNION SELECT * FROM ({select})",
+            [
+                *(f"{owner} AND name : {quote(query)}", kind, CANDIDATE_LIMIT),
+                *(f"{owner} AND name : ({similar})", kind, CANDIDATE_LIMIT),
+            ],
+        )
+        return [(rowid // 2, name[1:]) for rowid, name in cursor.fetchall()]
+
+
+def trigram_matches(model, owner_id, query):
+    """
+    Returns (id, name) of the names containing `query`, or similar to one of
+    its words, from the GIN trigram index of PostgreSQL
+    """
+    pattern = "%" + query.replace("\\", "\\\\").replace("%", r"\%").replace("_", r"\_")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id, name FROM {model._meta.db_table} "
+            "WHERE owner_id = %s AND (name ILIKE %s OR %s <%% name) "
+            "ORDER BY word_similarity(%s, name) DESC LIMIT %s",
+            [owner_id, pattern + "%", query, query, CANDIDATE_LIMIT],
+        )
+        return cursor.fetchall()
+
+
+def search(queryset, owner_id, query, limit):
+    """
+    Returns the items of `queryset` best matching `query`, best match first
+
+    Names are matched case-insensitively on prefixes, substrings and, for
+    queries of a trigram or more, despite typos. The index only gives the
+    candidates, which are ranked here (see rank) and loaded from `queryset`,
+    so items filtered out of it (e.g. trashed ones) are never returned.
+
+    Args:
+        queryset: files or folders of the owner to search
+        owner_id (int): profile owning the items
+        query (str): searched text
+        limit (int): maximum number of returned items
+
+    Returns:
+        list: matching items of `queryset`
+    """
+    query = query.strip()
+    if not query:
+        return []
+    if len(query) < TRIGRAM_LENGTH or connection.vendor not in ("sqlite", "postgresql"):
+        candidates = queryset.model.objects.filter(
+            owner_id=owner_id, name__icontains=query
+        ).values_list("pk", "name")[:CANDIDATE_LIMIT]
+    elif connection.vendor == "sqlite":
+        candidates = fts_matches(queryset.model, owner_id, query)
+    else:
+        candidates = trigram_matches(queryset.model, owner_id, query)
+    ranked = sorted(
+        ((rank(query, name), name.casefold(), pk) for pk, name in candidates),
+        key=lambda match: (-match[0], match[1], match[2]),
+    )
+    ids = [pk for score, name, pk in ranked if score][:limit]
+    items = queryset.in_bulk(ids)
+    return [items[pk] for pk in ids if pk in items]
@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.files.storage import FileSystemStorage
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+import hmac
+import time
+import base64
+import hashlib
+from urllib.parse import unquote, urlencode, urlsplit
+
+# Query parameters of a signed media URL
+EXPIRES_PARAM = "expires"
+SIGNATURE_PARAM = "signature"
+
+
+def signing_key():
+    """
+    Returns the key of the media URL signatures, FILEMANAGER_MEDIA_SIGNING_KEY
+    when a proxy or CDN checks them too, derived from SECRET_KEY otherwise
+    """
+    key = settings.FILEMANAGER_MEDIA_SIGNING_KEY
+    if key:
+        return key.encode()
+    return salted_hmac("filemanager.signing", "media", algorithm="sha256").digest()
+
+
+def bucket(now=None):
+    """
+    Returns the time bucket URLs signed at `now` (default: now) belong to
+    """
+    now = time.time() if now is None else now
+    return int(now) // settings.FILEMANAGER_MEDIA_URL_BUCKET
+
+
+def expiry(now=None):
+    # Every URL signed within a bucket expires at once, so it stays the same URL
+    length = settings.FILEMANAGER_MEDIA_URL_BUCKET
+    return (bucket(now) + 1) * length + settings.FILEMANAGER_MEDIA_URL_TTL
+
+
+def signature(path, expires):
+    """
+    Returns the signature of a URL path until `expires` (Unix time): the
+    unpadded urlsafe base64 HMAC-SHA256 of "<path>\\n<expires>"
+    """
+    message = f"{path}\n{expires}".encode()
+    digest = hmac.new(signing_key(), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def sign_url(url, now=None):
+    """
+    Returns `url` with an expiry and the signature of its (decoded) path, the
+    URL only grants access to that path until then
+    """
+    expires = expiry(now)
+    path = unquote(urlsplit(url).path)
+    query = {EXPIRES_PARAM: expires, SIGNATURE_PARAM: signature(path, expires)}
+    return f"{url}?{urlencode(query)}"
+
+
+def check_signature(request):
+    """
+    Raises PermissionDenied unless the request URL was signed and has not
+    expired, no session or database is needed
+
+    Returns:
+        int: Seconds the URL stays valid
+    """
+    try:
+        expires = int(request.GET[EXPIRES_PARAM])
+        given = request.GET[SIGNATURE_PARAM]
+    except (KeyError, ValueError):
+        raise PermissionDenied
+    remaining = expires - int(time.time())
+    if remaining <= 0 or not constant_time_compare(
+        given, signature(request.path, expires)
+    ):
+        raise PermissionDenied
+    return remaining
+
+
+class SignedFileSystemStorage(FileSystemStorage):
+    """
+    File system storage handing out signed, expiring URLs (see sign_url)
+    """
+
+    def url(self, name):
+        return sign_url(super().url(name))
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.utils import timezone
+from celery import shared_task
+
+import logging
+from datetime import timedelta
+
+from . import trash
+from .models import File, Folder, UploadSession
+from .models.file import PROCESSED_FIELDS
+
+# logger object
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_thumbnail(file_id):
+    """
+    Generates the thumbnail of an uploaded file outside of the upload request
+    """
+    file = File.objects.filter(pk=file_id).first()
+    if file is None:
+        logger.warning(f"Skipping thumbnail generation, file {file_id} does not exist")
+        return
+    # Another file with the same content may have been processed meanwhile
+    if file.reuse_processed_content():
+        file.save(update_fields=PROCESSED_FIELDS)
+    else:
+        file.create_thumbnail()
+    return file.processing_status
+
+
+@shared_task
+def purge_stale_upload_sessions():
+    """
+    Removes resumable upload sessions (and their partial files) past their TTL
+    """
+    expiry = timezone.now() - timedelta(
+        hours=settings.FILEMANAGER_UPLOAD_SESSION_TTL_HOURS
+    )
+    stale_sessions = UploadSession.objects.filter(updated_at__lt=expiry)
+    count = 0
+    # Deleting one by one so the partial files are removed by post_delete
+    for session in stale_sessions.iterator():
+        session.delete()
+        count += 1
+    return count
+
+
+@shared_task
+def purge_trash():
+    """
+    Deletes the files and folders which stayed in the trash past the retention
+    """
+    expiry = timezone.now() - timedelta(days=settings.FILEMANAGER_TRASH_RETENTION_DAYS)
+    batch_size = settings.FILEMANAGER_PURGE_BATCH_SIZE
+    files = trash.purge_files(File.objects.filter(deleted_at__lt=expiry), batch_size)
+    folders = 0
+    # Shallowest first, a trashed folder below another one goes with its ancestor
+    expired_folders = Folder.objects.filter(deleted_at__lt=expiry).order_by("depth")
+    while folder := expired_folders.first():
+        purged_folders, purged_files = trash.purge_folder(folder, batch_size)
+        folders += purged_folders
+        files += purged_files
+    logger.info(f"Purged {files} files and {folders} folders from the trash")
+    return {"files": files, "folders": folders}
@@ -0,0 +1,105 @@
+from django.test import Client
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import pytest
+import shutil
+import subprocess
+from moviepy.config import FFMPEG_BINARY
+
+from accounts.models import Profile
+from filemanager.models import File, Folder
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    # Stored files of a test live in its own directory, never in the real media
+    settings.MEDIA_ROOT = tmp_path / "media"
+    settings.MEDIA_ROOT.mkdir()
+    # Copying test image to the media folder for tests
+    shutil.copy("statics/img/test.jpg", settings.MEDIA_ROOT / "test.jpg")
+    return settings.MEDIA_ROOT
+
+
+@pytest.fixture(autouse=True)
+def cache(settings):
+    # Cached listings live in process memory during tests, no Redis needed
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    from django.core.cache import cache
+
+    cache.clear()
+    return cache
+
+
+@pytest.fixture
+def user():
+    return get_user_model().objects.create_user(
+        email="user@test.com", password="testPassword", is_verified=True
+    )
+
+
+@pytest.fixture
+def profile(user):
+    # getting the profile from the tuple (don't need created_status boolean)
+    return Profile.objects.get_or_create(user=user)[0]
+
+
+@pytest.fixture
+def client(user):
+    client = Client()
+    client.force_login(user=user)
+    return client
+
+
+@pytest.fixture
+def folder(profile):
+    return Folder.objects.create(name="Test Folder", owner=profile)
+
+
+@pytest.fixture
+def file(profile, folder):
+    return File.objects.create(
+        name="Test File", owner=profile, folder=folder, file="./test.jpg"
+    )
+
+
+@pytest.fixture
+def tree(profile):
+    root = Folder.objects.create(name="root", owner=profile)
+    middle = Folder.objects.create(name="middle", owner=profile, parent_folder=root)
+    leaf = Folder.objects.create(name="leaf", owner=profile, parent_folder=middle)
+    return root, middle, leaf
+
+
+@pytest.fixture
+def upload(profile):
+    def _upload(folder, name="upload.jpg", content=None):
+        # The test image unless other content is given, stored in media_root
+        if content is None:
+            with open("statics/img/test.jpg", "rb") as fp:
+                content = fp.read()
+        return File.objects.create(
+            owner=profile, folder=folder, file=SimpleUploadedFile(name, content)
+        )
+
+    return _upload
+
+
+def totals(folder):
+    folder.refresh_from_db()
+    return folder.total_size, folder.file_count, folder.subfolder_count
+
+
+@pytest.fixture
+def make_video(tmp_path):
+    def _make_video(name="clip.mp4", duration=1, size="160x120"):
+        # Rendering a synthetic test pattern clip with ffmpeg
+        path = tmp_path / name
+        source = f"testsrc=duration={duration}:size={size}:rate=10"
+        command = [FFMPEG_BINARY, "-loglevel", "error", "-f", "lavfi", "-i", source]
+        subprocess.run(command + ["-pix_fmt", "yuv420p", str(path)], check=True)
+        return path
+
+    return _make_video
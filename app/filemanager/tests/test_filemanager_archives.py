@@ -0,0 +1,85 @@
+from django.urls import reverse
+
+import io
+import pytest
+import zipfile
+
+from filemanager.archives import stream_zip
+from filemanager.models import Folder
+
+
+@pytest.fixture
+def photo():
+    with open("statics/img/test.jpg", "rb") as fp:
+        return fp.read()
+
+
+@pytest.fixture
+def bitmap():
+    # A valid BMP header followed by highly compressible pixels
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "white").save(buffer, "BMP")
+    return buffer.getvalue()
+
+
+@pytest.mark.django_db
+def test_download_folder_as_zip(client, tree, upload, photo, bitmap):
+    root, middle, _ = tree
+    trashed = Folder.objects.create(
+        name="trashed", owner=root.owner, parent_folder=root
+    )
+    upload(root, "photo.jpg", photo)
+    upload(middle, "bitmap.bmp", bitmap)
+    upload(trashed, "gone.jpg", photo + b"gone")
+    Folder.objects.get(pk=trashed.pk).trash()
+
+    url = reverse("filemanager:download-folder", kwargs={"pk": root.pk})
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/zip"
+    assert response["Content-Disposition"] == 'attachment; filename="root.zip"'
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+    assert archive.testzip() is None
+    assert archive.namelist() == [
+        "root/",
+        "root/middle/",
+        "root/middle/leaf/",
+        "root/photo.jpg",
+        "root/middle/bitmap.bmp",
+    ]
+    assert archive.read("root/photo.jpg") == photo
+    assert archive.read("root/middle/bitmap.bmp") == bitmap
+    # Already compressed media is stored, raw bitmaps are deflated
+    assert archive.getinfo("root/photo.jpg").compress_type == zipfile.ZIP_STORED
+    info = archive.getinfo("root/middle/bitmap.bmp")
+    assert info.compress_type == zipfile.ZIP_DEFLATED
+
+
+@pytest.mark.django_db
+def test_zip_is_streamed_in_bounded_chunks(tree, upload, photo):
+    root, middle, _ = tree
+    for index in range(3):
+        upload(middle, f"{index}.jpg", photo + bytes([index]))
+    chunks = list(stream_zip(root, chunk_size=1024))
+    # No chunk holds a whole file (headers aside)
+    assert len(chunks) > 3 * len(photo) // 1024
+    assert max(len(chunk) for chunk in chunks) < 1024 + 512
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.read("root/middle/2.jpg") == photo + b"\x02"
+
+
+@pytest.mark.django_db
+def test_download_folder_of_another_owner(client, user):
+    from accounts.models import Profile
+
+    other = Profile.objects.create(
+        user=type(user).objects.create_user(
+            email="other@test.com", password="testPassword"
+        )
+    )
+    folder = Folder.objects.create(name="private", owner=other)
+    url = reverse("filemanager:download-folder", kwargs={"pk": folder.pk})
+    assert client.get(url).status_code == 404
@@ -0,0 +1,114 @@
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import os
+import pytest
+
+from accounts.models import Profile
+from filemanager import caching
+from filemanager.models import Blob, File
+from filemanager.tasks import generate_thumbnail
+
+
+@pytest.fixture
+def image_content():
+    with open("statics/img/test.jpg", "rb") as fp:
+        return fp.read()
+
+
+@pytest.fixture
+def upload(profile, folder, image_content, media_root):
+    # Releasing the last reference deletes the blob file, which must be the
+    # test's own copy of the content (see media_root)
+    def _upload(name):
+        content = SimpleUploadedFile(name, image_content)
+        return File.objects.create(owner=profile, folder=folder, file=content)
+
+    return _upload
+
+
+@pytest.mark.django_db
+def test_identical_uploads_share_one_blob(upload):
+    first = upload("first.jpg")
+    second = upload("second.jpg")
+    blob = Blob.objects.get()
+    assert first.blob == second.blob == blob
+    assert blob.ref_count == 2
+    assert first.file.name == second.file.name == blob.file.name
+    assert (first.name, second.name) == ("first.jpg", "second.jpg")
+    first.delete()
+    second.delete()
+
+
+@pytest.mark.django_db
+def test_known_content_reuses_thumbnail(
+    upload, django_capture_on_commit_callbacks, monkeypatch
+):
+    first = upload("first.jpg")
+    generate_thumbnail(first.id)
+    first.refresh_from_db()
+    scheduled = []
+    monkeypatch.setattr(generate_thumbnail, "delay", scheduled.append)
+    with django_capture_on_commit_callbacks(execute=True):
+        second = upload("second.jpg")
+    # no thumbnail task is scheduled for already processed content
+    assert scheduled == []
+    assert second.is_processed
+    assert second.thumbnail.name == first.thumbnail.name
+    first.delete()
+    second.delete()
+
+
+@pytest.mark.django_db
+def test_blob_is_reclaimed_with_last_reference(upload, media_root):
+    first = upload("first.jpg")
+    second = upload("second.jpg")
+    generate_thumbnail(first.id)
+    first.refresh_from_db()
+    blob_path, thumbnail_path = first.file.path, first.thumbnail.path
+    assert blob_path.startswith(f"{media_root}{os.sep}")
+    # the thumbnail is shared with the pending twin
+    second.refresh_from_db()
+    assert second.thumbnail.name == first.thumbnail.name
+
+    first.delete()
+    assert Blob.objects.get().ref_count == 1
+    assert os.path.isfile(blob_path)
+    assert os.path.isfile(thumbnail_path)
+
+    second.delete()
+    assert not Blob.objects.exists()
+    assert not os.path.isfile(blob_path)
+    assert not os.path.isfile(thumbnail_path)
+
+
+@pytest.mark.django_db
+def test_shared_thumbnail_invalidates_twins_owners(user, upload, image_content):
+    other = type(user).objects.create_user(email="o@test.com", password="testPassword")
+    twin = File.objects.create(
+        owner=Profile.objects.get(user=other),
+        file=SimpleUploadedFile("twin.jpg", image_content),
+    )
+    first = upload("first.jpg")
+    before = caching.generation(other.id)
+    generate_thumbnail(first.id)
+    twin.refresh_from_db()
+    assert twin.is_processed
+    # Their cached listings no longer show the twin as pending
+    assert caching.generation(other.id) > before
+    first.delete()
+    twin.delete()
+
+
+@pytest.mark.django_db
+def test_upload_view_deduplicates(client, folder, upload, image_content):
+    existing = upload("existing.jpg")
+    url = reverse("filemanager:upload-file")
+    file_data = SimpleUploadedFile("again.jpg", image_content)
+    response = client.post(url, {"file": file_data, "folder": folder.id})
+    assert response.status_code == 302
+    again = File.objects.get(name="again.jpg")
+    assert again.blob_id == existing.blob_id
+    assert Blob.objects.get().ref_count == 2
+    again.delete()
+    existing.delete()
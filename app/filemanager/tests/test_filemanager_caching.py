@@ -0,0 +1,317 @@
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import time
+import json
+import queue
+import pytest
+from django_redis.cache import RedisCache
+
+from accounts.models import Profile
+from core import cache as core_cache
+from core.cache import ENTRY_OVERHEAD, LocalTier
+from filemanager import caching
+from filemanager.models import Folder
+
+
+def listed_names(client, url, data=None):
+    response = client.get(url, data or {})
+    assert response.status_code == 200
+    return [folder.name for folder in response.context["folders"]]
+
+
+@pytest.mark.django_db
+def test_listing_is_cached_until_a_change(client, user, folder):
+    url = reverse("filemanager:home")
+    assert listed_names(client, url) == ["Test Folder"]
+    with CaptureQueriesContext(connection) as queries:
+        assert listed_names(client, url) == ["Test Folder"]
+    # Only the session and the user are loaded on a hit
+    assert len(queries) == 2
+    assert caching.cache_stats()["listing"] == {"hits": 1, "misses": 1}
+
+    folder.name = "Renamed"
+    folder.save()
+    assert listed_names(client, url) == ["Renamed"]
+    content_url = reverse("filemanager:folder-content", args=[folder.slug])
+    Folder.objects.create(name="Child", owner=folder.owner, parent_folder=folder)
+    assert listed_names(client, content_url) == ["Child"]
+    Folder.objects.get(name="Child").trash()
+    assert listed_names(client, content_url) == []
+    assert caching.cache_stats()["listing"] == {"hits": 1, "misses": 4}
+
+
+@pytest.mark.django_db
+def test_search_is_cached_until_a_change(client, profile, folder):
+    url = reverse("filemanager:search")
+    assert listed_names(client, url, {"search": "test"}) == ["Test Folder"]
+    assert listed_names(client, url, {"search": "test"}) == ["Test Folder"]
+    Folder.objects.create(name="test 2", owner=profile)
+    assert listed_names(client, url, {"search": "test"}) == ["test 2", "Test Folder"]
+    assert caching.cache_stats()["search"] == {"hits": 1, "misses": 2}
+
+
+@pytest.mark.django_db
+def test_generations_are_per_user(user, profile):
+    other = type(user).objects.create_user(email="o@test.com", password="testPassword")
+    other_profile = Profile.objects.get(user=other)
+    before = caching.generation(user.id), caching.generation(other.id)
+    Folder.objects.create(name="mine", owner=profile)
+    assert caching.generation(user.id) > before[0]
+    assert caching.generation(other.id) == before[1]
+    Folder.objects.create(name="theirs", owner=other_profile)
+    assert caching.generation(other.id) > before[1]
+
+
+@pytest.mark.django_db
+def test_evicted_generation_is_never_reused(user, cache):
+    first = caching.generation(user.id)
+    caching.bump_generation(user.id)
+    cache.delete(caching.generation_key(user.id))
+    assert caching.generation(user.id) > first + 1
+
+
+@pytest.mark.django_db
+def test_cache_stats_view(client, user, folder):
+    url = reverse("filemanager:cache-stats")
+    assert client.get(url).status_code == 403
+    user.is_staff = True
+    user.save()
+    client.get(reverse("filemanager:home"))
+    assert client.get(url).json()["listing"] == {"hits": 0, "misses": 1}
+
+
+def test_local_tier_evicts_least_recently_used():
+    tier = LocalTier(max_bytes=3 * (ENTRY_OVERHEAD + 2), timeout=60)
+    for key in ("a", "b", "c"):
+        tier.put(key, b"1", 60, tier.sequence)
+    assert tier.get("a") == b"1"
+    tier.put("d", b"1", 60, tier.sequence)
+    assert [tier.get(key) for key in "abcd"] == [b"1", None, b"1", b"1"]
+    assert tier.stats()["bytes"] <= tier.max_bytes
+
+
+def test_local_tier_expiry_and_invalidation(monkeypatch):
+    tier = LocalTier(max_bytes=1024 * 1024, timeout=10)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    tier.put("short", b"1", 1, tier.sequence)
+    tier.put("long", b"1", 3600, tier.sequence)
+    now += 5
+    # Redis expiry first, the tier timeout caps longer ones
+    assert tier.get("short") is None
+    assert tier.get("long") == b"1"
+    now += 10
+    assert tier.get("long") is None
+
+    # A value fetched before an invalidation is not kept
+    sequence = tier.sequence
+    tier.invalidate(["key"])
+    tier.put("key", b"stale", 60, sequence)
+    assert tier.get("key") is None
+
+
+def test_local_tier_receives_other_processes_invalidations():
+    tier = LocalTier(max_bytes=1024 * 1024, timeout=60)
+    for key in ("a", "b"):
+        tier.put(key, b"1", 60, tier.sequence)
+    tier.receive(json.dumps({"origin": tier.origin, "keys": ["a"]}))
+    assert tier.get("a") == b"1"
+    tier.receive(json.dumps({"origin": "other", "keys": ["a"]}))
+    assert tier.get("a") is None
+    tier.receive(json.dumps({"origin": "other", "clear": True}))
+    assert tier.get("b") is None
+    assert tier.stats()["local"] == {"hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the Redis commands and pub/sub TwoTierClient uses,
+    shared by the clients of several processes
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.channels = {}
+
+    def get(self, key):
+        return self.values.get(str(key))
+
+    def set(self, key, value, nx=False, px=None, xx=False):
+        # Stored as bytes, like Redis does with the integers django_redis sends
+        if isinstance(value, int):
+            value = str(value).encode()
+        self.values[str(key)] = value
+        return True
+
+    def delete(self, *keys):
+        return sum(self.values.pop(str(key), None) is not None for key in keys)
+
+    def flushdb(self):
+        self.values.clear()
+
+    def pttl(self, key):
+        return -1 if str(key) in self.values else -2
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def publish(self, channel, message):
+        for messages in self.channels.get(channel, []):
+            messages.put(message.encode())
+        return len(self.channels.get(channel, []))
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args):
+            self.commands.append((getattr(self.redis, name), args))
+            return self
+
+        return command
+
+    def execute(self):
+        return [method(*args) for method, args in self.commands]
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.messages = queue.Queue()
+        self.channel = None
+
+    def subscribe(self, channel):
+        self.channel = channel
+        self.redis.channels.setdefault(channel, []).append(self.messages)
+
+    def listen(self):
+        yield {"type": "subscribe", "channel": self.channel, "data": 1}
+        while True:
+            yield {"type": "message", "data": self.messages.get()}
+
+    def close(self):
+        self.redis.channels[self.channel].remove(self.messages)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    # Every test starts with tiers (and listeners) of its own
+    monkeypatch.setattr(core_cache, "tiers", {})
+    return FakeRedis()
+
+
+def two_tier_client(redis, location):
+    """
+    Returns the TwoTierClient of a cache backend talking to `redis`, a
+    different `location` standing for another process
+    """
+    backend = RedisCache(
+        location,
+        {"OPTIONS": {"CLIENT_CLASS": "core.cache.TwoTierClient"}},
+    )
+    client = backend.client
+    client._clients = [redis]
+    wait_for(lambda: client.tier.listening)
+    return client
+
+
+def test_two_tier_client_reads_through_the_local_tier(redis):
+    client = two_tier_client(redis, "redis://first:6379/0")
+    client.set("key", {"value": 1})
+    assert client.get("key") == {"value": 1}
+    # Served locally from then on, as a fresh copy every time
+    redis.values.clear()
+    value = client.get("key")
+    assert value == {"value": 1}
+    value["value"] = 2
+    assert client.get("key") == {"value": 1}
+    stats = client.tier_stats()
+    assert stats["entries"] == 1
+    assert stats["redis"]["hits"] == 1
+    assert stats["local"]["hits"] == 2
+
+    client.set("key", {"value": 3})
+    assert client.get("key") == {"value": 3}
+    client.delete("key")
+    assert client.get("key") is None
+    assert client.get("key", "default") == "default"
+
+
+def test_two_tier_client_writes_evict_other_processes_copies(redis):
+    first = two_tier_client(redis, "redis://first:6379/0")
+    second = two_tier_client(redis, "redis://second:6379/0")
+    assert first.tier is not second.tier
+    first.set("key", 1)
+    assert second.get("key") == 1
+    key = str(second.make_key("key"))
+    assert key in second.tier.entries
+
+    first.set("key", 2)
+    wait_for(lambda: key not in second.tier.entries)
+    assert second.get("key") == 2
+    # The writer's own message is ignored, its copy was dropped right away
+    assert first.get("key") == 2
+    assert first.tier_stats()["redis"]["hits"] == 1
+
+    first.delete("key")
+    wait_for(lambda: key not in second.tier.entries)
+    assert second.get("key") is None
+
+    second.set("key", 3)
+    second.get("key")
+    first.clear()
+    wait_for(lambda: not second.tier.entries)
+    assert redis.values == {}
+
+
+@pytest.mark.django_db
+def test_unchanged_listing_is_not_modified(client, profile, folder):
+    url = reverse("filemanager:home")
+    response = client.get(url)
+    tag = response["ETag"]
+    assert "no-cache" in response["Cache-Control"]
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, HTTP_IF_NONE_MATCH=tag)
+    assert response.status_code == 304
+    assert response.content == b""
+    assert len(queries) == 2
+    # Nothing was looked up, let alone rendered
+    assert caching.cache_stats()["listing"] == {"hits": 0, "misses": 1}
+
+    # The JSON variant of the same URL has its own tag
+    xhr = client.get(url, HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+    assert xhr["ETag"] != tag
+    assert "X-Requested-With" in xhr["Vary"]
+
+    Folder.objects.create(name="new", owner=profile)
+    response = client.get(url, HTTP_IF_NONE_MATCH=tag)
+    assert response.status_code == 200
+    assert response["ETag"] != tag
+
+
+@pytest.mark.django_db
+def test_unchanged_search_is_not_modified(client, profile, folder):
+    url = reverse("filemanager:search")
+    tag = client.get(url, {"search": "test"})["ETag"]
+    response = client.get(url, {"search": "test"}, HTTP_IF_NONE_MATCH=tag)
+    assert response.status_code == 304
+    response = client.get(url, {"search": "other"}, HTTP_IF_NONE_MATCH=tag)
+    assert response.status_code == 200
+    folder.trash()
+    response = client.get(url, {"search": "test"}, HTTP_IF_NONE_MATCH=tag)
+    assert response.status_code == 200
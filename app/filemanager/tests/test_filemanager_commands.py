@@ -0,0 +1,94 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import io
+import json
+import pytest
+from PIL import Image
+
+from filemanager import caching
+from filemanager.models import File
+from filemanager.management.commands.rebuild_thumbnails import Command
+
+
+@pytest.fixture
+def image_files(profile, folder):
+    files = []
+    for index, color in enumerate(["red", "green", "blue"]):
+        buffer = io.BytesIO()
+        Image.new("RGB", (300, 200), color).save(buffer, format="PNG")
+        content = SimpleUploadedFile(f"rebuild-{index}.png", buffer.getvalue())
+        files.append(File.objects.create(owner=profile, folder=folder, file=content))
+    yield files
+    for file in File.objects.filter(pk__in=[file.pk for file in files]):
+        file.delete()
+
+
+def rebuild(checkpoint, *args):
+    output = io.StringIO()
+    call_command(
+        "rebuild_thumbnails",
+        "--workers=2",
+        "--batch-size=2",
+        f"--checkpoint={checkpoint}",
+        *args,
+        stdout=output,
+    )
+    return output.getvalue()
+
+
+@pytest.mark.django_db
+def test_rebuild_thumbnails(image_files, tmp_path, user):
+    checkpoint = tmp_path / "checkpoint.json"
+    before = caching.generation(user.id)
+    output = rebuild(checkpoint)
+    # Cached listings of the owner point at the new renditions
+    assert caching.generation(user.id) > before
+    assert "3 ready, 0 failed" in output
+    assert "files/s" in output
+    for file in File.objects.filter(pk__in=[file.pk for file in image_files]):
+        assert file.is_processed
+        assert sorted(file.renditions, key=int) == ["64", "128", "256"]
+    # finished runs leave no checkpoint behind
+    assert not checkpoint.exists()
+
+
+@pytest.mark.django_db
+def test_rebuild_thumbnails_resumes_from_checkpoint(image_files, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    checkpoint.write_text(
+        json.dumps({"filters": {"type": "image"}, "last_id": image_files[1].pk})
+    )
+    output = rebuild(checkpoint, "--type=image", "--resume")
+    assert "1 ready, 0 failed" in output
+    statuses = [File.objects.get(pk=file.pk).processing_status for file in image_files]
+    assert statuses == ["pending", "pending", "ready"]
+
+
+@pytest.mark.django_db
+def test_rebuild_thumbnails_rejects_other_filters(image_files, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    checkpoint.write_text(json.dumps({"filters": {}, "last_id": 0}))
+    with pytest.raises(CommandError):
+        rebuild(checkpoint, "--type=video", "--resume")
+
+
+@pytest.mark.django_db
+def test_stale_renditions_referenced_by_twins_are_kept(image_files):
+    file, twin = image_files[:2]
+    stale = {"thumbnails/rendition.jpg", "thumbnails/sprite.jpg", "thumbnails/old.jpg"}
+    for name in stale:
+        default_storage.save(name, ContentFile(b"stale"))
+    # Same content, still pointing at the old rendition and sprite
+    File.objects.filter(pk=twin.pk).update(
+        sha256=file.sha256,
+        renditions={"512": {"name": "thumbnails/rendition.jpg"}},
+        sprite="thumbnails/sprite.jpg",
+    )
+    Command().delete_stale_renditions(file, stale)
+    assert default_storage.exists("thumbnails/rendition.jpg")
+    assert default_storage.exists("thumbnails/sprite.jpg")
+    assert not default_storage.exists("thumbnails/old.jpg")
@@ -0,0 +1,131 @@
+from django.urls import reverse
+
+import os
+import pytest
+
+from accounts.models import Profile
+from filemanager.copies import copy_file, copy_folder
+from filemanager.models import Blob, File, Folder
+from filemanager.models.file import PROCESSING_READY
+from filemanager.tasks import generate_thumbnail
+from filemanager.totals import computed_folder_totals
+from filemanager.tests.conftest import totals
+
+
+@pytest.mark.django_db
+def test_file_move_view(client, tree, upload):
+    root, _, leaf = tree
+    file = upload(leaf)
+    upload(root)
+    url = reverse("filemanager:move-file", kwargs={"pk": file.pk})
+    response = client.post(url, {"folder": root.pk})
+    assert response.status_code == 302
+    file.refresh_from_db()
+    assert (file.folder_id, file.name) == (root.pk, "upload (1).jpg")
+    assert totals(leaf) == (0, 0, 0)
+    assert totals(root) == (2 * file.size, 2, 2)
+
+
+@pytest.mark.django_db
+def test_folder_move_view_rejects_own_subfolder(client, tree):
+    _, middle, leaf = tree
+    url = reverse("filemanager:move-folder", kwargs={"pk": middle.pk})
+    response = client.post(url, {"parent_folder": leaf.pk})
+    assert response.status_code == 200
+    assert "parent_folder" in response.context["form"].errors
+    response = client.post(url, {"parent_folder": ""})
+    assert response.status_code == 302
+    assert Folder.objects.get(pk=leaf.pk).path == f"/{middle.pk}/{leaf.pk}/"
+
+
+@pytest.mark.django_db
+def test_move_view_rejects_other_owners_folder(client, tree, user):
+    root, middle, _ = tree
+    other = Profile.objects.create(
+        user=type(user).objects.create_user(
+            email="other@test.com", password="testPassword"
+        )
+    )
+    foreign = Folder.objects.create(name="foreign", owner=other)
+    url = reverse("filemanager:move-folder", kwargs={"pk": middle.pk})
+    response = client.post(url, {"parent_folder": foreign.pk})
+    assert response.status_code == 200
+    assert Folder.objects.get(pk=middle.pk).parent_folder_id == root.pk
+
+
+@pytest.mark.django_db
+def test_copy_file_shares_the_blob(client, tree, upload, profile):
+    root, _, leaf = tree
+    file = upload(leaf)
+    url = reverse("filemanager:copy-file", kwargs={"pk": file.pk})
+    assert client.post(url, {"folder": leaf.pk}).status_code == 302
+    copy = File.objects.exclude(pk=file.pk).get()
+    assert (copy.name, copy.folder_id) == ("upload (1).jpg", leaf.pk)
+    assert copy.file.name == file.file.name
+    assert Blob.objects.get(pk=file.blob_id).ref_count == 2
+    assert totals(root) == (2 * file.size, 2, 2)
+    assert Profile.objects.get(pk=profile.pk).storage_used == 2 * file.size
+
+
+@pytest.mark.django_db
+def test_copy_file_hardlinks_legacy_content(file, folder):
+    copy = copy_file(file, folder)
+    try:
+        assert copy.file.name != file.file.name
+        assert os.path.samefile(copy.file.path, file.file.path)
+    finally:
+        copy.delete()
+    assert os.path.exists(file.file.path)
+
+
+@pytest.mark.django_db
+def test_copy_folder_subtree(tree, upload, profile, django_assert_max_num_queries):
+    root, middle, leaf = tree
+    for index in range(5):
+        upload(leaf, f"{index}.jpg")
+    upload(middle)
+    trashed = Folder.objects.create(name="trashed", owner=profile, parent_folder=leaf)
+    upload(trashed)
+    Folder.objects.get(pk=trashed.pk).trash()
+    source = Folder.objects.get(pk=middle.pk)
+
+    # The number of queries does not grow with the number of copied rows
+    with django_assert_max_num_queries(30):
+        copy = copy_folder(source, root)
+
+    assert copy.name == "middle (1)"
+    copied_leaf = copy.subfolders.get()
+    assert copied_leaf.name == "leaf"
+    assert copied_leaf.path == f"{copy.path}{copied_leaf.pk}/"
+    assert copied_leaf.depth == 2
+    assert sorted(copied_leaf.files.values_list("name", flat=True)) == [
+        f"{index}.jpg" for index in range(5)
+    ]
+    assert copy.files.get().blob_id == source.files.get().blob_id
+    assert Blob.objects.get().ref_count == 13
+    size = File.objects.first().size
+    assert totals(copy) == (6 * size, 6, 1)
+    assert totals(root) == (12 * size, 12, 4)
+    assert Profile.objects.get(pk=profile.pk).storage_used == 13 * size
+    # The incremental totals match the ones computed from scratch
+    for folder, expected in computed_folder_totals(Folder, File).items():
+        assert list(totals(Folder.objects.get(pk=folder))) == expected
+
+
+@pytest.mark.django_db
+def test_copied_unprocessed_files_get_thumbnails(
+    tree, upload, monkeypatch, django_capture_on_commit_callbacks
+):
+    root, middle, leaf = tree
+    pending = upload(leaf, "pending.jpg")
+    ready = upload(leaf, "ready.jpg")
+    File.objects.filter(pk=ready.pk).update(
+        processing_status=PROCESSING_READY, thumbnail="thumbnails/ready.webp"
+    )
+    scheduled = []
+    monkeypatch.setattr(generate_thumbnail, "delay", scheduled.append)
+    with django_capture_on_commit_callbacks(execute=True):
+        copy = copy_folder(Folder.objects.get(pk=middle.pk), root)
+    # Only the copy of the pending file is processed, the other shares renditions
+    copied = File.objects.filter(folder__path__startswith=copy.path)
+    assert scheduled == [copied.get(name=pending.name).pk]
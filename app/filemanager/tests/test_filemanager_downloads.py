@@ -0,0 +1,113 @@
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import pytest
+
+from accounts.models import Profile
+from filemanager.downloads import parse_range
+from filemanager.models import File
+
+
+@pytest.fixture
+def photo(profile, media_root):
+    # Deleting the file reclaims its blob, stored in the test's own media_root
+    with open("statics/img/test.jpg", "rb") as fp:
+        content = fp.read()
+    file = File.objects.create(
+        owner=profile, file=SimpleUploadedFile("photo.jpg", content)
+    )
+    yield file, content
+    file.delete()
+
+
+def content_url(file):
+    return reverse("filemanager:file-content", args=[file.pk])
+
+
+def streamed(response):
+    return b"".join(response.streaming_content)
+
+
+@pytest.mark.django_db
+def test_owner_downloads_file(client, photo):
+    file, content = photo
+    response = client.get(content_url(file))
+    assert response.status_code == 200
+    assert streamed(response) == content
+    assert response["Content-Type"] == "image/jpeg"
+    assert response["Accept-Ranges"] == "bytes"
+    assert response["ETag"] == f'"{file.sha256}"'
+    assert response["Content-Disposition"].startswith("inline")
+
+
+@pytest.mark.django_db
+def test_others_can_not_download_file(client, user, photo):
+    file, _ = photo
+    other = type(user).objects.create_user(email="o@test.com", password="testPassword")
+    Profile.objects.get_or_create(user=other)
+    client.force_login(other)
+    assert client.get(content_url(file)).status_code == 404
+    client.logout()
+    assert client.get(content_url(file)).status_code == 302
+
+
+@pytest.mark.django_db
+def test_trashed_file_can_not_be_downloaded(client, photo):
+    file, _ = photo
+    file.trash()
+    assert client.get(content_url(file)).status_code == 404
+
+
+@pytest.mark.django_db
+def test_range_requests(client, photo):
+    file, content = photo
+    url = content_url(file)
+    response = client.get(url, HTTP_RANGE="bytes=10-19")
+    assert response.status_code == 206
+    assert streamed(response) == content[10:20]
+    assert response["Content-Length"] == "10"
+    assert response["Content-Range"] == f"bytes 10-19/{len(content)}"
+
+    response = client.get(url, HTTP_RANGE="bytes=-5")
+    assert streamed(response) == content[-5:]
+    response = client.get(url, HTTP_RANGE=f"bytes={len(content)}-")
+    assert response.status_code == 416
+    assert response["Content-Range"] == f"bytes */{len(content)}"
+
+    # Resumed only while the content is the one the client already has
+    response = client.get(url, HTTP_RANGE="bytes=10-", HTTP_IF_RANGE='"other"')
+    assert response.status_code == 200
+    etag = f'"{file.sha256}"'
+    response = client.get(url, HTTP_RANGE="bytes=10-", HTTP_IF_RANGE=etag)
+    assert streamed(response) == content[10:]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "backend, header, location",
+    [
+        ("nginx", "X-Accel-Redirect", "/protected-media/{name}"),
+        ("apache", "X-Sendfile", "{path}"),
+    ],
+)
+def test_transfer_is_handed_to_the_proxy(
+    client, settings, photo, backend, header, location
+):
+    settings.FILEMANAGER_SENDFILE = backend
+    file, _ = photo
+    response = client.get(content_url(file), HTTP_RANGE="bytes=0-9")
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response[header] == location.format(name=file.file.name, path=file.file.path)
+    assert response["Content-Type"] == "image/jpeg"
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9,20-29", 100) is None
+    assert parse_range("bytes=-", 100) is None
+    assert parse_range("bytes=0-", 100) == (0, 99)
+    assert parse_range("bytes=90-200", 100) == (90, 99)
+    assert parse_range("bytes=-200", 100) == (0, 99)
+    assert parse_range("bytes=20-10", 100) == ()
+    assert parse_range("bytes=0-", 0) == ()
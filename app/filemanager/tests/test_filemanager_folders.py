@@ -0,0 +1,78 @@
+from django.forms import ValidationError
+
+import pytest
+
+from filemanager.models import Folder
+
+
+@pytest.fixture
+def tree(profile):
+    # root / level-1 / ... / level-11
+    folders = [Folder.objects.create(name="root", owner=profile)]
+    for depth in range(1, 12):
+        folders.append(
+            Folder.objects.create(
+                name=f"level-{depth}", owner=profile, parent_folder=folders[-1]
+            )
+        )
+    return folders
+
+
+@pytest.mark.django_db
+def test_paths_are_built_on_create(tree):
+    root, child = tree[0], tree[1]
+    assert root.path == f"/{root.pk}/"
+    assert child.path == f"/{root.pk}/{child.pk}/"
+    assert tree[-1].depth == 11
+    assert Folder.objects.get(pk=child.pk).path == child.path
+
+
+@pytest.mark.django_db
+def test_breadcrumbs_take_one_query(tree, django_assert_num_queries):
+    deepest = Folder.objects.get(pk=tree[-1].pk)
+    with django_assert_num_queries(1):
+        assert deepest.get_breadcrumbs() == tree
+    with django_assert_num_queries(1):
+        assert deepest.get_nested_path().startswith("root / level-1 / level-2")
+
+
+@pytest.mark.django_db
+def test_descendants_take_one_query(tree, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        assert list(tree[5].get_descendants().order_by("depth")) == tree[6:]
+    assert tree[-1].is_descendant_of(tree[0])
+    assert not tree[0].is_descendant_of(tree[-1])
+    assert not tree[3].is_descendant_of(tree[3])
+
+
+@pytest.mark.django_db
+def test_rename_keeps_paths(tree):
+    folder = Folder.objects.get(pk=tree[3].pk)
+    folder.name = "renamed"
+    folder.save()
+    assert Folder.objects.get(pk=tree[-1].pk).path == tree[-1].path
+
+
+@pytest.mark.django_db
+def test_move_rewrites_subtree(tree, profile):
+    other = Folder.objects.create(name="other", owner=profile)
+    folder = Folder.objects.get(pk=tree[5].pk)
+    folder.parent_folder = other
+    folder.save()
+    deepest = Folder.objects.get(pk=tree[-1].pk)
+    assert deepest.path.startswith(f"/{other.pk}/{folder.pk}/")
+    assert deepest.depth == 7
+    assert deepest.is_descendant_of(other)
+    assert [crumb.name for crumb in deepest.get_breadcrumbs()][:2] == [
+        "other",
+        "level-5",
+    ]
+
+
+@pytest.mark.django_db
+def test_move_into_own_subtree_is_rejected(tree):
+    folder = Folder.objects.get(pk=tree[2].pk)
+    folder.parent_folder = tree[4]
+    with pytest.raises(ValidationError):
+        folder.save()
+    assert Folder.objects.get(pk=tree[2].pk).parent_folder_id == tree[1].pk
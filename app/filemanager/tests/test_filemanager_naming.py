@@ -0,0 +1,91 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import pytest
+
+from filemanager import naming
+from filemanager.models import File, Folder
+
+
+@pytest.fixture
+def upload(profile, folder):
+    created = []
+
+    def _upload(name, target=folder):
+        with open("statics/img/test.jpg", "rb") as fp:
+            content = SimpleUploadedFile(name, fp.read())
+        file = File.objects.create(owner=profile, folder=target, file=content)
+        created.append(file)
+        return file
+
+    yield _upload
+    for file in created:
+        file.delete()
+
+
+@pytest.mark.django_db
+def test_duplicate_uploads_get_suffixes(upload):
+    names = [upload("photo.jpg").name for _ in range(3)]
+    assert names == ["photo.jpg", "photo (1).jpg", "photo (2).jpg"]
+    # "photo (3).jpg" is an unrelated name, uploaded twice it is suffixed again
+    assert upload("photo (3).jpg").name == "photo (3).jpg"
+    assert upload("photo (3).jpg").name == "photo (3) (1).jpg"
+
+
+@pytest.mark.django_db
+def test_root_files_get_suffixes(upload):
+    assert upload("root.jpg", target=None).name == "root.jpg"
+    assert upload("root.jpg", target=None).name == "root (1).jpg"
+
+
+@pytest.mark.django_db
+def test_folder_names_get_suffixes(profile, folder):
+    names = [
+        Folder.objects.create(name="Docs", owner=profile, parent_folder=folder).name
+        for _ in range(3)
+    ]
+    # digits of the requested name are kept as they are
+    assert names == ["Docs", "Docs (1)", "Docs (2)"]
+    assert Folder.objects.create(name="2024", owner=profile).name == "2024"
+    assert Folder.objects.create(name="2024", owner=profile).name == "2024 (1)"
+
+
+@pytest.mark.django_db
+def test_free_gap_is_reused(profile, folder):
+    for name in ["Docs", "Docs (1)", "Docs (3)"]:
+        Folder.objects.create(name=name, owner=profile, parent_folder=folder)
+    created = Folder.objects.create(name="Docs", owner=profile, parent_folder=folder)
+    assert created.name == "Docs (2)"
+
+
+@pytest.mark.django_db
+def test_allocation_takes_one_query(profile, folder, django_assert_num_queries):
+    for _ in range(10):
+        Folder.objects.create(name="Docs", owner=profile, parent_folder=folder)
+    with django_assert_num_queries(1):
+        assert naming.unique_name(folder.subfolders.all(), "Docs") == "Docs (10)"
+
+
+@pytest.mark.django_db
+def test_saving_keeps_own_name(profile, folder):
+    subfolder = Folder.objects.create(name="Docs", owner=profile, parent_folder=folder)
+    subfolder.save()
+    assert subfolder.name == "Docs"
+
+
+@pytest.mark.django_db
+def test_allocation_is_retried_on_conflict(profile, folder, monkeypatch):
+    Folder.objects.create(name="Docs", owner=profile, parent_folder=folder)
+    allocate = naming.unique_name
+    calls = []
+
+    def racing_unique_name(siblings, name, *args, **kwargs):
+        # The first allocation misses a folder created concurrently
+        calls.append(name)
+        if len(calls) == 1:
+            return name
+        return allocate(siblings, name, *args, **kwargs)
+
+    monkeypatch.setattr(naming, "unique_name", racing_unique_name)
+    created = Folder.objects.create(name="Docs", owner=profile, parent_folder=folder)
+    assert created.name == "Docs (1)"
+    assert len(calls) == 2
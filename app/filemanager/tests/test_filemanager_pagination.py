@@ -0,0 +1,85 @@
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import pytest
+
+from filemanager.models import File, Folder
+from filemanager.pagination import decode_cursor, encode_cursor, paginate_listing
+
+XHR = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"}
+
+
+@pytest.fixture
+def listing(profile):
+    parent = Folder.objects.create(name="parent", owner=profile)
+    # Equal names are ordered by id
+    for name in ["b", "a", "c", "a (1)"]:
+        Folder.objects.create(name=name, owner=profile, parent_folder=parent)
+    File.objects.bulk_create(
+        File(name=name, owner=profile, folder=parent, file="./test.jpg", size=1)
+        for name in ["z.jpg", "x.jpg", "y.jpg"]
+    )
+    return parent
+
+
+def walk(client, url):
+    """
+    Returns the names of every page of a listing, following the cursors
+    """
+    pages = []
+    cursor = None
+    while True:
+        data = client.get(url, {"cursor": cursor} if cursor else {}, **XHR).json()
+        pages.append([item["name"] for item in data["folders"] + data["files"]])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "page_size, pages",
+    [
+        (3, [["a", "a (1)", "b"], ["c", "x.jpg", "y.jpg"], ["z.jpg"]]),
+        (4, [["a", "a (1)", "b", "c"], ["x.jpg", "y.jpg", "z.jpg"]]),
+        (10, [["a", "a (1)", "b", "c", "x.jpg", "y.jpg", "z.jpg"]]),
+    ],
+)
+def test_listing_pages(client, listing, settings, page_size, pages):
+    settings.FILEMANAGER_LISTING_PAGE_SIZE = page_size
+    url = reverse("filemanager:folder-content", args=[listing.slug])
+    assert walk(client, url) == pages
+
+
+@pytest.mark.django_db
+def test_listing_html_has_load_more(client, listing, settings):
+    settings.FILEMANAGER_LISTING_PAGE_SIZE = 2
+    url = reverse("filemanager:folder-content", args=[listing.slug])
+    response = client.get(url)
+    assert [folder.name for folder in response.context["folders"]] == ["a", "a (1)"]
+    assert 'id="load-more"' in response.content.decode()
+    data = client.get(url, {"cursor": response.context["next_cursor"]}, **XHR).json()
+    assert 'id="folder-' in data["html"]
+    assert client.get(url, {"cursor": "not a cursor"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_deep_pages_cost_the_same(listing):
+    folders = Folder.objects.filter(parent_folder=listing)
+    files = File.objects.filter(folder=listing)
+    cursors = [None, encode_cursor("folder", "b", 0), encode_cursor("file", "y.jpg", 0)]
+    for cursor in cursors:
+        with CaptureQueriesContext(connection) as queries:
+            paginate_listing(folders, files, cursor, 2)
+        # A range on (name, id), never an OFFSET
+        assert all("OFFSET" not in query["sql"] for query in queries)
+        assert len(queries) <= 2
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("file", "photo (1).jpg", 42)) == (
+        "file",
+        "photo (1).jpg",
+        42,
+    )
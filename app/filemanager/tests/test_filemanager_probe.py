@@ -0,0 +1,70 @@
+from django.forms import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import io
+import pytest
+from PIL import Image
+
+from filemanager.models import validate_file_type
+from filemanager.probe import MediaProbeError, probe_media, sniff_mime_type
+
+
+def image_bytes(image_format, size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def video_bytes(make_video):
+    return make_video("sample.mp4", duration=2).read_bytes()
+
+
+@pytest.mark.parametrize(
+    "image_format, mime_type",
+    [
+        ("JPEG", "image/jpeg"),
+        ("PNG", "image/png"),
+        ("GIF", "image/gif"),
+        ("BMP", "image/bmp"),
+        ("TIFF", "image/tiff"),
+    ],
+)
+def test_sniff_image_signatures(image_format, mime_type):
+    assert sniff_mime_type(image_bytes(image_format)[:64]) == mime_type
+
+
+def test_sniff_video_signatures(video_bytes):
+    assert sniff_mime_type(video_bytes[:64]) == "video/mp4"
+    assert sniff_mime_type(b"\x00\x00\x00\x14ftypqt  ") == "video/quicktime"
+    assert sniff_mime_type(b"RIFF\x00\x00\x00\x00AVI LIST") == "video/x-msvideo"
+    assert sniff_mime_type(b"plain text") is None
+
+
+def test_probe_image_reads_dimensions():
+    upload = SimpleUploadedFile("image.png", image_bytes("PNG", (320, 200)))
+    media_info = probe_media(upload)
+    assert media_info.kind == "image"
+    assert (media_info.width, media_info.height) == (320, 200)
+    # probing must not consume the upload
+    assert upload.tell() == 0
+
+
+def test_probe_video_reads_metadata(video_bytes):
+    media_info = probe_media(SimpleUploadedFile("video.mp4", video_bytes))
+    assert media_info.mime_type == "video/mp4"
+    assert (media_info.width, media_info.height) == (160, 120)
+    assert media_info.duration == pytest.approx(2, abs=0.1)
+
+
+def test_probe_rejects_truncated_video(video_bytes):
+    with pytest.raises(MediaProbeError):
+        probe_media(SimpleUploadedFile("video.mp4", video_bytes[:64]))
+
+
+def test_validate_file_type_ignores_file_name():
+    with pytest.raises(ValidationError):
+        validate_file_type(SimpleUploadedFile("fake.jpg", b"not an image"))
+    upload = SimpleUploadedFile("no-extension", image_bytes("JPEG"))
+    validate_file_type(upload)
+    assert upload.media_info.mime_type == "image/jpeg"
@@ -0,0 +1,82 @@
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import pytest
+
+from filemanager import search
+from filemanager.models import File, Folder
+
+XHR = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"}
+
+# Declared query budgets of the filemanager views (session and user included),
+# which must hold whatever the amount of listed content
+QUERY_BUDGETS = [
+    # (url name, url kwargs, query string, headers, budget)
+    ("filemanager:home", None, {}, {}, 5),
+    ("filemanager:folder-content", "slug", {}, {}, 6),
+    ("filemanager:folder-content", "slug", {}, XHR, 5),
+    ("filemanager:search", None, {"search": "item"}, {}, 9),
+    ("filemanager:download-folder", "pk", {}, {}, 5),
+]
+
+
+@pytest.fixture
+def grow(profile):
+    """
+    Adds `count` nested folders, each with `count` files, below a "top" folder
+    """
+    top = Folder.objects.create(name="top", owner=profile)
+
+    def _grow(count):
+        parent = top
+        for index in range(count):
+            parent = Folder.objects.create(
+                name=f"item folder {parent.pk}", owner=profile, parent_folder=parent
+            )
+            for target in (top, parent, None):
+                files = File.objects.bulk_create(
+                    File(
+                        name=f"item {parent.pk}-{number}.jpg",
+                        owner=profile,
+                        folder=target,
+                        file="./test.jpg",
+                        size=1,
+                        type="image",
+                        processing_status="ready",
+                        thumbnail="./test.jpg",
+                    )
+                    for number in range(count)
+                )
+                search.index_items(files)
+        return top
+
+    return _grow
+
+
+def count_queries(client, url, data, headers):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, data, **headers)
+        # Streamed responses query the database while being consumed
+        if response.streaming:
+            b"".join(response.streaming_content)
+    assert response.status_code == 200
+    return len(queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name, kwarg, data, headers, budget", QUERY_BUDGETS)
+def test_view_stays_within_query_budget(
+    client, grow, name, kwarg, data, headers, budget
+):
+    counts = []
+    for count in (1, 10):
+        top = grow(count)
+        kwargs = {"folder_slug": top.slug} if kwarg == "slug" else None
+        if kwarg == "pk":
+            kwargs = {"pk": top.pk}
+        counts.append(
+            count_queries(client, reverse(name, kwargs=kwargs), data, headers)
+        )
+    assert counts[0] == counts[1], f"{name} queries grow with the data: {counts}"
+    assert counts[1] <= budget, f"{name} exceeds its budget of {budget}: {counts}"
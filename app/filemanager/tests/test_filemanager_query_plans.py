@@ -0,0 +1,77 @@
+from django.db import connection
+from django.utils import timezone
+
+import pytest
+
+from filemanager.models import File, Folder, UploadSession
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != "sqlite", reason="Asserts SQLite query plans"
+)
+
+FOLDER = Folder(pk=1, path="/1/")
+SESSION_ID = "00000000-0000-0000-0000-000000000000"
+
+# Hot queries of the filemanager and the index each of them must be answered from
+HOT_QUERIES = {
+    "file listing": (
+        lambda: File.objects.owned_by(1)
+        .filter(folder_id=1, deleted_at__isnull=True)
+        .order_by("name", "pk"),
+        "file_listing_idx (owner_id=? AND folder_id=?)",
+    ),
+    "root folder listing": (
+        lambda: Folder.objects.owned_by(1)
+        .filter(parent_folder=None, deleted_at__isnull=True)
+        .order_by("name", "pk"),
+        "folder_listing_idx (owner_id=? AND parent_folder_id=?)",
+    ),
+    "owned file": (
+        lambda: File.objects.alive().owned_by(1).filter(pk=1),
+        "INTEGER PRIMARY KEY",
+    ),
+    "owned folder": (
+        lambda: Folder.objects.alive().owned_by(1).filter(slug="slug"),
+        "(slug=?)",
+    ),
+    "file search": (
+        lambda: File.objects.alive().owned_by(1).filter(name__contains="photo"),
+        "file_listing_idx (owner_id=?)",
+    ),
+    "destination folders": (
+        lambda: Folder.objects.alive().owned_by(1),
+        "folder_listing_idx (owner_id=?)",
+    ),
+    "trashed ancestors": (
+        lambda: Folder.objects.alive().filter(pk=1),
+        "folder_trash_idx (owner_id=?)",
+    ),
+    "subtree": (
+        lambda: Folder.objects.subtree(FOLDER),
+        "(path>? AND path<?)",
+    ),
+    "expired files": (
+        lambda: File.objects.filter(deleted_at__lt=timezone.now()),
+        "file_purge_idx (deleted_at<?)",
+    ),
+    "expired folders": (
+        lambda: Folder.objects.filter(deleted_at__lt=timezone.now()),
+        "folder_purge_idx (deleted_at<?)",
+    ),
+    "upload session": (
+        lambda: UploadSession.objects.owned_by(1).filter(id=SESSION_ID),
+        "(id=?)",
+    ),
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_indexes(name):
+    queryset, index = HOT_QUERIES[name]
+    plan = queryset().explain()
+    # "SCAN <table>" is a full table scan, "SEARCH" an index lookup
+    assert " SCAN " not in plan, f"{name} falls back to a full scan:\n{plan}"
+    # Ownership is checked on the owner column, never by joining profiles and users
+    assert "accounts_user" not in plan
+    assert index in plan, f"{name} does not use {index}:\n{plan}"
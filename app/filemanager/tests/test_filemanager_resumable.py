@@ -0,0 +1,190 @@
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import io
+import os
+import fcntl
+import base64
+import hashlib
+import pytest
+
+from filemanager.models import File, UploadSession
+from filemanager.resumable import UploadConflict, append_chunks
+from filemanager.tasks import purge_stale_upload_sessions
+
+
+def encode(value):
+    return base64.b64encode(str(value).encode()).decode()
+
+
+@pytest.fixture
+def video_content(make_video):
+    return make_video("resumable.mp4", duration=2).read_bytes()
+
+
+@pytest.fixture
+def create_session(client, folder):
+    def _create_session(content, file_name="resumable.mp4"):
+        response = client.post(
+            reverse("filemanager:resumable-upload-create"),
+            headers={
+                "Upload-Length": str(len(content)),
+                "Upload-Metadata": f"filename {encode(file_name)},"
+                f"folder {encode(folder.id)}",
+            },
+        )
+        assert response.status_code == 201
+        return response["Location"]
+
+    return _create_session
+
+
+def send_chunk(client, location, offset, chunk):
+    return client.generic(
+        "PATCH",
+        location,
+        chunk,
+        content_type="application/offset+octet-stream",
+        headers={"Upload-Offset": str(offset)},
+    )
+
+
+@pytest.mark.django_db
+def test_resumable_upload(client, folder, video_content, create_session):
+    location = create_session(video_content)
+    middle = len(video_content) // 2
+
+    response = send_chunk(client, location, 0, video_content[:middle])
+    assert response.status_code == 204
+    assert response["Upload-Offset"] == str(middle)
+    assert not File.objects.filter(folder=folder).exists()
+
+    # resuming from the offset reported by the server
+    offset = int(client.head(location)["Upload-Offset"])
+    response = send_chunk(client, location, offset, video_content[offset:])
+    assert response.status_code == 204
+
+    session = UploadSession.objects.get()
+    assert session.is_complete
+    assert session.file.type == "video"
+    assert session.file.size == len(video_content)
+    assert session.file.sha256 == hashlib.sha256(video_content).hexdigest()
+    assert not os.path.exists(session.part_path)
+    os.remove(session.file.file.path)
+
+
+@pytest.mark.django_db
+def test_resumable_upload_offset_conflict(client, video_content, create_session):
+    location = create_session(video_content)
+    response = send_chunk(client, location, 10, video_content[10:20])
+    assert response.status_code == 409
+    assert response["Upload-Offset"] == "0"
+    UploadSession.objects.get().delete()
+
+
+@pytest.mark.django_db
+def test_resumable_upload_is_appended_by_one_request_at_a_time(
+    client, video_content, create_session
+):
+    location = create_session(video_content)
+    session = UploadSession.objects.get()
+    with open(session.part_path, "rb") as part:
+        # Another request is still streaming its chunk
+        fcntl.flock(part, fcntl.LOCK_EX)
+        response = send_chunk(client, location, 0, video_content[:10])
+    assert response.status_code == 409
+    assert response["Upload-Offset"] == "0"
+    assert send_chunk(client, location, 0, video_content[:10]).status_code == 204
+    session.delete()
+
+
+@pytest.mark.django_db
+def test_stale_append_keeps_appended_bytes(video_content, create_session):
+    create_session(video_content)
+    session, stale = UploadSession.objects.get(), UploadSession.objects.get()
+    assert append_chunks(session, io.BytesIO(video_content[:10])) == 10
+    # Read before the append above, it neither truncates nor moves the offset
+    with pytest.raises(UploadConflict):
+        append_chunks(stale, io.BytesIO(b"x" * 20))
+    with open(session.part_path, "rb") as part:
+        assert part.read() == video_content[:10]
+    assert UploadSession.objects.get().offset == 10
+    session.delete()
+
+
+@pytest.mark.django_db
+def test_resumable_upload_size_limit(client, settings):
+    settings.FILEMANAGER_MAX_UPLOAD_SIZE_MB = 1
+    response = client.post(
+        reverse("filemanager:resumable-upload-create"),
+        headers={"Upload-Length": str(2 * 1024 * 1024)},
+    )
+    assert response.status_code == 413
+    assert not UploadSession.objects.exists()
+
+
+@pytest.mark.django_db
+def test_resumable_upload_rejects_invalid_content(client, create_session):
+    content = b"definitely not a video"
+    location = create_session(content)
+    response = send_chunk(client, location, 0, content)
+    assert response.status_code == 422
+    assert not UploadSession.objects.exists()
+    assert not File.objects.exists()
+
+
+@pytest.mark.django_db
+def test_purge_stale_upload_sessions(client, video_content, create_session, settings):
+    create_session(video_content)
+    session = UploadSession.objects.get()
+    settings.FILEMANAGER_UPLOAD_SESSION_TTL_HOURS = 0
+    assert purge_stale_upload_sessions() == 1
+    assert not os.path.exists(session.part_path)
+
+
+@pytest.mark.django_db
+def test_resumable_upload_is_completed_once(client, video_content, create_session):
+    location = create_session(video_content)
+    length = len(video_content)
+    assert send_chunk(client, location, 0, video_content).status_code == 204
+    # A retried (or concurrent) completion neither assembles nor fails again
+    response = client.generic(
+        "PATCH",
+        location,
+        CONTENT_TYPE="application/offset+octet-stream",
+        headers={"Upload-Offset": str(length)},
+    )
+    assert response.status_code == 204
+    assert response["Upload-Offset"] == str(length)
+    assert send_chunk(client, location, 0, video_content).status_code == 409
+    assert File.objects.count() == 1
+    File.objects.get().delete()
+
+
+@pytest.mark.django_db
+def test_resumable_upload_of_known_content(
+    client, profile, video_content, create_session
+):
+    existing = File.objects.create(
+        owner=profile, file=SimpleUploadedFile("known.mp4", video_content)
+    )
+    location = create_session(video_content)
+    assert send_chunk(client, location, 0, video_content).status_code == 204
+    session = UploadSession.objects.get()
+    assert session.file.blob_id == existing.blob_id
+    # The part is not moved into storage, it is removed right away
+    assert not os.path.exists(session.part_path)
+
+
+@pytest.mark.django_db
+def test_resumable_upload_into_trashed_folder(client, folder, video_content):
+    folder.trash()
+    response = client.post(
+        reverse("filemanager:resumable-upload-create"),
+        headers={
+            "Upload-Length": str(len(video_content)),
+            "Upload-Metadata": f"filename {encode('a.mp4')},folder {encode(folder.id)}",
+        },
+    )
+    assert response.status_code == 404
+    assert not UploadSession.objects.exists()
@@ -0,0 +1,113 @@
+from django.urls import reverse
+from django.db import connection
+from django.core.management import call_command
+
+import pytest
+
+from accounts.models import Profile
+from filemanager import search
+from filemanager.copies import copy_folder
+from filemanager.models import File, Folder
+from filemanager.trash import purge_folder
+
+
+def folder_names(profile, query, limit=10):
+    folders = search.search(Folder.objects.alive(), profile.pk, query, limit)
+    return [folder.name for folder in folders]
+
+
+def indexed_names():
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT name FROM {search.SEARCH_TABLE} ORDER BY name")
+        return [name[1:] for (name,) in cursor.fetchall()]
+
+
+@pytest.fixture
+def folders(profile):
+    for name in ["Photo", "photos 2024", "Old photo", "vacation", "Taxes"]:
+        Folder.objects.create(name=name, owner=profile)
+
+
+@pytest.mark.django_db
+def test_search_ranks_matches(profile, folders):
+    # Exact, prefix then substring matches, whatever the case
+    assert folder_names(profile, "PHOTO") == ["Photo", "photos 2024", "Old photo"]
+    assert folder_names(profile, "photo", limit=2) == ["Photo", "photos 2024"]
+    assert folder_names(profile, "xyz") == []
+    assert folder_names(profile, " ") == []
+
+
+@pytest.mark.django_db
+def test_search_tolerates_typos(profile, folders):
+    assert folder_names(profile, "vacatoin") == ["vacation"]
+    assert folder_names(profile, "photp")[:3] == ["Old photo", "Photo", "photos 2024"]
+
+
+@pytest.mark.django_db
+def test_search_short_queries(profile, folders):
+    assert folder_names(profile, "ta") == ["Taxes"]
+    assert folder_names(profile, "ph") == ["Photo", "photos 2024", "Old photo"]
+
+
+@pytest.mark.django_db
+def test_search_is_scoped_to_owner_and_queryset(user, profile, folders):
+    other = Profile.objects.create(
+        user=type(user).objects.create_user(
+            email="other@test.com", password="testPassword"
+        )
+    )
+    Folder.objects.create(name="photo", owner=other)
+    Folder.objects.get(name="Old photo").trash()
+    assert folder_names(profile, "photo") == ["Photo", "photos 2024"]
+    assert folder_names(other, "photo") == ["photo"]
+
+
+@pytest.mark.django_db
+def test_index_follows_changes(profile, folders):
+    folder = Folder.objects.get(name="Taxes")
+    folder.name = "Invoices"
+    folder.save()
+    assert folder_names(profile, "taxes") == []
+    assert folder_names(profile, "invoice") == ["Invoices"]
+
+    folder.delete()
+    assert "Invoices" not in indexed_names()
+
+    # Bulk copies and purges bypass the signals
+    source = Folder.objects.create(name="source", owner=profile)
+    Folder.objects.create(name="nested", owner=profile, parent_folder=source)
+    copy = copy_folder(source, None)
+    assert folder_names(profile, "nested") == ["nested", "nested"]
+    copy.trash()
+    purge_folder(copy, batch_size=1)
+    assert indexed_names().count("nested") == 1
+
+
+@pytest.mark.django_db
+def test_rebuild_search_index(profile, folders, file):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {search.SEARCH_TABLE}")
+    call_command("rebuild_search_index")
+    assert "Test File" in indexed_names()
+    assert folder_names(profile, "photo") == ["Photo", "photos 2024", "Old photo"]
+
+
+@pytest.mark.django_db
+def test_search_view_ranks_results(client, profile, folders, file):
+    response = client.get(reverse("filemanager:search"), {"search": "photo"})
+    assert response.status_code == 200
+    assert [folder.name for folder in response.context["folders"]] == [
+        "Photo",
+        "photos 2024",
+        "Old photo",
+    ]
+    response = client.get(reverse("filemanager:search"), {"search": "test fiel"})
+    assert list(response.context["files"]) == [File.objects.get(pk=file.pk)]
+
+
+def test_rank():
+    assert search.rank("photo", "PHOTO") == search.EXACT
+    assert search.rank("photo", "photo.jpg") == search.PREFIX
+    assert search.rank("photo", "my photo.jpg") == search.SUBSTRING
+    assert 0 < search.rank("vacatoin", "vacation.jpg") < 1
+    assert search.rank("vacation", "taxes.pdf") == 0
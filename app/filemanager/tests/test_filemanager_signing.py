@@ -0,0 +1,69 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import time
+import pytest
+from urllib.parse import parse_qs, urlsplit
+
+from filemanager import signing
+from filemanager.models import File
+
+
+@pytest.fixture
+def photo(profile, media_root):
+    # Deleting the file reclaims its blob, stored in the test's own media_root
+    with open("statics/img/test.jpg", "rb") as fp:
+        content = fp.read()
+    file = File.objects.create(
+        owner=profile, file=SimpleUploadedFile("photo.jpg", content)
+    )
+    yield file, content
+    file.delete()
+
+
+def test_urls_are_stable_within_a_bucket(settings):
+    settings.FILEMANAGER_MEDIA_URL_BUCKET = 3600
+    settings.FILEMANAGER_MEDIA_URL_TTL = 7200
+    start = 3600 * 1000
+    first = signing.sign_url("/media/a.jpg", now=start)
+    assert signing.sign_url("/media/a.jpg", now=start + 3599) == first
+    assert signing.sign_url("/media/a.jpg", now=start + 3600) != first
+    assert signing.sign_url("/media/b.jpg", now=start) != first
+    # Valid for the TTL at least, and one more bucket at most
+    expires = int(parse_qs(urlsplit(first).query)["expires"][0])
+    assert expires == start + 3600 + 7200
+
+
+def test_signature_depends_on_the_key(settings):
+    signature = signing.signature("/media/a.jpg", 100)
+    settings.FILEMANAGER_MEDIA_SIGNING_KEY = "shared with the cdn"
+    assert signing.signature("/media/a.jpg", 100) != signature
+
+
+@pytest.mark.django_db
+def test_signed_url_is_served_without_session(client, photo, django_assert_num_queries):
+    file, content = photo
+    client.logout()
+    with django_assert_num_queries(0):
+        response = client.get(file.file.url)
+    assert response.status_code == 200
+    assert b"".join(response.streaming_content) == content
+    assert "public" in response["Cache-Control"]
+
+    response = client.get(file.file.url, HTTP_RANGE="bytes=0-9")
+    assert response.status_code == 206
+    assert b"".join(response.streaming_content) == content[:10]
+
+
+@pytest.mark.django_db
+def test_invalid_signatures_are_denied(client, settings, photo):
+    file, _ = photo
+    url = file.file.url
+    path = url.split("?")[0]
+    assert client.get(path).status_code == 403
+    assert client.get(url.replace("signature=", "signature=x")).status_code == 403
+    # A signature is only valid for its own path
+    other = url.replace(path, path.replace(".jpg", ".png"))
+    assert client.get(other).status_code == 403
+
+    expired = signing.sign_url(path, now=time.time() - 10**6)
+    assert client.get(expired).status_code == 403
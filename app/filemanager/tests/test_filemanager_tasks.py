@@ -0,0 +1,53 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import os
+import pytest
+
+from filemanager.models import File
+from filemanager.tasks import generate_thumbnail
+
+
+@pytest.fixture
+def uploaded_file(profile, folder):
+    with open("statics/img/test.jpg", "rb") as fp:
+        content = SimpleUploadedFile("task-test.jpg", fp.read())
+    file = File.objects.create(owner=profile, folder=folder, file=content)
+    yield file
+    # Removing the blob and thumbnails created during thumbnail tests
+    file.refresh_from_db()
+    file.delete()
+
+
+@pytest.mark.django_db
+def test_generate_thumbnail(uploaded_file):
+    assert uploaded_file.processing_status == "pending"
+    generate_thumbnail(uploaded_file.id)
+    uploaded_file.refresh_from_db()
+    assert uploaded_file.processing_status == "ready"
+    assert uploaded_file.is_processed
+    assert os.path.isfile(uploaded_file.thumbnail.path)
+
+
+@pytest.mark.django_db
+def test_generate_thumbnail_keeps_concurrent_rename(uploaded_file):
+    File.objects.filter(id=uploaded_file.id).update(name="Renamed")
+    generate_thumbnail(uploaded_file.id)
+    uploaded_file.refresh_from_db()
+    assert uploaded_file.name == "Renamed"
+    assert uploaded_file.processing_status == "ready"
+
+
+@pytest.mark.django_db
+def test_generate_thumbnail_failure(profile, folder):
+    content = SimpleUploadedFile("broken.jpg", b"not an image")
+    file = File.objects.create(owner=profile, folder=folder, file=content)
+    generate_thumbnail(file.id)
+    file.refresh_from_db()
+    assert file.processing_status == "failed"
+    assert not file.thumbnail
+    os.remove(file.file.path)
+
+
+@pytest.mark.django_db
+def test_generate_thumbnail_missing_file():
+    assert generate_thumbnail(0) is None
@@ -0,0 +1,214 @@
+from django.conf import settings
+from django.urls import reverse
+from django.utils.html import escape
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import io
+import os
+import pytest
+from PIL import Image
+
+from filemanager.models import File
+from filemanager.tasks import generate_thumbnail
+from filemanager.thumbnails import (
+    SPRITE_FRAME_WIDTH,
+    THUMBNAIL_DIR,
+    THUMBNAIL_MAX_AGE,
+    decode_budget,
+    frame_positions,
+    rendition_name,
+)
+
+
+@pytest.fixture
+def create_image_file(profile, folder):
+    created = []
+
+    def _create_image_file(name, image_format, size):
+        buffer = io.BytesIO()
+        Image.new("RGB", size, "blue").save(buffer, format=image_format)
+        content = SimpleUploadedFile(name, buffer.getvalue())
+        file = File.objects.create(owner=profile, folder=folder, file=content)
+        generate_thumbnail(file.id)
+        file.refresh_from_db()
+        created.append(file)
+        return file
+
+    yield _create_image_file
+    for file in created:
+        file.delete()
+
+
+@pytest.mark.django_db
+def test_renditions_pyramid(create_image_file):
+    file = create_image_file("large.bmp", "BMP", (1200, 800))
+    assert sorted(file.renditions, key=int) == ["64", "128", "256", "512"]
+    for size, rendition in file.renditions.items():
+        path = os.path.join(settings.MEDIA_ROOT, rendition["name"])
+        with Image.open(path) as image:
+            # BMP sources are re-encoded in a browser friendly format
+            assert image.format == "WEBP"
+            assert max(image.size) == int(size)
+            assert image.size == (rendition["width"], rendition["height"])
+    # the smallest rendition covering the grid cell is used as `src`
+    assert file.thumbnail.name == file.renditions["128"]["name"]
+
+
+@pytest.mark.django_db
+def test_renditions_are_not_upscaled(create_image_file):
+    file = create_image_file("small.png", "PNG", (150, 90))
+    assert sorted(file.renditions, key=int) == ["64", "128"]
+    tiny = create_image_file("tiny.png", "PNG", (20, 20))
+    assert list(tiny.renditions) == ["64"]
+    assert tiny.renditions["64"]["width"] == 20
+
+
+@pytest.mark.django_db
+def test_progressive_jpeg_renditions(create_image_file, settings):
+    settings.FILEMANAGER_THUMBNAIL_FORMAT = "JPEG"
+    file = create_image_file("photo.tiff", "TIFF", (600, 400))
+    with Image.open(file.thumbnail.path) as image:
+        assert image.format == "JPEG"
+        assert image.info.get("progressive")
+
+
+@pytest.mark.django_db
+def test_renditions_are_deleted_with_file(create_image_file):
+    file = create_image_file("deleted.png", "PNG", (600, 400))
+    paths = [file.thumbnail.path] + [
+        os.path.join(settings.MEDIA_ROOT, rendition["name"])
+        for rendition in file.renditions.values()
+    ]
+    File.objects.get(id=file.id).delete()
+    assert not any(os.path.exists(path) for path in paths)
+
+
+@pytest.mark.django_db
+def test_content_view_renders_srcset(client, folder, create_image_file):
+    file = create_image_file("listed.png", "PNG", (600, 400))
+    url = reverse("filemanager:folder-content", kwargs={"folder_slug": folder.slug})
+    response = client.get(url)
+    # Signed URLs carry query strings, escaped in the page
+    assert escape(file.srcset) in response.content.decode()
+    assert "256w" in file.srcset
+
+
+@pytest.mark.django_db
+def test_rendition_names_follow_content_and_parameters(settings):
+    name = rendition_name("a" * 64, 128)
+    assert name == rendition_name("a" * 64, 128)
+    assert name != rendition_name("b" * 64, 128)
+    assert name != rendition_name("a" * 64, 256)
+    settings.FILEMANAGER_THUMBNAIL_QUALITY = 60
+    assert name != rendition_name("a" * 64, 128)
+
+
+@pytest.mark.django_db
+def test_regenerated_renditions_keep_their_names(create_image_file):
+    file = create_image_file("again.png", "PNG", (300, 200))
+    renditions = file.renditions
+    generate_thumbnail(file.id)
+    file.refresh_from_db()
+    # same content and parameters, nothing new is written
+    assert file.renditions == renditions
+    assert file.thumbnail.name.startswith(f"{THUMBNAIL_DIR}/")
+
+
+@pytest.mark.django_db
+def test_shared_renditions_outlive_one_file(create_image_file):
+    first = create_image_file("shared.png", "PNG", (320, 200))
+    second = create_image_file("shared-copy.png", "PNG", (320, 200))
+    assert first.thumbnail.name == second.thumbnail.name
+    File.objects.get(id=first.id).delete()
+    assert os.path.exists(second.thumbnail.path)
+    File.objects.get(id=second.id).delete()
+    assert not os.path.exists(second.thumbnail.path)
+
+
+@pytest.mark.django_db
+def test_thumbnail_view_is_cached_while_signed(client, create_image_file):
+    file = create_image_file("cached.png", "PNG", (300, 200))
+    response = client.get(file.thumbnail.url)
+    assert response.status_code == 200
+    cache_control = response["Cache-Control"]
+    assert "immutable" in cache_control
+    # Up to the expiry of the signed URL
+    max_age = int(cache_control.split("max-age=")[1].split(",")[0])
+    assert settings.FILEMANAGER_MEDIA_URL_TTL <= max_age <= THUMBNAIL_MAX_AGE
+    assert client.get(file.thumbnail.url.split("?")[0]).status_code == 403
+
+
+@pytest.fixture
+def create_video_file(profile, folder, make_video):
+    created = []
+
+    def _create_video_file(name, duration):
+        content = SimpleUploadedFile(name, make_video(name, duration).read_bytes())
+        file = File.objects.create(owner=profile, folder=folder, file=content)
+        generate_thumbnail(file.id)
+        file.refresh_from_db()
+        created.append(file)
+        return file
+
+    yield _create_video_file
+    for file in created:
+        file.delete()
+
+
+def test_frame_positions_cover_the_clip():
+    assert frame_positions(8, 4) == [1, 3, 5, 7]
+    assert frame_positions(None, 3) == [0, 0, 0]
+
+
+@pytest.mark.django_db
+def test_short_video_poster_and_sprite(create_video_file):
+    # clips shorter than a second used to fail at the fixed 1s frame
+    file = create_video_file("short.mp4", 0.5)
+    assert file.processing_status == "ready"
+    assert file.renditions["64"]["width"] == 64
+    with Image.open(file.sprite.path) as sprite:
+        frames = settings.FILEMANAGER_VIDEO_SPRITE_FRAMES
+        assert sprite.width == frames * SPRITE_FRAME_WIDTH
+    assert file.sprite.name in file.thumbnail_names
+
+
+@pytest.mark.django_db
+def test_video_sprite_can_be_disabled(create_video_file, settings):
+    settings.FILEMANAGER_VIDEO_SPRITE_FRAMES = 0
+    file = create_video_file("nosprite.mp4", 2)
+    assert file.processing_status == "ready"
+    assert not file.sprite
+
+
+@pytest.mark.django_db
+def test_large_jpeg_is_decoded_at_reduced_resolution(create_image_file, monkeypatch):
+    reserved = []
+    reserve = decode_budget.reserve
+    monkeypatch.setattr(
+        decode_budget, "reserve", lambda size: reserved.append(size) or reserve(size)
+    )
+    file = create_image_file("huge.jpg", "JPEG", (4096, 3072))
+    # decoded at 1/4 scale (1024x768), still covering the 512 rendition
+    assert reserved == [1024 * 768 * 7]
+    assert file.renditions["512"]["width"] == 512
+    assert decode_budget.in_use == 0
+
+
+@pytest.mark.django_db
+def test_decode_budget_is_enforced(create_image_file, settings):
+    settings.FILEMANAGER_DECODE_MEMORY_MB = 1
+    file = create_image_file("wide.png", "PNG", (1200, 800))
+    assert file.processing_status == "failed"
+    assert decode_budget.in_use == 0
+
+
+@pytest.mark.django_db
+def test_decompression_bomb_is_rejected(client, folder, settings):
+    settings.FILEMANAGER_MAX_IMAGE_PIXELS = 1000
+    buffer = io.BytesIO()
+    Image.new("L", (100, 100)).save(buffer, format="PNG")
+    url = reverse("filemanager:upload-file")
+    content = SimpleUploadedFile("bomb.png", buffer.getvalue())
+    response = client.post(url, {"file": content, "folder": folder.id})
+    assert "Image dimensions are too large." in response.content.decode()
+    assert not File.objects.filter(name="bomb.png").exists()
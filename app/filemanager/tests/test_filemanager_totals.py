@@ -0,0 +1,62 @@
+from django.core.management import call_command
+
+import io
+import pytest
+
+from accounts.models import Profile
+from filemanager import caching
+from filemanager.models import File, Folder
+from filemanager.tests.conftest import totals
+
+
+@pytest.mark.django_db
+def test_totals_follow_uploads_and_deletes(tree, upload, profile):
+    root, middle, leaf = tree
+    file = upload(leaf)
+    assert totals(root) == (file.size, 1, 2)
+    assert totals(middle) == (file.size, 1, 1)
+    assert totals(leaf) == (file.size, 1, 0)
+    assert Profile.objects.get(pk=profile.pk).storage_used == file.size
+    File.objects.get(pk=file.pk).delete()
+    assert totals(root) == (0, 0, 2)
+    assert Profile.objects.get(pk=profile.pk).storage_used == 0
+
+
+@pytest.mark.django_db
+def test_totals_follow_moves(tree, upload, profile):
+    root, middle, leaf = tree
+    other = Folder.objects.create(name="other", owner=profile)
+    file = upload(leaf)
+    moved = Folder.objects.get(pk=middle.pk)
+    moved.parent_folder = other
+    moved.save()
+    assert totals(root) == (0, 0, 0)
+    assert totals(other) == (file.size, 1, 2)
+    file = File.objects.get(pk=file.pk)
+    file.folder = root
+    file.save()
+    assert totals(root) == (file.size, 1, 0)
+    assert totals(other) == (0, 0, 2)
+
+
+@pytest.mark.django_db
+def test_totals_follow_folder_delete(tree, upload):
+    root, middle, leaf = tree
+    upload(leaf)
+    Folder.objects.get(pk=middle.pk).delete()
+    assert totals(root) == (0, 0, 0)
+
+
+@pytest.mark.django_db
+def test_reconcile_totals_repairs_drift(tree, upload, profile):
+    root, middle, _ = tree
+    file = upload(middle)
+    Folder.objects.filter(pk=root.pk).update(total_size=1, file_count=7)
+    Profile.objects.filter(pk=profile.pk).update(storage_used=0)
+    before = caching.generation(profile.user_id)
+    output = io.StringIO()
+    call_command("reconcile_totals", stdout=output)
+    assert "Repaired 1 drifted folders and 1 drifted profiles" in output.getvalue()
+    assert caching.generation(profile.user_id) > before
+    assert totals(root) == (file.size, 1, 2)
+    assert Profile.objects.get(pk=profile.pk).storage_used == file.size
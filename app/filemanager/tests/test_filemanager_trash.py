@@ -0,0 +1,104 @@
+from django.urls import reverse
+from django.utils import timezone
+
+import os
+import pytest
+from datetime import timedelta
+
+from accounts.models import Profile
+from filemanager.models import Blob, File, Folder
+from filemanager.tasks import purge_trash
+from filemanager.totals import computed_folder_totals
+from filemanager.tests.conftest import totals
+
+
+def expire(queryset):
+    queryset.update(deleted_at=timezone.now() - timedelta(days=365))
+
+
+@pytest.mark.django_db
+def test_trashed_subtree_is_hidden(client, tree, upload):
+    root, middle, leaf = tree
+    file = upload(leaf)
+    Folder.objects.get(pk=middle.pk).trash()
+    assert set(Folder.objects.alive()) == {root}
+    assert not File.objects.alive().filter(pk=file.pk).exists()
+
+    response = client.get(reverse("filemanager:folder-content", args=[root.slug]))
+    assert list(response.context["folders"]) == []
+    response = client.get(reverse("filemanager:folder-content", args=[leaf.slug]))
+    assert response.status_code == 404
+    response = client.get(reverse("filemanager:search"), {"search": "trash"})
+    assert list(response.context["files"]) == []
+    assert list(response.context["folders"]) == []
+
+
+@pytest.mark.django_db
+def test_trash_and_restore_keep_totals(tree, upload, profile):
+    root, middle, leaf = tree
+    file = upload(leaf)
+    Folder.objects.get(pk=middle.pk).trash()
+    assert totals(root) == (0, 0, 0)
+    # The trashed subtree keeps its totals, the storage is used until the purge
+    assert totals(middle) == (file.size, 1, 1)
+    assert Profile.objects.get(pk=profile.pk).storage_used == file.size
+    assert computed_folder_totals(Folder, File)[root.pk] == [0, 0, 0]
+
+    Folder.objects.get(pk=middle.pk).restore()
+    assert totals(root) == (file.size, 1, 2)
+
+    File.objects.get(pk=file.pk).trash()
+    assert totals(root) == (0, 0, 2)
+    File.objects.get(pk=file.pk).restore()
+    assert totals(root) == (file.size, 1, 2)
+
+
+@pytest.mark.django_db
+def test_restore_allocates_a_free_name(tree, profile):
+    root, middle, _ = tree
+    Folder.objects.get(pk=middle.pk).trash()
+    # The name of a trashed folder is free again
+    replacement = Folder.objects.create(
+        name="middle", owner=profile, parent_folder=root
+    )
+    assert replacement.name == "middle"
+    restored = Folder.objects.get(pk=middle.pk)
+    restored.restore()
+    assert restored.name == "middle (1)"
+
+
+@pytest.mark.django_db
+def test_purge_trash_deletes_expired_items(tree, upload, profile, settings):
+    settings.FILEMANAGER_PURGE_BATCH_SIZE = 2
+    root, middle, leaf = tree
+    with open("statics/img/test.jpg", "rb") as fp:
+        image = fp.read()
+
+    def distinct(folder, name):
+        # Trailing bytes make the content (and so the blob) distinct per name
+        return upload(folder, name, image + name.encode())
+
+    kept = distinct(root, "kept.jpg")
+    purged = [distinct(leaf, f"purged {index}.jpg") for index in range(3)]
+    loose = distinct(root, "loose.jpg")
+    # Same content as a kept file, the blob stays
+    twin = distinct(leaf, "kept.jpg")
+    paths = [file.file.path for file in purged]
+    Folder.objects.get(pk=middle.pk).trash()
+    File.objects.get(pk=loose.pk).trash()
+    # Only expired items are purged
+    assert purge_trash() == {"files": 0, "folders": 0}
+
+    expire(Folder.objects.filter(pk=middle.pk))
+    expire(File.objects.filter(pk=loose.pk))
+    assert purge_trash() == {"files": 5, "folders": 2}
+    assert set(Folder.objects.all()) == {root}
+    assert set(File.objects.all()) == {kept}
+    assert all(not os.path.exists(path) for path in paths)
+    assert Blob.objects.filter(pk__in=[file.blob_id for file in purged]).count() == 0
+    # Equal content stays stored while a file still refers to it
+    assert twin.blob_id == kept.blob_id
+    assert Blob.objects.get(pk=kept.blob_id).ref_count == 1
+    assert os.path.exists(kept.file.path)
+    assert Profile.objects.get(pk=profile.pk).storage_used == kept.size
+    assert totals(root) == (kept.size, 1, 0)
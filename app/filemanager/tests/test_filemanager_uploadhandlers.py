@@ -0,0 +1,51 @@
+from django.urls import reverse
+from django.test import Client
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import hashlib
+import os
+import pytest
+
+from filemanager.models import File
+
+
+@pytest.fixture
+def image_content():
+    with open("statics/img/test.jpg", "rb") as fp:
+        return fp.read()
+
+
+@pytest.mark.django_db
+def test_upload_is_hashed_while_streaming(client, folder, image_content):
+    url = reverse("filemanager:upload-file")
+    file_data = SimpleUploadedFile("streamed.jpg", image_content)
+    response = client.post(url, {"file": file_data, "folder": folder.id})
+    assert response.status_code == 302
+    uploaded_file = File.objects.get(name="streamed.jpg", folder=folder)
+    assert uploaded_file.sha256 == hashlib.sha256(image_content).hexdigest()
+    assert uploaded_file.size == len(image_content)
+    assert uploaded_file.mime_type == "image/jpeg"
+    os.remove(uploaded_file.file.path)
+
+
+@pytest.mark.django_db
+def test_oversized_upload_is_aborted(client, folder, image_content, settings):
+    # Shrinking the limit below the size of the test image
+    settings.FILEMANAGER_MAX_UPLOAD_SIZE_MB = 0
+    url = reverse("filemanager:upload-file")
+    file_data = SimpleUploadedFile("huge.jpg", image_content)
+    response = client.post(url, {"file": file_data, "folder": folder.id})
+    assert response.status_code == 200
+    assert "maximum limit of 0 MB" in response.context["form"].errors["file"][0]
+    assert not File.objects.filter(name="huge.jpg").exists()
+    assert not os.path.exists("media/uploads/huge.jpg")
+
+
+@pytest.mark.django_db
+def test_upload_requires_csrf_token(user, folder, image_content):
+    client = Client(enforce_csrf_checks=True)
+    client.force_login(user)
+    url = reverse("filemanager:upload-file")
+    file_data = SimpleUploadedFile("csrf.jpg", image_content)
+    response = client.post(url, {"file": file_data, "folder": folder.id})
+    assert response.status_code == 403
@@ -1,58 +1,11 @@
 from django.urls import reverse
-from django.test import Client
-from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 import os
 import pytest
 
-from accounts.models import Profile
 from filemanager.models import File, Folder
-
-# test image paths for tests
-source_path = "statics/img/test.jpg"
-destination_path = "media/test.jpg"
-
-# Check if the file doesn't exist in the destination
-if not os.path.exists(destination_path):
-    # Copying test image to the media folder for tests
-    with open(source_path, "rb") as src_file:
-        content = src_file.read()
-
-    with open(destination_path, "wb") as dest_file:
-        dest_file.write(content)
-
-
-@pytest.fixture
-def user():
-    return get_user_model().objects.create_user(
-        email="user@test.com", password="testPassword", is_verified=True
-    )
-
-
-@pytest.fixture
-def profile(user):
-    # getting the profile from the tuple (don't need created_status boolean)
-    return Profile.objects.get_or_create(user=user)[0]
-
-
-@pytest.fixture
-def client(user):
-    client = Client()
-    client.force_login(user=user)
-    return client
-
-
-@pytest.fixture
-def folder(profile):
-    return Folder.objects.create(name="Test Folder", owner=profile)
-
-
-@pytest.fixture
-def file(profile, folder):
-    return File.objects.create(
-        name="Test File", owner=profile, folder=folder, file="./test.jpg"
-    )
+from filemanager.tasks import generate_thumbnail
 
 
 @pytest.fixture(autouse=True)
@@ -87,6 +40,38 @@ def test_file_upload_view(client, folder):
     assert File.objects.filter(name="test.jpg", folder=folder).exists()
 
 
+@pytest.mark.django_db
+def test_file_upload_view_defers_thumbnail(
+    client, folder, django_capture_on_commit_callbacks, monkeypatch
+):
+    scheduled = []
+    monkeypatch.setattr(generate_thumbnail, "delay", scheduled.append)
+    url = reverse("filemanager:upload-file")
+    with open("media/test.jpg", "rb") as fp:
+        file_data = SimpleUploadedFile(fp.name, fp.read(), content_type="image/jpeg")
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(url, {"file": file_data, "folder": folder.id})
+    assert response.status_code == 302
+    uploaded_file = File.objects.get(name="test.jpg", folder=folder)
+    # thumbnail is left to the celery worker
+    assert uploaded_file.processing_status == "pending"
+    assert not uploaded_file.thumbnail
+    assert scheduled == [uploaded_file.pk]
+
+
+@pytest.mark.django_db
+def test_video_upload_view(client, folder, make_video):
+    video_path = make_video("clip.mp4")
+    url = reverse("filemanager:upload-file")
+    file_data = SimpleUploadedFile("clip.mp4", video_path.read_bytes())
+    response = client.post(url, {"file": file_data, "folder": folder.id})
+    assert response.status_code == 302
+    uploaded_file = File.objects.get(name="clip.mp4", folder=folder)
+    assert uploaded_file.type == "video"
+    assert (uploaded_file.width, uploaded_file.height) == (160, 120)
+    os.remove(uploaded_file.file.path)
+
+
 @pytest.mark.django_db
 def test_folder_create_view(client, folder):
     url = reverse("filemanager:create-folder")
@@ -130,7 +115,9 @@ def test_file_delete_view(client, file):
     url = reverse("filemanager:delete-file", kwargs={"pk": file.id})
     response = client.post(url)
     assert response.status_code == 302
-    assert not File.objects.filter(id=file.id).exists()
+    # Moved to the trash, the row stays until the purge
+    assert not File.objects.alive().filter(id=file.id).exists()
+    assert File.objects.get(id=file.id).deleted_at is not None
 
 
 @pytest.mark.django_db
@@ -138,4 +125,5 @@ def test_folder_delete_view(client, folder):
     url = reverse("filemanager:delete-folder", kwargs={"pk": folder.id})
     response = client.post(url)
     assert response.status_code == 302
-    assert not Folder.objects.filter(id=folder.id).exists()
+    assert not Folder.objects.alive().filter(id=folder.id).exists()
+    assert Folder.objects.get(id=folder.id).deleted_at is not None
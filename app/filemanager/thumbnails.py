@@ -0,0 +1,352 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+import io
+import django
+import hashlib
+import threading
+import subprocess
+from contextlib import contextmanager
+from PIL import Image, ImageOps
+from moviepy.config import FFMPEG_BINARY
+
+from .probe import check_image_pixels, probe_video
+
+# Width (px) of thumbnails in the listing grid, the `src` rendition covers it
+DISPLAY_SIZE = 100
+
+# Directory (relative to MEDIA_ROOT) holding generated renditions
+THUMBNAIL_DIR = "thumbnails"
+
+FORMAT_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+# Bumped whenever the rendering changes, so new renditions get new names
+RENDITION_VERSION = 1
+
+# Renditions never change once written, browsers and proxies may keep them forever
+THUMBNAIL_MAX_AGE = 60 * 60 * 24 * 365
+
+# Position of the video poster frame, as a fraction of the clip duration
+POSTER_POSITION = 0.25
+
+# Width (px) of every frame in a video hover sprite strip
+SPRITE_FRAME_WIDTH = 160
+
+
+# Bytes per pixel of decoded images, by PIL mode (4 for unlisted modes)
+MODE_BYTES = {"1": 1, "L": 1, "P": 1, "LA": 2, "I;16": 2, "RGB": 3, "YCbCr": 3}
+
+
+def setup_worker(media_root):
+    """
+    Initializes a rendering worker process (see rebuild_thumbnails), files are
+    read and renditions written where the parent process does
+    """
+    django.setup()
+    settings.MEDIA_ROOT = media_root
+
+
+class FrameExtractionError(Exception):
+    """Raised when ffmpeg can not extract frames from a video"""
+
+
+class DecodeBudgetError(Exception):
+    """Raised when an image can not be decoded within the memory budget"""
+
+
+class DecodeBudget:
+    """
+    Bytes of decoded pixels the threads of this process may hold at once,
+    decodes wait for each other instead of piling up in memory
+    """
+
+    def __init__(self):
+        self.in_use = 0
+        self.condition = threading.Condition()
+
+    @property
+    def capacity(self):
+        return settings.FILEMANAGER_DECODE_MEMORY_MB * 1024 * 1024
+
+    @contextmanager
+    def reserve(self, size):
+        if size > self.capacity:
+            raise DecodeBudgetError(
+                f"Decoding needs {size} bytes, budget is {self.capacity}"
+            )
+        with self.condition:
+            self.condition.wait_for(lambda: self.in_use + size <= self.capacity)
+            self.in_use += size
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.in_use -= size
+                self.condition.notify_all()
+
+
+decode_budget = DecodeBudget()
+
+
+def hashed_name(source_sha256, *parameters):
+    """
+    Returns a storage name derived from the source content and every
+    parameter affecting the output (so equal names mean equal bytes)
+    """
+    image_format = settings.FILEMANAGER_THUMBNAIL_FORMAT
+    quality = settings.FILEMANAGER_THUMBNAIL_QUALITY
+    values = (source_sha256, *parameters, image_format, quality, RENDITION_VERSION)
+    key = ":".join(str(value) for value in values)
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    extension = FORMAT_EXTENSIONS[image_format]
+    return f"{THUMBNAIL_DIR}/{digest[:2]}/{digest}.{extension}"
+
+
+def rendition_name(source_sha256, size):
+    return hashed_name(source_sha256, size)
+
+
+def sprite_name(source_sha256, frames):
+    return hashed_name(source_sha256, "sprite", frames, SPRITE_FRAME_WIDTH)
+
+
+def prepare_image(image):
+    """
+    Applies the EXIF orientation and converts to a mode the output format supports
+    """
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if settings.FILEMANAGER_THUMBNAIL_FORMAT == "WEBP" and has_alpha:
+        return image.convert("RGBA")
+    return image.convert("RGB")
+
+
+def encode(image):
+    """
+    Encodes a rendition as WebP or progressive JPEG
+
+    Returns:
+        bytes: encoded image
+    """
+    image_format = settings.FILEMANAGER_THUMBNAIL_FORMAT
+    quality = settings.FILEMANAGER_THUMBNAIL_QUALITY
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, "WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def save_once(name, image):
+    """
+    Encodes and stores an image under a content-hashed name, unless it exists
+    """
+    if default_storage.exists(name):
+        return name
+    return default_storage.save(name, ContentFile(encode(image)))
+
+
+def rendition_sizes(source_size):
+    """
+    Returns the rendition sizes of a source, from the largest to the smallest
+
+    Sizes larger than the source are not upscaled, the smallest size is
+    always rendered (even for tiny sources).
+    """
+    sizes = sorted(settings.FILEMANAGER_THUMBNAIL_SIZES, reverse=True)
+    return [size for size in sizes if size < max(source_size)] or sizes[-1:]
+
+
+def decoded_size(image):
+    """
+    Estimates the memory used by an image once decoded and converted
+    (the decoded bitmap plus its converted copy)
+    """
+    width, height = image.size
+    return width * height * (MODE_BYTES.get(image.mode, 4) + 4)
+
+
+def render_renditions(image, source_sha256, sizes=None):
+    """
+    Renders every configured rendition size from a single decoded image
+
+    Sizes are rendered from the largest to the smallest, each one being
+    downscaled from the previous rendition instead of the full source.
+    Renditions which already exist (same content and parameters) are not
+    encoded again.
+
+    Args:
+        image: decoded PIL image
+        source_sha256 (str): SHA-256 of the source file content
+        sizes (list): rendition sizes, derived from the image size if None
+
+    Returns:
+        dict: {"<size>": {"name": str, "width": int, "height": int}}
+    """
+    sizes = sizes or rendition_sizes(image.size)
+    image = prepare_image(image)
+    renditions = {}
+    for size in sizes:
+        image.thumbnail((size, size), Image.LANCZOS)
+        name = save_once(rendition_name(source_sha256, size), image)
+        renditions[str(size)] = {
+            "name": name,
+            "width": image.width,
+            "height": image.height,
+        }
+    return renditions
+
+
+def default_rendition(renditions):
+    """
+    Returns the name of the smallest rendition covering DISPLAY_SIZE
+    (or the largest one when none does)
+    """
+    ordered = sorted(
+        renditions.values(), key=lambda item: max(item["width"], item["height"])
+    )
+    for rendition in ordered:
+        if max(rendition["width"], rendition["height"]) >= DISPLAY_SIZE:
+            return rendition["name"]
+    return ordered[-1]["name"]
+
+
+def image_renditions(file, source_sha256):
+    """
+    Renders the renditions of an image decoding as few pixels as possible
+
+    JPEG images are decoded at a reduced resolution (DCT scaling, 1/2 to 1/8)
+    still covering the largest rendition, so memory does not grow with the
+    source resolution. Other formats are decoded in full, within the process
+    decode budget.
+
+    Raises:
+        ImageTooLargeError: If the image has more pixels than allowed.
+        DecodeBudgetError: If the decoded image would not fit the budget.
+    """
+    with Image.open(file) as image:
+        check_image_pixels(*image.size)
+        sizes = rendition_sizes(image.size)
+        # Only changes the decoder setup, nothing is decoded yet
+        image.draft(image.mode, (sizes[0], sizes[0]))
+        with decode_budget.reserve(decoded_size(image)):
+            image.load()
+            return render_renditions(image, source_sha256, sizes)
+
+
+def run_ffmpeg(arguments):
+    """
+    Runs a time-bounded ffmpeg command writing a single image to stdout
+
+    Returns:
+        PIL.Image: decoded output image
+    """
+    command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", *arguments]
+    command += ["-frames:v", "1", "-f", "image2pipe", "-c:v", "bmp", "-"]
+    try:
+        result = subprocess.run(
+            command,
+            capture_output=True,
+            check=False,
+            stdin=subprocess.DEVNULL,
+            timeout=settings.FILEMANAGER_VIDEO_FRAME_TIMEOUT,
+        )
+    except subprocess.TimeoutExpired:
+        raise FrameExtractionError("Frame extraction timed out")
+    except OSError as error:
+        raise FrameExtractionError(f"Frame extraction could not run: {error}")
+    if result.returncode != 0 or not result.stdout:
+        raise FrameExtractionError(result.stderr.decode(errors="replace").strip())
+    image = Image.open(io.BytesIO(result.stdout))
+    image.load()
+    return image
+
+
+def seek_arguments(path, position):
+    # Input seeking jumps to the keyframe before the position and only that
+    # keyframe is decoded (no accurate seek, other frames are skipped)
+    return [
+        "-skip_frame",
+        "nokey",
+        "-ss",
+        f"{position:.3f}",
+        "-noaccurate_seek",
+        "-i",
+        path,
+    ]
+
+
+def video_duration(path):
+    with open(path, "rb") as file:
+        return probe_video(file, None).duration
+
+
+def frame_positions(duration, count):
+    """
+    Returns `count` timestamps spread evenly across the clip (frame centers)
+    """
+    if not duration:
+        return [0] * count
+    return [duration * (index + 0.5) / count for index in range(count)]
+
+
+def extract_poster(path, duration=None):
+    """
+    Extracts a representative frame of a video, a quarter into the clip so
+    intros and fades are skipped while short clips still have a frame
+    """
+    position = duration * POSTER_POSITION if duration else 0
+    try:
+        return run_ffmpeg(seek_arguments(path, position))
+    except FrameExtractionError:
+        if not position:
+            raise
+        # Broken indexes may not be seekable, the first frame always is
+        return run_ffmpeg(seek_arguments(path, 0))
+
+
+def extract_sprite(path, duration, frames):
+    """
+    Extracts `frames` evenly spaced keyframes side by side in a single ffmpeg
+    invocation, used for scrubbing video previews on hover
+    """
+    arguments = []
+    filters = []
+    for index, position in enumerate(frame_positions(duration, frames)):
+        arguments += seek_arguments(path, position)
+        filters.append(
+            # Seeked frames keep negative timestamps, they are reset so the
+            # stacked frames line up
+            f"[{index}:v]trim=end_frame=1,setpts=PTS-STARTPTS,"
+            f"scale={SPRITE_FRAME_WIDTH}:-2,setsar=1[frame{index}]"
+        )
+    labels = "".join(f"[frame{index}]" for index in range(frames))
+    filters.append(f"{labels}hstack=inputs={frames}")
+    return run_ffmpeg(arguments + ["-filter_complex", ";".join(filters)])
+
+
+def video_renditions(path, source_sha256, duration=None):
+    return render_renditions(extract_poster(path, duration), source_sha256)
+
+
+def video_sprite(path, source_sha256, duration=None):
+    """
+    Returns the storage name of the hover sprite strip of a video,
+    None when sprites are disabled (less than two frames)
+    """
+    frames = settings.FILEMANAGER_VIDEO_SPRITE_FRAMES
+    if frames < 2:
+        return None
+    name = sprite_name(source_sha256, frames)
+    if default_storage.exists(name):
+        return name
+    sprite = prepare_image(extract_sprite(path, duration, frames))
+    return save_once(name, sprite)
+
+
+def delete_renditions(names):
+    for name in names:
+        if name and default_storage.exists(name):
+            default_storage.delete(name)
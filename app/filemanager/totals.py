@@ -0,0 +1,100 @@
+from django.db.models import Count, Sum
+
+# Denormalized total fields of folders, in the order of computed_folder_totals
+FOLDER_TOTAL_FIELDS = ["total_size", "file_count", "subfolder_count"]
+
+
+def path_ids(path):
+    return [int(pk) for pk in path.strip("/").split("/") if pk]
+
+
+def has_field(model, name):
+    return any(field.name == name for field in model._meta.get_fields())
+
+
+def counted_path(ids, trashed):
+    """
+    Returns the ids of `ids` (a materialized path) counting an item below them:
+    a trashed subtree keeps its totals out of the folders above it
+    """
+    for index in range(len(ids) - 1, -1, -1):
+        if ids[index] in trashed:
+            return ids[index:]
+    return ids
+
+
+def computed_folder_totals(folder_model, file_model):
+    """
+    Computes the subtree totals of every folder from scratch
+
+    Files are aggregated per folder with a single GROUP BY, the results are
+    then added along the materialized path of each folder. Trashed files are
+    left out, trashed folders keep their totals (restoring adds them back).
+
+    Returns:
+        dict: {folder id: [total_size, file_count, subfolder_count]}
+    """
+    folders = folder_model.objects.all()
+    files = file_model.objects.filter(folder__isnull=False)
+    trashed = set()
+    # Historical models of the migrations predating the trash have no deleted_at
+    if has_field(folder_model, "deleted_at"):
+        trashed = set(
+            folders.filter(deleted_at__isnull=False).values_list("pk", flat=True)
+        )
+        files = files.filter(deleted_at__isnull=True)
+    paths = dict(folders.values_list("pk", "path").iterator())
+    totals = {pk: [0, 0, 0] for pk in paths}
+    direct = files.values("folder_id").annotate(size=Sum("size"), count=Count("id"))
+    for row in direct:
+        for pk in counted_path(path_ids(paths[row["folder_id"]]), trashed):
+            totals[pk][0] += row["size"] or 0
+            totals[pk][1] += row["count"]
+    for pk, path in paths.items():
+        if pk in trashed:
+            continue
+        for ancestor in counted_path(path_ids(path)[:-1], trashed):
+            totals[ancestor][2] += 1
+    return totals
+
+
+def reconcile_totals(folder_model, file_model, profile_model, dry_run=False):
+    """
+    Repairs the denormalized folder and profile totals which drifted
+
+    Takes the model classes so data migrations can pass historical models.
+
+    Returns:
+        tuple: (repaired folders, repaired profiles)
+    """
+    totals = computed_folder_totals(folder_model, file_model)
+    drifted_folders = []
+    folders = folder_model.objects.only("pk", "owner_id", *FOLDER_TOTAL_FIELDS)
+    for folder in folders.iterator():
+        expected = totals[folder.pk]
+        if [getattr(folder, field) for field in FOLDER_TOTAL_FIELDS] != expected:
+            for field, value in zip(FOLDER_TOTAL_FIELDS, expected):
+                setattr(folder, field, value)
+            drifted_folders.append(folder)
+
+    # Files count against the storage of their owner until they are purged
+    storage = dict(
+        file_model.objects.values("owner_id")
+        .annotate(size=Sum("size"))
+        .values_list("owner_id", "size")
+    )
+    drifted_profiles = []
+    for profile in profile_model.objects.only("pk", "storage_used").iterator():
+        expected = storage.get(profile.pk) or 0
+        if profile.storage_used != expected:
+            profile.storage_used = expected
+            drifted_profiles.append(profile)
+
+    if not dry_run:
+        folder_model.objects.bulk_update(
+            drifted_folders, FOLDER_TOTAL_FIELDS, batch_size=500
+        )
+        profile_model.objects.bulk_update(
+            drifted_profiles, ["storage_used"], batch_size=500
+        )
+    return drifted_folders, drifted_profiles
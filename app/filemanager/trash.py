@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+
+import os
+from collections import Counter
+
+from .models import Blob, File, Folder, UploadSession
+from . import search
+from .thumbnails import delete_renditions
+from accounts.models import Profile
+
+# Columns needed to release what a purged file holds on to
+PURGED_FILE_FIELDS = [
+    "pk",
+    "owner_id",
+    "size",
+    "blob_id",
+    "file",
+    "sha256",
+    "thumbnail",
+    "sprite",
+    "renditions",
+]
+
+
+def raw_delete(queryset):
+    """
+    Deletes the rows of `queryset` with a single DELETE, without loading them
+    or sending signals (the purge does the signal receivers' work in bulk)
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def purge_files(files, batch_size):
+    """
+    Deletes `files` in batches of `batch_size` rows
+
+    Each batch is a handful of queries whatever its size: references to the
+    blobs and the storage used by the owners are dropped with one update each,
+    content is removed from the disk once the batch is committed.
+
+    Returns:
+        int: Number of purged files
+    """
+    purged = 0
+    while rows := list(files.order_by("pk").values(*PURGED_FILE_FIELDS)[:batch_size]):
+        with transaction.atomic():
+            delete_file_rows(rows)
+        delete_file_content(rows)
+        purged += len(rows)
+    return purged
+
+
+def delete_file_rows(rows):
+    ids = [row["pk"] for row in rows]
+    UploadSession.objects.filter(file_id__in=ids).update(file=None)
+    raw_delete(File.objects.filter(pk__in=ids))
+    search.unindex_items(File, ids)
+
+    blobs = Counter(row["blob_id"] for row in rows if row["blob_id"])
+    Blob.objects.release_many(blobs)
+
+    storage = Counter()
+    for row in rows:
+        storage[row["owner_id"]] += row["size"]
+    released = Case(*[When(pk=pk, then=Value(size)) for pk, size in storage.items()])
+    Profile.objects.filter(pk__in=storage).update(
+        storage_used=F("storage_used") - released
+    )
+
+
+def delete_file_content(rows):
+    """
+    Removes the files stored before blobs, and the renditions no file uses anymore
+    """
+    for row in rows:
+        if not row["blob_id"] and row["file"]:
+            path = File.file.field.storage.path(row["file"])
+            if os.path.isfile(path):
+                os.remove(path)
+
+    hashes = {row["sha256"] for row in rows if row["sha256"]}
+    in_use = set(
+        File.objects.filter(sha256__in=hashes).values_list("sha256", flat=True)
+    )
+    for row in rows:
+        if row["sha256"] not in in_use:
+            file = File(
+                thumbnail=row["thumbnail"],
+                sprite=row["sprite"],
+                renditions=row["renditions"],
+            )
+            delete_renditions(file.thumbnail_names)
+
+
+def purge_folder(folder, batch_size):
+    """
+    Deletes a trashed folder with its whole subtree, in batches of `batch_size` rows
+
+    Returns:
+        tuple: (number of purged folders, number of purged files)
+    """
+    subtree = Folder.objects.subtree(folder)
+    files = purge_files(File.objects.filter(folder__in=subtree), batch_size)
+    # Deleted one by one so their partial files are removed by post_delete
+    for session in UploadSession.objects.filter(folder__in=subtree).iterator():
+        session.delete()
+    folders = 0
+    # Deepest folders first, no batch deletes a folder before its subfolders
+    while ids := list(
+        subtree.order_by("-depth", "pk").values_list("pk", flat=True)[:batch_size]
+    ):
+        with transaction.atomic():
+            folders += raw_delete(Folder.objects.filter(pk__in=ids))
+            search.unindex_items(Folder, ids)
+    return folders, files
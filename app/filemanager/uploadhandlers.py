@@ -0,0 +1,80 @@
+from django.forms import ValidationError
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+import hashlib
+
+from .models import check_file_size
+from .probe import HEADER_SIZE, sniff_mime_type
+
+
+class StreamingValidationUploadHandler(FileUploadHandler):
+    """
+    Hashes, sizes and sniffs uploaded files in a single pass while chunks arrive
+
+    Must run before the storing handlers: it completes the upload through them
+    and attaches the results to the returned file as `sha256` and
+    `detected_mime_type`. Files exceeding the size limit are skipped as soon as
+    the limit is crossed and the error is kept in `request.upload_errors`.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.header = b""
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        try:
+            check_file_size(self.received)
+        except ValidationError as error:
+            self.request.upload_errors[self.field_name] = error
+            # Remaining bytes of this file are discarded without being stored
+            raise SkipFile()
+        self.sha256.update(raw_data)
+        if len(self.header) < HEADER_SIZE:
+            self.header += raw_data[: HEADER_SIZE - len(self.header)]
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Completing the upload through the following (storing) handlers
+        handlers = self.request.upload_handlers
+        following = handlers.index(self) + 1
+        for handler in handlers[following:]:
+            file_obj = handler.file_complete(file_size)
+            if file_obj:
+                file_obj.sha256 = self.sha256.hexdigest()
+                file_obj.detected_mime_type = sniff_mime_type(self.header)
+                return file_obj
+        return None
+
+
+def install_upload_handlers(request):
+    """
+    Puts StreamingValidationUploadHandler in front of the request's upload handlers
+    (Must be called before request.POST or request.FILES are accessed)
+    """
+    request.upload_errors = {}
+    request.upload_handlers.insert(0, StreamingValidationUploadHandler(request))
+
+
+class StreamingUploadMixin:
+    """
+    Validating uploads of a form view while the request body is streamed
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # CSRF is checked in dispatch, once the upload handlers are installed
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def dispatch(self, request, *args, **kwargs):
+        install_upload_handlers(request)
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
+    def form_invalid(self, form):
+        # Replacing "required" errors of skipped files with the actual reason
+        for field_name, error in self.request.upload_errors.items():
+            form.errors[field_name] = form.error_class(error.messages)
+        return super().form_invalid(form)
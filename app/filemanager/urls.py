@@ -1,4 +1,5 @@
 from django.urls import path
+from django.conf import settings
 from . import views
 
 app_name = "filemanager"
@@ -9,9 +10,26 @@ urlpatterns = [
         "folder/<str:folder_slug>/", views.ContentView.as_view(), name="folder-content"
     ),
     path("upload/file/", views.FileUploadView.as_view(), name="upload-file"),
+    path(
+        "upload/resumable/",
+        views.ResumableUploadCreateView.as_view(),
+        name="resumable-upload-create",
+    ),
+    path(
+        "upload/resumable/<uuid:session_id>/",
+        views.ResumableUploadView.as_view(),
+        name="resumable-upload",
+    ),
     path("create/folder/", views.FolderCreateView.as_view(), name="create-folder"),
     path("file/<int:pk>/edit/", views.FileUpdateView.as_view(), name="update-file"),
     path("file/<int:pk>/delete/", views.FileDeleteView.as_view(), name="delete-file"),
+    path(
+        "file/<int:pk>/content/",
+        views.FileContentView.as_view(),
+        name="file-content",
+    ),
+    path("file/<int:pk>/move/", views.FileMoveView.as_view(), name="move-file"),
+    path("file/<int:pk>/copy/", views.FileCopyView.as_view(), name="copy-file"),
     path(
         "folder/<int:pk>/edit/", views.FolderUpdateView.as_view(), name="update-folder"
     ),
@@ -20,5 +38,24 @@ urlpatterns = [
         views.FolderDeleteView.as_view(),
         name="delete-folder",
     ),
+    path("folder/<int:pk>/move/", views.FolderMoveView.as_view(), name="move-folder"),
+    path("folder/<int:pk>/copy/", views.FolderCopyView.as_view(), name="copy-folder"),
+    path(
+        "folder/<int:pk>/download/",
+        views.FolderDownloadView.as_view(),
+        name="download-folder",
+    ),
     path("search/", views.SearchView.as_view(), name="search"),
+    path("cache/stats/", views.CacheStatsView.as_view(), name="cache-stats"),
+    # Only content-hashed names (thumbnails/<aa>/<hash>.<ext>) are immutable
+    path(
+        f"{settings.MEDIA_URL.lstrip('/')}thumbnails/<str:prefix>/<str:name>",
+        views.ThumbnailView.as_view(),
+        name="thumbnail",
+    ),
+    path(
+        f"{settings.MEDIA_URL.lstrip('/')}<path:name>",
+        views.MediaView.as_view(),
+        name="media",
+    ),
 ]
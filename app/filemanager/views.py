@@ -1,16 +1,122 @@
-from django.shortcuts import render
-from django.http import JsonResponse
-from django.urls import reverse_lazy
-from django.utils.http import url_has_allowed_host_and_scheme
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.shortcuts import render, get_object_or_404
+from django.template.loader import render_to_string
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.urls import reverse, reverse_lazy
+from django.forms import ValidationError
+from django.db import transaction
+from django.conf import settings
+from django.utils.http import (
+    content_disposition_header,
+    url_has_allowed_host_and_scheme,
+)
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.utils.cache import patch_cache_control
+from django.core.files.storage import default_storage
+from django.views.decorators.http import condition
+from django.middleware.csrf import get_token
+from django.views.decorators.vary import vary_on_headers
+from django.views.static import serve
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views import View
 from django.views.generic import CreateView, UpdateView, DeleteView
-from django.db.models import Q
 
-from .models import File, Folder
+import os
+
+from .models import File, Folder, UploadSession, check_file_size
+from .models.folder import prefetch_nested_paths
+from .archives import stream_zip
+from .downloads import file_response, media_response
+from .copies import copy_file, copy_folder
+from .caching import cache_stats, cached, etag
+from .pagination import paginate_listing
+from .search import search
+from .signing import bucket, check_signature
+from .thumbnails import THUMBNAIL_DIR, THUMBNAIL_MAX_AGE
+from .uploadhandlers import StreamingUploadMixin
+from .resumable import (
+    CHUNK_CONTENT_TYPE,
+    TUS_EXTENSIONS,
+    UploadConflict,
+    append_chunks,
+    assemble_file,
+    parse_upload_metadata,
+    tus_headers,
+)
 from accounts.models import Profile
 
+# Columns read by the listing templates, the rest of the rows is never loaded
+LISTED_FOLDER_FIELDS = [
+    "name",
+    "slug",
+    "owner__user__email",
+    "parent_folder_id",
+    "path",
+    "total_size",
+    "file_count",
+    "subfolder_count",
+    "created_at",
+]
+LISTED_FILE_FIELDS = [
+    "name",
+    "file",
+    "type",
+    "size",
+    "thumbnail",
+    "sprite",
+    "renditions",
+    "processing_status",
+    "owner__user__email",
+    "folder__name",
+    "created_at",
+    "updated_at",
+]
+
+
+def response_etag(request, *parts):
+    """
+    Returns the ETag of a listing or search response of the requesting user
+
+    The page embeds the CSRF token and media URLs signed for the current time
+    bucket, and the same URL answers in HTML or JSON, all are part of the tag
+    along with the given parts.
+    """
+    # A first visit gets its CSRF secret now, not while rendering the page
+    get_token(request)
+    return etag(
+        request.user.id,
+        (
+            *parts,
+            request.headers.get("x-requested-with"),
+            request.META.get("CSRF_COOKIE"),
+            bucket(),
+        ),
+    )
+
+
+def listing_etag(request, folder_slug=None, **kwargs):
+    return response_etag(request, "listing", folder_slug, request.GET.get("cursor"))
+
+
+def search_etag(request, **kwargs):
+    return response_etag(request, "search", request.GET.get("search", ""))
 
+
+# Clients keep the pages but check them on every use, unchanged ones are not
+# rendered nor sent again (304)
+revalidated = [
+    vary_on_headers("X-Requested-With"),
+    cache_control(private=True, no_cache=True),
+]
+
+
+@method_decorator([*revalidated, condition(etag_func=listing_etag)], name="get")
 class ContentView(LoginRequiredMixin, View):
     """
     Showing list of files and folders for the authenticated owner
@@ -18,29 +124,126 @@ class ContentView(LoginRequiredMixin, View):
 
     def get(self, request, *args, **kwargs):
         folder_slug = self.kwargs.get("folder_slug", None)
-        files = File.objects.filter(
-            Q(owner__user__id=self.request.user.id) & Q(folder__slug=folder_slug)
-        ).order_by("name")
-        folders = Folder.objects.filter(
-            Q(owner__user__id=self.request.user.id) & Q(parent_folder__slug=folder_slug)
-        ).order_by("name")
-        if folder_slug:
-            current_folder = Folder.objects.get(slug=folder_slug)
-            folder_path = "home / " + current_folder.get_nested_path()
-        else:
-            current_folder = None
-            folder_path = "home"
+        cursor = self.request.GET.get("cursor")
+        # Folders are always listed by name, the cursor tells the page
+        listing = cached(
+            "listing",
+            self.request.user.id,
+            (folder_slug, cursor),
+            lambda: folder_listing(self.request.user.id, folder_slug, cursor),
+        )
+        folders, files, next_cursor = listing["page"]
+        if self.request.headers.get("x-requested-with") == "XMLHttpRequest":
+            return JsonResponse(
+                {
+                    "folders": [folder_item(folder) for folder in folders],
+                    "files": [file_item(file) for file in files],
+                    "next_cursor": next_cursor,
+                    "html": render_to_string(
+                        "filemanager/includes/content-rows.html",
+                        {"folders": folders, "files": files},
+                        request=request,
+                    ),
+                }
+            )
         context = {
             "files": files,
             "folders": folders,
-            "current_folder": current_folder,
-            "folder_path": folder_path,
+            "next_cursor": next_cursor,
+            "current_folder": listing["current_folder"],
+            "folder_path": listing["folder_path"],
             "folder_slug": folder_slug,
+            "destination_folders": cached(
+                "destinations",
+                self.request.user.id,
+                (),
+                lambda: destination_folders(self.request.user.id),
+            ),
         }
         return render(request, "filemanager/content-list.html", context)
 
 
-class FileUploadView(LoginRequiredMixin, CreateView):
+def folder_listing(user_id, folder_slug, cursor):
+    """
+    Returns a page of the content of a folder (the root for no slug) with the
+    folder itself and its path, as cached by ContentView
+    """
+    if folder_slug:
+        # Folders of a trashed subtree are gone for the owner
+        current_folder = get_object_or_404(
+            Folder.objects.alive().owned_by(user_id).select_related("parent_folder"),
+            slug=folder_slug,
+        )
+        folder_path = "home / " + current_folder.get_nested_path()
+    else:
+        current_folder = None
+        folder_path = "home"
+    files = (
+        File.objects.owned_by(user_id)
+        .filter(folder=current_folder, deleted_at__isnull=True)
+        .select_related("owner__user", "folder")
+        .only(*LISTED_FILE_FIELDS)
+    )
+    folders = (
+        Folder.objects.owned_by(user_id)
+        .filter(parent_folder=current_folder, deleted_at__isnull=True)
+        .select_related("owner__user")
+        .only(*LISTED_FOLDER_FIELDS)
+    )
+    # Large folders are listed page by page ("load more")
+    page = paginate_listing(
+        folders, files, cursor, settings.FILEMANAGER_LISTING_PAGE_SIZE
+    )
+    return {
+        "page": page,
+        "current_folder": current_folder,
+        "folder_path": folder_path,
+    }
+
+
+def folder_item(folder):
+    return {
+        "id": folder.id,
+        "name": folder.name,
+        "slug": folder.slug,
+        "size": folder.total_size,
+        "file_count": folder.file_count,
+        "subfolder_count": folder.subfolder_count,
+        "created_at": folder.created_at,
+    }
+
+
+def file_item(file):
+    return {
+        "id": file.id,
+        "name": file.name,
+        "type": file.type,
+        "size": file.size,
+        "url": reverse("filemanager:file-content", args=[file.id]),
+        "thumbnail": file.thumbnail.url if file.thumbnail else None,
+        "created_at": file.created_at,
+    }
+
+
+def destination_folders(user_id):
+    """
+    Returns the folders content can be moved or copied to, as (id, nested path)
+    pairs built from a single query
+    """
+    folders = Folder.objects.alive().owned_by(user_id)
+    folders = folders.order_by("path")
+    names = {}
+    destinations = []
+    for pk, name, path in folders.values_list("pk", "name", "path"):
+        names[pk] = name
+        ancestor_names = [
+            names.get(ancestor) for ancestor in Folder(path=path).path_ids
+        ]
+        destinations.append((pk, " / ".join(ancestor_names)))
+    return destinations
+
+
+class FileUploadView(LoginRequiredMixin, StreamingUploadMixin, CreateView):
     """
     Uploading a new file and dedicating this file to the current user
     """
@@ -73,6 +276,101 @@ class FileUploadView(LoginRequiredMixin, CreateView):
         return reverse_lazy("filemanager:home")
 
 
+class ResumableUploadCreateView(LoginRequiredMixin, View):
+    """
+    Starting a resumable (tus) upload, chunks are sent to the returned Location
+    """
+
+    def options(self, request, *args, **kwargs):
+        response = tus_headers(HttpResponse(status=204))
+        response["Tus-Extension"] = TUS_EXTENSIONS
+        response["Tus-Max-Size"] = settings.FILEMANAGER_MAX_UPLOAD_SIZE_MB * 1024 * 1024
+        return response
+
+    def post(self, request, *args, **kwargs):
+        try:
+            length = int(request.headers["Upload-Length"])
+            metadata = parse_upload_metadata(request.headers.get("Upload-Metadata", ""))
+        except (KeyError, ValueError):
+            return tus_headers(
+                JsonResponse({"detail": "Invalid upload headers"}, status=400)
+            )
+        try:
+            check_file_size(length)
+        except ValidationError as error:
+            return tus_headers(JsonResponse({"detail": error.messages}, status=413))
+        folder = None
+        if metadata.get("folder"):
+            folder = get_object_or_404(
+                Folder.objects.alive().owned_by(self.request.user.id),
+                id=metadata["folder"],
+            )
+        session = UploadSession.objects.create(
+            file_name=os.path.basename(metadata.get("filename", "")) or "upload",
+            length=length,
+            folder=folder,
+            owner=Profile.objects.get(user__id=self.request.user.id),
+        )
+        os.makedirs(os.path.dirname(session.part_path), exist_ok=True)
+        open(session.part_path, "wb").close()
+        response = tus_headers(HttpResponse(status=201), session)
+        response["Location"] = reverse(
+            "filemanager:resumable-upload", kwargs={"session_id": session.id}
+        )
+        return response
+
+
+class ResumableUploadView(LoginRequiredMixin, View):
+    """
+    Reporting (HEAD), appending (PATCH) and cancelling (DELETE) a resumable upload
+    """
+
+    def get_session(self, queryset=None):
+        if queryset is None:
+            queryset = UploadSession.objects.all()
+        return get_object_or_404(
+            queryset.owned_by(self.request.user.id), id=self.kwargs["session_id"]
+        )
+
+    def head(self, request, *args, **kwargs):
+        return tus_headers(HttpResponse(status=200), self.get_session())
+
+    def patch(self, request, *args, **kwargs):
+        if request.content_type != CHUNK_CONTENT_TYPE:
+            return tus_headers(HttpResponse(status=415))
+        session = self.get_session()
+        if request.headers.get("Upload-Offset") != str(session.offset):
+            return tus_headers(HttpResponse(status=409), session)
+        # A retried completion finds the session already complete
+        if session.file_id is None and not session.is_complete:
+            # The body is streamed outside any transaction, a slow client
+            # must not keep the database locked
+            try:
+                append_chunks(session, request)
+            except UploadConflict:
+                session = self.get_session()
+                return tus_headers(HttpResponse(status=409), session)
+        if session.is_complete:
+            with transaction.atomic():
+                # Locking the session so concurrent PATCHes can not complete
+                # it twice
+                session = self.get_session(UploadSession.objects.select_for_update())
+                if session.file_id is None:
+                    try:
+                        session.file = assemble_file(session)
+                    except ValidationError as error:
+                        session.delete()
+                        return tus_headers(
+                            JsonResponse({"detail": error.messages}, status=422)
+                        )
+                    session.save(update_fields=["file", "updated_at"])
+        return tus_headers(HttpResponse(status=204), session)
+
+    def delete(self, request, *args, **kwargs):
+        self.get_session(UploadSession.objects.filter(file__isnull=True)).delete()
+        return tus_headers(HttpResponse(status=204))
+
+
 class FolderCreateView(LoginRequiredMixin, CreateView):
     """
     Creating a new folder and dedicating this file to the current user
@@ -113,7 +411,7 @@ class FileUpdateView(LoginRequiredMixin, UpdateView):
     fields = ["name"]
 
     def get_queryset(self):
-        return File.objects.filter(owner__user__id=self.request.user.id)
+        return File.objects.alive().owned_by(self.request.user.id)
 
     def form_valid(self, form):
         response = super().form_valid(form)
@@ -130,13 +428,17 @@ class FileUpdateView(LoginRequiredMixin, UpdateView):
 
 class FileDeleteView(LoginRequiredMixin, DeleteView):
     """
-    Deleting specified file
+    Moving specified file to the trash (purged later by tasks.purge_trash)
     """
 
     template_name = "filemanager/content-list.html"
 
+    def form_valid(self, form):
+        self.object.trash()
+        return HttpResponseRedirect(self.get_success_url())
+
     def get_queryset(self):
-        return File.objects.filter(owner__user__id=self.request.user.id)
+        return File.objects.alive().owned_by(self.request.user.id)
 
     def get_success_url(self):
         referer_url = self.request.META.get("HTTP_REFERER")
@@ -154,7 +456,7 @@ class FolderUpdateView(LoginRequiredMixin, UpdateView):
     fields = ["name"]
 
     def get_queryset(self):
-        return Folder.objects.filter(owner__user__id=self.request.user.id)
+        return Folder.objects.alive().owned_by(self.request.user.id)
 
     def form_valid(self, form):
         response = super().form_valid(form)
@@ -171,13 +473,71 @@ class FolderUpdateView(LoginRequiredMixin, UpdateView):
 
 class FolderDeleteView(LoginRequiredMixin, DeleteView):
     """
-    Deleting specified folder
+    Moving specified folder to the trash (purged later by tasks.purge_trash)
     """
 
     template_name = "filemanager/content-list.html"
 
+    def form_valid(self, form):
+        self.object.trash()
+        return HttpResponseRedirect(self.get_success_url())
+
     def get_queryset(self):
-        return Folder.objects.filter(owner__user__id=self.request.user.id)
+        return Folder.objects.alive().owned_by(self.request.user.id)
+
+    def get_success_url(self):
+        referer_url = self.request.META.get("HTTP_REFERER")
+        if referer_url:
+            return referer_url
+        return reverse_lazy("filemanager:home")
+
+
+class FolderDownloadView(LoginRequiredMixin, View):
+    """
+    Downloading specified folder (with its subtree) as a streamed ZIP archive
+    """
+
+    def get(self, request, *args, **kwargs):
+        folder = get_object_or_404(
+            Folder.objects.alive().owned_by(self.request.user.id), pk=self.kwargs["pk"]
+        )
+        response = StreamingHttpResponse(
+            stream_zip(folder), content_type="application/zip"
+        )
+        response["Content-Disposition"] = content_disposition_header(
+            as_attachment=True, filename=f"{folder.name}.zip"
+        )
+        return response
+
+
+class FileContentView(LoginRequiredMixin, View):
+    """
+    Sending the content of specified file to its owner (see downloads.file_response)
+    """
+
+    def get(self, request, *args, **kwargs):
+        file = get_object_or_404(
+            File.objects.alive()
+            .owned_by(self.request.user.id)
+            .only("name", "file", "sha256", "mime_type"),
+            pk=self.kwargs["pk"],
+        )
+        return file_response(request, file)
+
+
+class DestinationFolderMixin:
+    """
+    Restricting the destination of a move or copy to the owner's folders
+    """
+
+    template_name = "filemanager/content-list.html"
+
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        form.fields[self.fields[0]].queryset = Folder.objects.alive().owned_by(
+            self.request.user.id
+        )
+        return form
 
     def get_success_url(self):
         referer_url = self.request.META.get("HTTP_REFERER")
@@ -186,23 +546,172 @@ class FolderDeleteView(LoginRequiredMixin, DeleteView):
         return reverse_lazy("filemanager:home")
 
 
+class FileMoveView(LoginRequiredMixin, DestinationFolderMixin, UpdateView):
+    """
+    Moving specified file to another folder
+    """
+
+    fields = ["folder"]
+
+    def get_queryset(self):
+        return File.objects.alive().owned_by(self.request.user.id)
+
+
+class FileCopyView(LoginRequiredMixin, DestinationFolderMixin, UpdateView):
+    """
+    Copying specified file to another folder, the copy shares its content
+    """
+
+    fields = ["folder"]
+
+    def get_queryset(self):
+        return File.objects.alive().owned_by(self.request.user.id)
+
+    def form_valid(self, form):
+        copy_file(self.object, form.cleaned_data["folder"])
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class FolderMoveView(LoginRequiredMixin, DestinationFolderMixin, UpdateView):
+    """
+    Moving specified folder (with its subtree) into another folder
+    """
+
+    fields = ["parent_folder"]
+
+    def get_queryset(self):
+        return Folder.objects.alive().owned_by(self.request.user.id)
+
+
+class FolderCopyView(LoginRequiredMixin, DestinationFolderMixin, UpdateView):
+    """
+    Copying specified folder (with its subtree) into another folder
+    """
+
+    fields = ["parent_folder"]
+
+    def get_queryset(self):
+        return Folder.objects.alive().owned_by(self.request.user.id)
+
+    def form_valid(self, form):
+        copy_folder(self.object, form.cleaned_data["parent_folder"])
+        return HttpResponseRedirect(self.get_success_url())
+
+
+@method_decorator([*revalidated, condition(etag_func=search_etag)], name="get")
 class SearchView(LoginRequiredMixin, View):
     """
-    Searching files and folders for the authenticated owner
+    Searching files and folders for the authenticated owner (see search.search)
     """
 
     def get(self, request, *args, **kwargs):
         search_query = self.request.GET.get("search", "")
-        files = File.objects.filter(
-            Q(owner__user__id=self.request.user.id) & Q(name__contains=search_query)
-        ).order_by("name")
-        folders = Folder.objects.filter(
-            Q(owner__user__id=self.request.user.id) & Q(name__contains=search_query)
-        ).order_by("name")
+        files, folders = cached(
+            "search",
+            self.request.user.id,
+            (search_query,),
+            lambda: search_results(self.request.user.id, search_query),
+        )
         search_title = "Search results for: " + '"' + search_query + '"'
         context = {
             "search_title": search_title,
             "files": files,
             "folders": folders,
+            "destination_folders": cached(
+                "destinations",
+                self.request.user.id,
+                (),
+                lambda: destination_folders(self.request.user.id),
+            ),
         }
         return render(request, "filemanager/search-list.html", context)
+
+
+def search_results(user_id, query):
+    """
+    Returns the files and folders of a user best matching `query`, with the
+    nested paths of their locations, as cached by SearchView
+    """
+    owner_id = (
+        Profile.objects.filter(user__id=user_id).values_list("pk", flat=True).first()
+    )
+    limit = settings.FILEMANAGER_SEARCH_RESULTS
+    files = search(
+        File.objects.alive()
+        .filter(owner_id=owner_id)
+        .select_related("owner__user", "folder")
+        .only(*LISTED_FILE_FIELDS, "folder__path", "folder__parent_folder_id"),
+        owner_id,
+        query,
+        limit,
+    )
+    folders = search(
+        Folder.objects.alive()
+        .filter(owner_id=owner_id)
+        .select_related("owner__user", "parent_folder")
+        .only(
+            *LISTED_FOLDER_FIELDS,
+            "parent_folder__name",
+            "parent_folder__path",
+            "parent_folder__parent_folder_id",
+        ),
+        owner_id,
+        query,
+        limit,
+    )
+    # The location of every result is named with a single query
+    locations = [file.folder for file in files]
+    locations += [folder.parent_folder for folder in folders]
+    prefetch_nested_paths(locations)
+    return files, folders
+
+
+class CacheStatsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    Reporting the hit/miss counters of the listing and search caches (staff only)
+    """
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(cache_stats())
+
+
+class ThumbnailView(View):
+    """
+    Serving content-hashed thumbnail renditions to signed URLs, their bytes
+    never change under a given name so they may be cached as long as the URL
+    is valid
+    """
+
+    def get(self, request, prefix, name, *args, **kwargs):
+        remaining = check_signature(request)
+        response = serve(
+            request,
+            f"{prefix}/{name}",
+            document_root=os.path.join(settings.MEDIA_ROOT, THUMBNAIL_DIR),
+        )
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=min(remaining, THUMBNAIL_MAX_AGE),
+            immutable=True,
+        )
+        return response
+
+
+class MediaView(View):
+    """
+    Serving stored files to signed URLs (see signing.SignedFileSystemStorage),
+    the signature is the only check so neither the session nor the database
+    is read, and proxies may cache the response while the URL is valid
+    """
+
+    def get(self, request, name, *args, **kwargs):
+        remaining = check_signature(request)
+        if not default_storage.exists(name):
+            raise Http404
+        response = media_response(request, name)
+        patch_cache_control(response, public=True, max_age=remaining)
+        return response